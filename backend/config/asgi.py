@@ -6,14 +6,17 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
 import logbook.routing
+from logbook.ws_auth import JWTAuthMiddleware
 
 django_asgi_app = get_asgi_application()
 
 application = ProtocolTypeRouter({
 	"http": django_asgi_app,
 	"websocket": AuthMiddlewareStack(
-		URLRouter(
-			logbook.routing.websocket_urlpatterns
+		JWTAuthMiddleware(
+			URLRouter(
+				logbook.routing.websocket_urlpatterns
+			)
 		)
 	),
 })
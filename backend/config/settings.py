@@ -216,6 +216,100 @@ REFUEL_MILES_LIMIT = 1000
 PICKUP_TIME_HOURS = 1
 DROPOFF_TIME_HOURS = 1
 
+# Seconds a computed admin dashboard snapshot may be served from cache. Trip,
+# fuel log and driver changes invalidate it earlier.
+DASHBOARD_CACHE_SECONDS = int(os.getenv('DASHBOARD_CACHE_SECONDS', '60'))
+
+# Hours-of-service rules checked by logbook.hos (property-carrying limits);
+# the cycle limit is HOURS_LIMIT_8_DAYS.
+HOS_DRIVING_LIMIT_HOURS = 11
+HOS_WINDOW_HOURS = 14
+HOS_BREAK_AFTER_HOURS = 8
+HOS_BREAK_MINUTES = 30
+HOS_RESET_HOURS = 10
+HOS_RESTART_HOURS = 34
+
+# ELD daily-log generation: GPS fixes slower than ELD_STATIONARY_SPEED (m/s)
+# for ELD_STATIONARY_MINUTES turn driving into on-duty time; each fuel log is
+# an on-duty stop of ELD_FUEL_STOP_MINUTES.
+ELD_STATIONARY_SPEED = 2.2
+ELD_STATIONARY_MINUTES = 5
+ELD_FUEL_STOP_MINUTES = 15
+
+# Rendered ELD sheets (SVG/PDF), stored by content hash.
+ELD_RENDER_ROOT = Path(os.getenv('ELD_RENDER_ROOT', BASE_DIR / 'eld_renders'))
+
+# Worker processes used by fleet-wide report runs started from the API.
+FLEET_REPORT_WORKERS = int(os.getenv('FLEET_REPORT_WORKERS', '4'))
+
+# A running report run whose worker has not finished a chunk for this many
+# seconds is considered dead and may be resumed.
+REPORT_RUN_STALE_SECONDS = int(os.getenv('REPORT_RUN_STALE_SECONDS', '900'))
+
+# Largest batch accepted by POST /api/trips/{id}/locations/batch/.
+LOCATION_BATCH_MAX_POINTS = 1000
+# Location points a single trip WebSocket may have queued before it refuses more.
+LOCATION_SOCKET_MAX_PENDING = 5000
+
+# Write-behind buffer for location updates (logbook.location_buffer): rows
+# are inserted in bulk every LOCATION_BUFFER_FLUSH_SECONDS or once
+# LOCATION_BUFFER_MAX_ROWS are queued. 'redis' keeps queued rows in Redis.
+LOCATION_BUFFER_BACKEND = os.getenv('LOCATION_BUFFER_BACKEND', 'local')
+LOCATION_BUFFER_MAX_ROWS = int(os.getenv('LOCATION_BUFFER_MAX_ROWS', '500'))
+LOCATION_BUFFER_FLUSH_SECONDS = float(os.getenv('LOCATION_BUFFER_FLUSH_SECONDS', '1.0'))
+
+# Geofences (logbook.geofence). Trips get pickup/destination circles of
+# ARRIVAL_RADIUS_METERS; a trip leaves a fence only once it is
+# GEOFENCE_EXIT_MARGIN_METERS outside it, and completes after dwelling
+# GEOFENCE_DWELL_SECONDS at its destination. Fixes less accurate than
+# GEOFENCE_MAX_ACCURACY_METERS are ignored. Each worker checks for edited
+# fences at most every GEOFENCE_INDEX_CHECK_SECONDS.
+ARRIVAL_RADIUS_METERS = float(os.getenv('ARRIVAL_RADIUS_METERS', '75'))
+GEOFENCE_EXIT_MARGIN_METERS = float(os.getenv('GEOFENCE_EXIT_MARGIN_METERS', '50'))
+GEOFENCE_DWELL_SECONDS = int(os.getenv('GEOFENCE_DWELL_SECONDS', '60'))
+GEOFENCE_MAX_ACCURACY_METERS = float(os.getenv('GEOFENCE_MAX_ACCURACY_METERS', '100'))
+GEOFENCE_GRID_DEGREES = float(os.getenv('GEOFENCE_GRID_DEGREES', '0.01'))
+GEOFENCE_INDEX_CHECK_SECONDS = int(os.getenv('GEOFENCE_INDEX_CHECK_SECONDS', '5'))
+
+# GPS track compression (logbook.track). Incoming fixes within
+# TRACK_DEADBAND_METERS of the dead-reckoned position, turning less than
+# TRACK_DEADBAND_HEADING_DEGREES and less than TRACK_DEADBAND_SECONDS after
+# the last stored fix are not stored (0 metres disables the filter).
+# Completed trips are simplified to TRACK_SIMPLIFY_TOLERANCE_METERS; set
+# TRACK_SIMPLIFY_ON_COMPLETE off to run `manage.py simplify_tracks` instead.
+TRACK_DEADBAND_METERS = float(os.getenv('TRACK_DEADBAND_METERS', '10'))
+TRACK_DEADBAND_HEADING_DEGREES = float(os.getenv('TRACK_DEADBAND_HEADING_DEGREES', '20'))
+TRACK_DEADBAND_SECONDS = int(os.getenv('TRACK_DEADBAND_SECONDS', '60'))
+TRACK_SIMPLIFY_TOLERANCE_METERS = float(os.getenv('TRACK_SIMPLIFY_TOLERANCE_METERS', '5'))
+TRACK_SIMPLIFY_ON_COMPLETE = os.getenv('TRACK_SIMPLIFY_ON_COMPLETE', 'True') == 'True'
+# `manage.py archive_tracks` packs the rows of trips completed more than
+# TRACK_ARCHIVE_AFTER_DAYS ago into one TripTrack blob each.
+TRACK_ARCHIVE_AFTER_DAYS = int(os.getenv('TRACK_ARCHIVE_AFTER_DAYS', '7'))
+# GET /api/trips/{id}/track/ pages raw fixes TRACK_PAGE_SIZE at a time (a
+# client may ask for up to TRACK_PAGE_MAX); ?zoom= / ?resolution= responses
+# are simplified and unpaged.
+TRACK_PAGE_SIZE = int(os.getenv('TRACK_PAGE_SIZE', '1000'))
+TRACK_PAGE_MAX = int(os.getenv('TRACK_PAGE_MAX', '5000'))
+
+# location_updates retention (logbook.partitions). `manage.py location_retention`
+# keeps LOCATION_PARTITION_MONTHS_AHEAD monthly partitions ready and moves
+# months older than LOCATION_RETENTION_DAYS to compressed files under
+# LOCATION_ARCHIVE_ROOT (layout in docs/LOCATION_ARCHIVE.md).
+LOCATION_RETENTION_DAYS = int(os.getenv('LOCATION_RETENTION_DAYS', '90'))
+LOCATION_PARTITION_MONTHS_AHEAD = int(os.getenv('LOCATION_PARTITION_MONTHS_AHEAD', '3'))
+LOCATION_ARCHIVE_ROOT = Path(os.getenv('LOCATION_ARCHIVE_ROOT', BASE_DIR / 'location_archive'))
+
+# Rate limiting (logbook.ratelimit): token-bucket policies by name, each
+# {'rate': tokens, 'period': seconds, 'burst': capacity}. 'local' buckets live
+# in each process (at most RATE_LIMIT_MAX_KEYS of them); 'redis' shares them
+# across workers.
+RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'local')
+RATE_LIMIT_MAX_KEYS = int(os.getenv('RATE_LIMIT_MAX_KEYS', '10000'))
+RATE_LIMITS = {
+    'address_search': {'rate': 5, 'period': 10, 'burst': 5},
+    'trip_location': {'rate': 1, 'period': 1, 'burst': 1},
+}
+
 # Channels / Redis settings (used for real-time features)
 REDIS_URL = os.getenv('REDIS_URL', 'redis://127.0.0.1:6379')
 CHANNEL_LAYERS = {
@@ -226,3 +320,35 @@ CHANNEL_LAYERS = {
         },
     },
 }
+# The admin fleet map (ws/fleet/) gets at most FLEET_FRAME_HZ frames a second,
+# each listing only the vehicles that moved since the previous one.
+FLEET_FRAME_HZ = float(os.getenv('FLEET_FRAME_HZ', '1'))
+# Last-known positions (logbook.positions): the newest POSITION_SNAPSHOT_POINTS
+# fixes per trip, sent to the driver's and admins' new trip sockets. 'local'
+# keeps them in each process (at most POSITION_STORE_MAX_TRIPS trips) and
+# reloads a trip from the database after POSITION_STORE_LOCAL_TTL seconds,
+# since other processes' fixes never reach it; 'redis' shares them and
+# expires them after POSITION_STORE_TTL seconds.
+POSITION_STORE_BACKEND = os.getenv('POSITION_STORE_BACKEND', 'local')
+POSITION_SNAPSHOT_POINTS = int(os.getenv('POSITION_SNAPSHOT_POINTS', '50'))
+POSITION_STORE_MAX_TRIPS = int(os.getenv('POSITION_STORE_MAX_TRIPS', '10000'))
+POSITION_STORE_TTL = int(os.getenv('POSITION_STORE_TTL', '86400'))
+POSITION_STORE_LOCAL_TTL = float(os.getenv('POSITION_STORE_LOCAL_TTL', '5'))
+# Broadcasts are queued (at most BROADCAST_MAX_QUEUE, oldest dropped first)
+# and sent by a background thread in batches of BROADCAST_BATCH_SIZE, each send
+# bounded by BROADCAST_SEND_TIMEOUT seconds. BROADCAST_BACKGROUND off sends
+# inline in the request.
+BROADCAST_BACKGROUND = os.getenv('BROADCAST_BACKGROUND', 'True') == 'True'
+BROADCAST_MAX_QUEUE = int(os.getenv('BROADCAST_MAX_QUEUE', '10000'))
+BROADCAST_BATCH_SIZE = int(os.getenv('BROADCAST_BATCH_SIZE', '100'))
+BROADCAST_SEND_TIMEOUT = float(os.getenv('BROADCAST_SEND_TIMEOUT', '2'))
+
+# Share the Django cache (geocoding results, dashboard snapshots) across
+# workers through Redis. Without it each process keeps its own local cache.
+if os.getenv('REDIS_CACHE', 'False') == 'True':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        },
+    }
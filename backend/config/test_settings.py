@@ -11,3 +11,14 @@ DATABASES = {
 PASSWORD_HASHERS = [
     'django.contrib.auth.hashers.MD5PasswordHasher',
 ]
+
+# Flush every buffered location immediately, in the calling thread.
+LOCATION_BUFFER_BACKEND = 'local'
+LOCATION_BUFFER_MAX_ROWS = 1
+LOCATION_BUFFER_FLUSH_SECONDS = 0
+
+# Send broadcasts in the calling thread.
+BROADCAST_BACKGROUND = False
+
+# Store every fix; tests that cover the dead-band turn it on themselves.
+TRACK_DEADBAND_METERS = 0
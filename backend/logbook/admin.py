@@ -1,6 +1,14 @@
 from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
 from django.contrib.auth.admin import UserAdmin
-from .models import Driver, Trip, FuelLog, ComplianceReport
+from .compliance import prefetch_compliance
+from .models import Driver, Trip, FuelLog, ComplianceReport, Geofence, GeofenceEvent, ReportRun, TrackCompression, TripMotion, TripTrack
+
+
+class DriverChangeList(ChangeList):
+    def get_results(self, request):
+        super().get_results(request)
+        self.result_list = prefetch_compliance(self.result_list)
 
 
 @admin.register(Driver)
@@ -15,6 +23,9 @@ class DriverAdmin(UserAdmin):
         ('Driver Information', {'fields': ('license_number', 'phone', 'is_admin')}),
     )
 
+    def get_changelist(self, request, **kwargs):
+        return DriverChangeList
+
 
 @admin.register(Trip)
 class TripAdmin(admin.ModelAdmin):
@@ -41,3 +52,45 @@ class ComplianceReportAdmin(admin.ModelAdmin):
     search_fields = ['driver__username']
     date_hierarchy = 'date_start'
     readonly_fields = ['generated_at']
+
+
+@admin.register(ReportRun)
+class ReportRunAdmin(admin.ModelAdmin):
+    list_display = ['id', 'date_start', 'date_end', 'status', 'completed_drivers', 'total_drivers', 'created_at']
+    list_filter = ['status', 'date_start']
+    readonly_fields = ['completed_drivers', 'total_drivers', 'error', 'created_at', 'heartbeat_at', 'finished_at']
+
+
+@admin.register(Geofence)
+class GeofenceAdmin(admin.ModelAdmin):
+    list_display = ['id', 'name', 'kind', 'lat', 'lng', 'radius', 'is_active', 'updated_at']
+    list_filter = ['kind', 'is_active']
+    search_fields = ['name']
+
+
+@admin.register(GeofenceEvent)
+class GeofenceEventAdmin(admin.ModelAdmin):
+    list_display = ['id', 'trip', 'fence', 'kind', 'event', 'occurred_at']
+    list_filter = ['event', 'kind']
+    search_fields = ['fence', 'trip__id']
+    date_hierarchy = 'occurred_at'
+    readonly_fields = ['created_at']
+
+
+@admin.register(TrackCompression)
+class TrackCompressionAdmin(admin.ModelAdmin):
+    list_display = ['trip', 'received_points', 'stored_points', 'kept_points', 'ratio', 'max_error', 'mean_error', 'simplified_at']
+    readonly_fields = ['received_points', 'ratio']
+
+
+@admin.register(TripMotion)
+class TripMotionAdmin(admin.ModelAdmin):
+    list_display = ['trip', 'miles', 'moving_seconds', 'idle_seconds', 'max_speed', 'average_speed', 'stop_count', 'updated_at']
+    readonly_fields = ['miles', 'average_speed']
+
+
+@admin.register(TripTrack)
+class TripTrackAdmin(admin.ModelAdmin):
+    list_display = ['trip', 'point_count', 'started_at', 'ended_at', 'archived_at']
+    exclude = ['data']
+    readonly_fields = ['point_count', 'started_at', 'ended_at', 'archived_at']
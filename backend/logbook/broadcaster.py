@@ -0,0 +1,179 @@
+"""Background publisher for channel-layer broadcasts.
+
+Request handlers used to call ``async_to_sync(group_send)`` inline. That
+blocked a sync worker on a Redis round trip per location POST and swallowed
+every failure. ``get_broadcaster().publish(group, message)`` instead
+appends the message to an in-process queue and returns at once.
+
+A daemon thread runs an event loop with one sender task. The task wakes
+when messages are queued, takes up to ``BROADCAST_BATCH_SIZE`` at a time
+and sends them concurrently. Each send is bounded by
+``BROADCAST_SEND_TIMEOUT`` seconds, so one slow Redis call cannot hold up
+the rest. The queue holds at most ``BROADCAST_MAX_QUEUE`` messages. When
+it is full the oldest message is dropped, because a live map wants the
+newest positions, and the drop is counted.
+
+``metrics()`` reports queue depth and counters for published, sent,
+failed and dropped messages plus send latency, so lost broadcasts show up
+instead of disappearing. ``BROADCAST_BACKGROUND = False`` sends inline in
+the caller, which the test settings use.
+"""
+import asyncio
+import atexit
+from collections import deque
+import logging
+import threading
+import time
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Broadcaster:
+    def __init__(self, max_queue=10000, batch_size=100, send_timeout=2.0, background=True):
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.send_timeout = send_timeout
+        self.background = background
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._loop = None
+        self._wakeup = None
+        self._thread = None
+        self._stopping = False
+
+    # Public API --------------------------------------------------------
+
+    def publish(self, group, message):
+        """Queue ``message`` for ``group``; returns False if the queue was full and dropped one."""
+        if not self.background:
+            self._count(published=1)
+            async_to_sync(self._send_batch)([(group, message)])
+            return True
+        self._ensure_thread()
+        with self._lock:
+            dropped = len(self._queue) >= self.max_queue
+            if dropped:
+                self._queue.popleft()
+            self._queue.append((group, message))
+            self._add(published=1, dropped=int(dropped))
+        self._loop.call_soon_threadsafe(self._wakeup.set)
+        return not dropped
+
+    def depth(self):
+        return len(self._queue)
+
+    def metrics(self):
+        """Queue depth, message counters and send latency (milliseconds)."""
+        with self._lock:
+            counters = dict(self._counters)
+        batches = counters.get('batches', 0)
+        return {
+            'depth': self.depth(),
+            'published': counters.get('published', 0),
+            'sent': counters.get('sent', 0),
+            'failed': counters.get('failed', 0),
+            'dropped': counters.get('dropped', 0),
+            'batches': batches,
+            'last_batch_ms': round(counters.get('last_batch_ms', 0.0), 2),
+            'max_batch_ms': round(counters.get('max_batch_ms', 0.0), 2),
+            'avg_batch_ms': round(counters.get('total_batch_ms', 0.0) / batches, 2) if batches else 0.0,
+        }
+
+    def close(self, timeout=5.0):
+        """Send what is queued (for up to ``timeout`` seconds) and stop the thread."""
+        if self._thread is None:
+            return
+        self._stopping = True
+        self._loop.call_soon_threadsafe(self._wakeup.set)
+        self._thread.join(timeout=timeout)
+
+    # Counters ----------------------------------------------------------
+
+    def _add(self, **counts):
+        for key, value in counts.items():
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def _count(self, **counts):
+        with self._lock:
+            self._add(**counts)
+
+    def _record(self, sent, failed, seconds):
+        milliseconds = seconds * 1000
+        with self._lock:
+            self._add(sent=sent, failed=failed, batches=1, total_batch_ms=milliseconds)
+            self._counters['last_batch_ms'] = milliseconds
+            self._counters['max_batch_ms'] = max(self._counters.get('max_batch_ms', 0.0), milliseconds)
+
+    # Sending -----------------------------------------------------------
+
+    async def _send_batch(self, batch):
+        began = time.perf_counter()
+        try:
+            layer = get_channel_layer()
+            results = await asyncio.gather(*(
+                asyncio.wait_for(layer.group_send(group, message), self.send_timeout)
+                for group, message in batch
+            ), return_exceptions=True)
+        except Exception as e:
+            # No usable channel layer: the whole batch failed.
+            results = [e] * len(batch)
+        failures = [result for result in results if isinstance(result, BaseException)]
+        self._record(len(batch) - len(failures), len(failures), time.perf_counter() - began)
+        if failures:
+            logger.warning('%s of %s broadcasts failed: %r', len(failures), len(batch), failures[0])
+
+    def _take(self):
+        with self._lock:
+            return [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while True:
+                batch = self._take()
+                if not batch:
+                    break
+                await self._send_batch(batch)
+            if self._stopping:
+                return
+
+    def _ensure_thread(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                # Set up before the thread starts, so publish() can wake the
+                # loop as soon as _thread is visible.
+                self._loop = asyncio.new_event_loop()
+                self._wakeup = asyncio.Event()
+                self._thread = threading.Thread(
+                    target=self._loop.run_until_complete, args=(self._run(),), name='broadcaster', daemon=True
+                )
+                self._thread.start()
+
+
+_broadcaster = None
+_broadcaster_lock = threading.Lock()
+
+
+def get_broadcaster():
+    """The process-wide publisher configured by the ``BROADCAST_*`` settings."""
+    global _broadcaster
+    if _broadcaster is None:
+        with _broadcaster_lock:
+            if _broadcaster is None:
+                broadcaster = Broadcaster(
+                    max_queue=getattr(settings, 'BROADCAST_MAX_QUEUE', 10000),
+                    batch_size=getattr(settings, 'BROADCAST_BATCH_SIZE', 100),
+                    send_timeout=getattr(settings, 'BROADCAST_SEND_TIMEOUT', 2.0),
+                    background=getattr(settings, 'BROADCAST_BACKGROUND', True),
+                )
+                atexit.register(broadcaster.close)
+                _broadcaster = broadcaster
+    return _broadcaster
@@ -0,0 +1,151 @@
+"""Batch computation of the driver compliance figures.
+
+``Driver`` exposes ``total_hours_8days``, ``remaining_hours_8days``,
+``compliance_status``, ``miles_since_last_fuel`` and ``needs_refuel`` as
+properties that each hit the database. ``prefetch_compliance`` computes all
+five for a whole queryset in two queries and stores the result
+on each instance, where the properties pick it up instead of querying.
+"""
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import QuerySet, Sum
+
+from .duty_ledger import window_start
+from .fuel_ledger import refresh_fuel_state
+from .hos import load_intervals, trip_window
+from .models import Driver, DriverDutyDay
+
+
+@dataclass(frozen=True)
+class DriverCompliance:
+    total_hours_8days: Decimal
+    remaining_hours_8days: Decimal
+    compliance_status: str
+    miles_since_last_fuel: Decimal
+    needs_refuel: bool
+
+
+def hours_status(used):
+    """Map hours used in the 8-day window to ``compliant``/``warning``/``exceeded``."""
+    limit = getattr(settings, 'HOURS_LIMIT_8_DAYS', 70)
+    if used >= limit:
+        return 'exceeded'
+    elif used >= limit * 0.9:
+        return 'warning'
+    return 'compliant'
+
+
+def build_compliance(total_hours, miles):
+    hours_limit = getattr(settings, 'HOURS_LIMIT_8_DAYS', 70)
+    miles_limit = getattr(settings, 'REFUEL_MILES_LIMIT', 500)
+    total_hours = round(total_hours, 2)
+    miles = round(miles, 2)
+    return DriverCompliance(
+        total_hours_8days=total_hours,
+        remaining_hours_8days=round(max(0, hours_limit - total_hours), 2),
+        compliance_status=hours_status(total_hours),
+        miles_since_last_fuel=miles,
+        needs_refuel=miles >= miles_limit,
+    )
+
+
+def _window_hours(driver_ids, now=None):
+    rows = DriverDutyDay.objects.filter(
+        driver_id__in=driver_ids, day__gte=window_start(now)
+    ).values('driver_id').annotate(total=Sum('hours')).values_list('driver_id', 'total')
+    return dict(rows)
+
+
+def _miles_since_last_fuel(driver_ids):
+    rows = Driver.objects.filter(pk__in=driver_ids).order_by().values_list(
+        'pk', 'fuel_state__miles_since_fuel'
+    )
+    miles = {}
+    for pk, driver_miles in rows:
+        if driver_miles is None:
+            # No counter yet (driver predates the ledger); build it once.
+            driver_miles = refresh_fuel_state(pk).miles_since_fuel
+        miles[pk] = driver_miles
+    return miles
+
+
+def compute_compliance(drivers, now=None):
+    """Return ``{driver_id: DriverCompliance}`` for a driver queryset, drivers or ids.
+
+    Unsliced querysets are passed to the database as a subquery so the whole
+    fleet can be evaluated without materialising the driver ids first.
+    """
+    if isinstance(drivers, QuerySet) and not drivers.query.is_sliced:
+        driver_ids = drivers.order_by().values('pk')
+    else:
+        driver_ids = [getattr(driver, 'pk', driver) for driver in drivers]
+        if not driver_ids:
+            return {}
+    hours = _window_hours(driver_ids, now)
+    miles = _miles_since_last_fuel(driver_ids)
+    return {
+        pk: build_compliance(hours.get(pk) or Decimal('0.00'), driver_miles)
+        for pk, driver_miles in miles.items()
+    }
+
+
+class ComplianceContext:
+    """Compliance figures computed at most once per driver and shared.
+
+    One context lives on each request (see ``compliance_context``) so every
+    trip, fuel log and driver serialized in the response reuses the same
+    figures instead of recomputing them per row.
+    """
+
+    def __init__(self, now=None):
+        self.now = now
+        self._results = {}
+
+    def prefetch(self, drivers):
+        """Cache compliance on each driver instance, computing missing drivers in one batch."""
+        drivers = [driver for driver in drivers if driver is not None]
+        missing = {driver.pk for driver in drivers} - self._results.keys()
+        if missing:
+            self._results.update(compute_compliance(sorted(missing), self.now))
+        for driver in drivers:
+            driver._compliance_cache = self._results[driver.pk]
+        return drivers
+
+    def get(self, driver):
+        return self.prefetch([driver])[0]._compliance_cache
+
+    def prefetch_hos(self, trips):
+        """Load the duty intervals ``Trip.hos_violations`` needs for ``trips`` in two queries.
+
+        Each driver's intervals cover all of their trips in ``trips``; every
+        trip gets its driver's list.
+        """
+        trips = [trip for trip in trips if trip.driver_id is not None and trip.start_time is not None]
+        ranges = {}
+        for trip in trips:
+            since, until = trip_window(trip)
+            if trip.driver_id in ranges:
+                since = min(since, ranges[trip.driver_id][0])
+                until = max(until, ranges[trip.driver_id][1])
+            ranges[trip.driver_id] = (since, until)
+        intervals = load_intervals(ranges, self.now)
+        for trip in trips:
+            trip._hos_intervals = intervals[trip.driver_id]
+        return trips
+
+
+def compliance_context(request):
+    """Return the request's ``ComplianceContext``, creating it on first use."""
+    if request is None:
+        return ComplianceContext()
+    context = getattr(request, '_compliance_context', None)
+    if context is None:
+        context = request._compliance_context = ComplianceContext()
+    return context
+
+
+def prefetch_compliance(drivers, now=None):
+    """Compute compliance for ``drivers`` and cache it on each instance."""
+    return ComplianceContext(now).prefetch(drivers)
@@ -1,20 +1,184 @@
+import asyncio
+import logging
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from django.conf import settings
+
+from .fleet_live import FLEET_GROUP, PositionCoalescer
+from .locations import ingest_batch
+from .models import Trip
+from .positions import get_position_store
+
+logger = logging.getLogger(__name__)
+
+
+@database_sync_to_async
+def load_trip(trip_id):
+    try:
+        return Trip.objects.filter(pk=trip_id).first()
+    except (ValueError, TypeError):
+        return None
+
+
+@database_sync_to_async
+def trip_snapshot(trip_id, since):
+    return get_position_store().snapshot(trip_id, since)
+
+
+def _since(scope):
+    """The ``?since=<sequence>`` a reconnecting client last saw, if any."""
+    value = parse_qs(scope.get('query_string', b'').decode()).get('since')
+    try:
+        return int(value[0]) if value else None
+    except ValueError:
+        return None
+
 
 class TripConsumer(AsyncJsonWebsocketConsumer):
+    """Live updates for one trip.
+
+    The trip's driver and admins first get a ``location_snapshot`` of the
+    trip's last-known points from ``logbook.positions``. With
+    ``?since=<sequence>`` it holds only the points after that sequence, so a
+    reconnecting client gets just what it missed. After that comes every
+    broadcast to the trip group. A point may show up in both the snapshot and the first broadcast,
+    so clients deduplicate by sequence.
+
+    The trip's driver may also send location frames, either
+    ``{"type": "location", "sequence": n, "lat": .., "lng": .., ...}`` or
+    ``{"type": "locations", "points": [...]}``. Frames are queued and a
+    per-connection writer task stores them with ``ingest_batch`` (which also
+    fans them out to the group), coalescing whatever queued up meanwhile, and
+    answers ``{"type": "ack", "sequences": [...]}`` once they are stored.
+    """
+
     async def connect(self):
         # expecting query param ?trip_id=<id>
         self.trip_id = self.scope['url_route']['kwargs'].get('trip_id')
         self.group_name = f"trip_{self.trip_id}"
+        # Loaded on connect for drivers, who need it to be sent the snapshot,
+        # and otherwise when the first location frame arrives. Admins never
+        # need the trip row, so their reconnects do not query the database.
+        self.trip = None
+        self.trip_loaded = False
+        self.pending = []
+        self.wakeup = asyncio.Event()
+        self.writer = None
+        self.closing = False
 
         await self.channel_layer.group_add(self.group_name, self.channel_name)
         await self.accept()
 
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            return
+        if not user.is_admin:
+            self.trip = await load_trip(self.trip_id)
+            self.trip_loaded = True
+            if not self._is_trip_driver():
+                return
+        since = _since(self.scope)
+        try:
+            points = await trip_snapshot(self.trip_id, since)
+        except Exception:
+            logger.exception('Could not load the position snapshot for trip %s', self.trip_id)
+            return
+        await self.send_json({
+            'type': 'location_snapshot',
+            'trip_id': self.trip_id,
+            'since': since,
+            'points': points,
+        })
+
     async def disconnect(self, close_code):
         await self.channel_layer.group_discard(self.group_name, self.channel_name)
+        if self.writer is not None:
+            # Let the writer store what is already queued before it stops.
+            self.closing = True
+            self.wakeup.set()
+            await self.writer
+
+    def _is_trip_driver(self):
+        user = self.scope.get('user')
+        return (
+            self.trip is not None and user is not None and user.is_authenticated
+            and user.id == self.trip.driver_id
+        )
 
     async def receive_json(self, content):
-        # For now we don't accept client messages, only server broadcasts
-        return
+        kind = content.get('type') if isinstance(content, dict) else None
+        if kind == 'location':
+            points = [content]
+        elif kind == 'locations':
+            points = content.get('points')
+        else:
+            return
+        if not isinstance(points, list):
+            await self.send_json({'type': 'error', 'error': 'points must be a list'})
+            return
+        sequences = [point.get('sequence') for point in points if isinstance(point, dict)]
+
+        if not self.trip_loaded:
+            self.trip = await load_trip(self.trip_id)
+            self.trip_loaded = True
+        if not self._is_trip_driver():
+            await self.send_json({'type': 'error', 'error': 'not authorized', 'sequences': sequences})
+            return
+        limit = getattr(settings, 'LOCATION_SOCKET_MAX_PENDING', 5000)
+        if len(self.pending) + len(points) > limit:
+            # The client keeps unacknowledged points and sends them again later.
+            await self.send_json({'type': 'error', 'error': 'backpressure', 'sequences': sequences})
+            return
+
+        self.pending.extend(points)
+        if self.writer is None:
+            self.writer = asyncio.ensure_future(self._write_pending())
+        self.wakeup.set()
+
+    async def _write_pending(self):
+        batch_size = getattr(settings, 'LOCATION_BATCH_MAX_POINTS', 1000)
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            while self.pending:
+                batch, self.pending = self.pending[:batch_size], self.pending[batch_size:]
+                try:
+                    # Fresh for every batch: the trip may have been edited or
+                    # cancelled since the connection loaded it.
+                    trip = await load_trip(self.trip_id)
+                    if trip is None:
+                        raise Trip.DoesNotExist(f'Trip {self.trip_id} no longer exists')
+                    self.trip = trip
+                    result = await database_sync_to_async(ingest_batch)(trip, batch)
+                except Exception:
+                    logger.exception('Failed to store location frames for trip %s', self.trip_id)
+                    await self._send_if_open({
+                        'type': 'error',
+                        'error': 'failed to store',
+                        'sequences': [p.get('sequence') for p in batch if isinstance(p, dict)],
+                    })
+                    continue
+                await self._send_if_open({
+                    'type': 'ack',
+                    'sequences': sorted(result['accepted'] + result['duplicates']),
+                    'rejected': [
+                        {'sequence': r['sequence'], 'errors': r['errors']} for r in result['rejected']
+                    ],
+                    'arrived': result['arrived'],
+                })
+            if self.closing:
+                return
+
+    async def _send_if_open(self, content):
+        if self.closing:
+            return
+        try:
+            await self.send_json(content)
+        except Exception:
+            # The socket went away while the batch was being stored.
+            pass
 
     async def location_update(self, event):
         # event contains location payload
@@ -27,4 +191,61 @@ class TripConsumer(AsyncJsonWebsocketConsumer):
             'speed': event.get('speed'),
             'recorded_at': event.get('recorded_at'),
             'arrived': event.get('arrived', False),
+            'events': event.get('events', []),
         })
+
+    async def location_batch(self, event):
+        # A batch of points sorted by recorded_at, sent as one frame.
+        await self.send_json({
+            'type': 'location_batch',
+            'trip_id': event.get('trip_id'),
+            'points': event.get('points', []),
+            'arrived': event.get('arrived', False),
+            'events': event.get('events', []),
+        })
+
+
+class FleetConsumer(AsyncJsonWebsocketConsumer):
+    """Live positions of the whole fleet for admins (see ``logbook.fleet_live``).
+
+    Sends ``{"type": "fleet_frame", "vehicles": [...]}`` at most
+    ``FLEET_FRAME_HZ`` times a second, listing the vehicles whose position
+    changed since the previous frame.
+    """
+
+    async def connect(self):
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated or not user.is_admin:
+            await self.close(code=4403)
+            return
+        self.positions = PositionCoalescer()
+        await self.channel_layer.group_add(FLEET_GROUP, self.channel_name)
+        await self.accept()
+        self.ticker = asyncio.ensure_future(self._send_frames())
+
+    async def disconnect(self, close_code):
+        ticker = getattr(self, 'ticker', None)
+        if ticker is None:
+            return
+        ticker.cancel()
+        try:
+            await ticker
+        except asyncio.CancelledError:
+            pass
+        await self.channel_layer.group_discard(FLEET_GROUP, self.channel_name)
+
+    async def _send_frames(self):
+        interval = 1 / getattr(settings, 'FLEET_FRAME_HZ', 1)
+        while True:
+            await asyncio.sleep(interval)
+            vehicles = self.positions.take()
+            if not vehicles:
+                continue
+            try:
+                await self.send_json({'type': 'fleet_frame', 'vehicles': vehicles})
+            except Exception:
+                # The socket is closing; disconnect() stops the ticker.
+                return
+
+    async def fleet_position(self, event):
+        self.positions.update(event['timestamp'], event['position'])
@@ -0,0 +1,70 @@
+"""Fleet-wide snapshot behind ``DashboardStatsView``.
+
+Every ``DashboardStatsSerializer`` field is computed with set-based queries
+over the trip table and the driver ledgers. The result is cached under a
+version number that the trip, fuel log and driver signal handlers bump, so
+repeated dashboard polls are a cache read until something changes.
+"""
+from time import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from .duty_ledger import window_start
+from .models import Driver, DriverDutyDay, DriverFuelState, Trip
+
+VERSION_KEY = 'dashboard:snapshot:version'
+
+
+def _new_version():
+    return int(time() * 1000)
+
+
+def snapshot_version():
+    return cache.get_or_set(VERSION_KEY, _new_version, None)
+
+
+def invalidate_fleet_snapshot():
+    """Bump the snapshot version; cached snapshots for older versions are ignored."""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, _new_version(), None)
+
+
+def compute_fleet_snapshot(now=None):
+    now = now or timezone.now()
+    today = timezone.localtime(now).date()
+    hours_limit = getattr(settings, 'HOURS_LIMIT_8_DAYS', 70)
+    miles_limit = getattr(settings, 'REFUEL_MILES_LIMIT', 500)
+
+    trips = Trip.objects.aggregate(
+        active_trips=Count('id', filter=Q(status='in_progress')),
+        completed_trips_today=Count('id', filter=Q(status='completed', end_time__date=today)),
+    )
+    return {
+        'total_drivers': Driver.objects.filter(is_active=True).count(),
+        'active_trips': trips['active_trips'],
+        'completed_trips_today': trips['completed_trips_today'],
+        'compliance_violations': DriverDutyDay.objects.filter(
+            day__gte=window_start(now)
+        ).values('driver_id').annotate(
+            total_hours=Sum('hours')
+        ).filter(total_hours__gt=hours_limit).count(),
+        'drivers_needing_refuel': DriverFuelState.objects.filter(
+            miles_since_fuel__gte=miles_limit
+        ).count(),
+    }
+
+
+def get_fleet_snapshot(now=None):
+    """Return the cached snapshot for the current version, computing it on a miss."""
+    now = now or timezone.now()
+    key = f'dashboard:snapshot:{snapshot_version()}:{timezone.localtime(now).date()}'
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = compute_fleet_snapshot(now)
+        cache.set(key, snapshot, getattr(settings, 'DASHBOARD_CACHE_SECONDS', 60))
+    return snapshot
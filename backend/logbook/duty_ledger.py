@@ -0,0 +1,204 @@
+"""Maintenance of the per-driver daily duty-hours ledger (``DriverDutyDay``).
+
+A completed trip contributes its ``total_trip_hours`` to the calendar days it
+touches: pickup time is booked on the start day, dropoff time on the end day
+and the driving interval is split at local midnight. Trips that are pending,
+in progress or cancelled contribute nothing.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import DriverDutyDay, Trip
+
+WINDOW_DAYS = 8
+TWO_PLACES = Decimal('0.01')
+
+
+def window_start(now=None):
+    """First calendar day of the rolling 8-day window ending today."""
+    now = now or timezone.now()
+    return timezone.localtime(now).date() - timedelta(days=WINDOW_DAYS - 1)
+
+
+def _day_bounds(day):
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def trip_days(start_time, end_time):
+    """Calendar days covered by ``[start_time, end_time]`` in local time."""
+    if not start_time or not end_time:
+        return []
+    first = timezone.localtime(start_time).date()
+    last = timezone.localtime(end_time).date()
+    if last < first:
+        return [first]
+    return [first + timedelta(days=i) for i in range((last - first).days + 1)]
+
+
+def trip_day_hours(trip):
+    """Split a completed trip's hours into ``{day: Decimal hours}``.
+
+    The returned values always add up to ``trip.total_trip_hours`` exactly;
+    any rounding remainder is booked on the last day.
+    """
+    if trip.status != 'completed' or not trip.end_time:
+        return {}
+
+    total = trip.total_trip_hours
+    days = trip_days(trip.start_time, trip.end_time)
+    if len(days) == 1:
+        return {days[0]: total}
+
+    split = {}
+    for day in days:
+        day_start, day_end = _day_bounds(day)
+        seconds = (min(trip.end_time, day_end) - max(trip.start_time, day_start)).total_seconds()
+        split[day] = Decimal(max(seconds, 0) / 3600)
+    split[days[0]] += Decimal(trip.pickup_time)
+    split[days[-1]] += Decimal(trip.dropoff_time)
+
+    result = {day: hours.quantize(TWO_PLACES) for day, hours in split.items()}
+    result[days[-1]] += total - sum(result.values())
+    return result
+
+
+def compute_duty_days(trips):
+    """Aggregate an iterable of trips into ``{(driver_id, day): (hours, count)}``."""
+    buckets = defaultdict(lambda: [Decimal('0.00'), 0])
+    for trip in trips:
+        for day, hours in trip_day_hours(trip).items():
+            bucket = buckets[(trip.driver_id, day)]
+            bucket[0] += hours
+            bucket[1] += 1
+    return {key: (hours, count) for key, (hours, count) in buckets.items()}
+
+
+def refresh_duty_days(driver_id, days):
+    """Recompute the ledger rows for ``days`` of one driver from its trips."""
+    days = sorted(set(days))
+    if not days:
+        return
+    range_start, _ = _day_bounds(days[0])
+    _, range_end = _day_bounds(days[-1])
+    trips = Trip.objects.filter(
+        driver_id=driver_id,
+        status='completed',
+        start_time__lt=range_end,
+        end_time__gte=range_start,
+    )
+    buckets = compute_duty_days(trips)
+
+    with transaction.atomic():
+        for day in days:
+            hours, count = buckets.get((driver_id, day), (Decimal('0.00'), 0))
+            if count:
+                DriverDutyDay.objects.update_or_create(
+                    driver_id=driver_id, day=day,
+                    defaults={'hours': hours, 'trip_count': count},
+                )
+            else:
+                DriverDutyDay.objects.filter(driver_id=driver_id, day=day).delete()
+
+
+def rebuild_duty_days(driver_ids=None, since=None):
+    """Rebuild the ledger from the trip table; returns the number of rows written."""
+    trips = Trip.objects.filter(status='completed', end_time__isnull=False)
+    ledger = DriverDutyDay.objects.all()
+    if driver_ids is not None:
+        trips = trips.filter(driver_id__in=driver_ids)
+        ledger = ledger.filter(driver_id__in=driver_ids)
+    if since is not None:
+        since_start, _ = _day_bounds(since)
+        trips = trips.filter(end_time__gte=since_start)
+        ledger = ledger.filter(day__gte=since)
+
+    buckets = compute_duty_days(trips.only(
+        'driver_id', 'start_time', 'end_time', 'pickup_time', 'dropoff_time', 'status'
+    ).iterator())
+    rows = [
+        DriverDutyDay(driver_id=driver_id, day=day, hours=hours, trip_count=count)
+        for (driver_id, day), (hours, count) in buckets.items()
+        if since is None or day >= since
+    ]
+    with transaction.atomic():
+        ledger.delete()
+        DriverDutyDay.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def check_duty_days(driver_ids=None):
+    """Compare the ledger against a scan of the trip table.
+
+    Returns a list of ``(driver_id, day, ledger_hours, trip_hours)`` tuples for
+    every bucket where the two disagree.
+    """
+    trips = Trip.objects.filter(status='completed', end_time__isnull=False)
+    ledger = DriverDutyDay.objects.all()
+    if driver_ids is not None:
+        trips = trips.filter(driver_id__in=driver_ids)
+        ledger = ledger.filter(driver_id__in=driver_ids)
+
+    expected = {key: hours for key, (hours, _) in compute_duty_days(trips.iterator()).items()}
+    actual = {(row.driver_id, row.day): row.hours for row in ledger.iterator()}
+
+    mismatches = []
+    for key in sorted(set(expected) | set(actual)):
+        want = expected.get(key, Decimal('0.00'))
+        have = actual.get(key, Decimal('0.00'))
+        if want != have:
+            mismatches.append((key[0], key[1], have, want))
+    return mismatches
+
+
+def recovery_timeline(day_hours, limit, duration=None, now=None):
+    """Hours available over the next 8 days as past days roll off the window.
+
+    ``day_hours`` maps ledger days to hours for one driver (only days inside
+    the current window matter). The window is swept forward a day at a time,
+    subtracting the day that leaves it, so the whole curve is one pass over at
+    most eight values. Returns ``(timeline, earliest_start)`` where
+    ``earliest_start`` is the first moment a trip of ``duration`` hours fits
+    under ``limit`` (``None`` if ``duration`` is not given or never fits).
+    """
+    now = now or timezone.now()
+    today = timezone.localtime(now).date()
+    first = today - timedelta(days=WINDOW_DAYS - 1)
+    used = sum((hours for day, hours in day_hours.items() if first <= day <= today), Decimal('0.00'))
+    limit = Decimal(limit)
+    duration = Decimal(duration) if duration is not None else None
+
+    timeline = []
+    earliest_start = None
+    for offset in range(WINDOW_DAYS + 1):
+        day = today + timedelta(days=offset)
+        rolled_off = Decimal('0.00')
+        if offset:
+            rolled_off = day_hours.get(day - timedelta(days=WINDOW_DAYS), Decimal('0.00'))
+            used -= rolled_off
+        at = now if not offset else _day_bounds(day)[0]
+        available = max(Decimal('0.00'), limit - used)
+        timeline.append({
+            'at': at,
+            'hours_rolled_off': round(rolled_off, 2),
+            'hours_used': round(used, 2),
+            'hours_available': round(available, 2),
+        })
+        if earliest_start is None and duration is not None and duration <= available:
+            earliest_start = at
+    return timeline, earliest_start
+
+
+def window_day_hours(driver_ids, now=None):
+    """Ledger rows of the current window as ``{driver_id: {day: hours}}`` (one query)."""
+    rows = DriverDutyDay.objects.filter(
+        driver_id__in=driver_ids, day__gte=window_start(now)
+    ).values_list('driver_id', 'day', 'hours')
+    result = {}
+    for driver_id, day, hours in rows:
+        result.setdefault(driver_id, {})[day] = hours
+    return result
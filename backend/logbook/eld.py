@@ -0,0 +1,288 @@
+"""ELD daily-log generation.
+
+``ELDGenerator`` turns a driver's trips, pickup/dropoff time, fuel events and
+``LocationUpdate`` stream into per-day duty-status segments:
+
+* pickup time is on duty before the trip's ``start_time`` and dropoff time
+  on duty after its ``end_time``; the time in between is driving;
+* a fuel log is an on-duty stop of ``ELD_FUEL_STOP_MINUTES``;
+* inside a driving period, GPS fixes slower than ``ELD_STATIONARY_SPEED``
+  (m/s) for at least ``ELD_STATIONARY_MINUTES`` are on duty, not driving;
+* everything else is off duty.
+
+Each generated day is stored as a ``DailyLog`` together with a hash of the
+inputs that can affect it. Regenerating a range first computes those hashes
+with a few set-based queries (the location stream is summarised per day by
+count and last id, never walked) and only rebuilds days whose hash changed.
+Fixes of archived trips (``TripTrack``) are read from their packed track.
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+import hashlib
+
+from django.conf import settings
+from django.db.models import Count, Max, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailyLog, FuelLog, LocationUpdate, Trip, TripTrack
+
+# Bump when the segment rules change so every cached day is rebuilt.
+GENERATOR_VERSION = 1
+
+OFF_DUTY = 'off_duty'
+DRIVING = 'driving'
+ON_DUTY = 'on_duty'
+
+# Higher wins where intervals overlap.
+_PRIORITY = {OFF_DUTY: 0, DRIVING: 1, ON_DUTY: 2}
+
+
+def _day_bounds(day):
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def _hours(seconds):
+    return (Decimal(seconds) / Decimal(3600)).quantize(Decimal('0.01'))
+
+
+def _trip_window(trip):
+    """The full on-duty window of a trip, pickup and dropoff included."""
+    end_time = trip.end_time or timezone.now()
+    return (
+        trip.start_time - timedelta(hours=float(trip.pickup_time)),
+        end_time + timedelta(hours=float(trip.dropoff_time)),
+    )
+
+
+def stationary_periods(points, start, end):
+    """Runs of slow GPS fixes inside ``[start, end]`` long enough to count as stopped.
+
+    ``points`` are ``(recorded_at, speed)`` tuples sorted by time.
+    """
+    threshold = getattr(settings, 'ELD_STATIONARY_SPEED', 2.2)
+    minimum = timedelta(minutes=getattr(settings, 'ELD_STATIONARY_MINUTES', 5))
+    periods = []
+    run_start = run_end = None
+    for recorded_at, speed in points:
+        if recorded_at < start or recorded_at > end:
+            continue
+        if speed is not None and speed < threshold:
+            if run_start is None:
+                run_start = recorded_at
+            run_end = recorded_at
+        else:
+            if run_start is not None and run_end - run_start >= minimum:
+                periods.append((run_start, run_end))
+            run_start = run_end = None
+    if run_start is not None and run_end - run_start >= minimum:
+        periods.append((run_start, run_end))
+    return periods
+
+
+def build_segments(day, intervals):
+    """Flatten prioritised ``(start, end, status)`` intervals into one day's segments.
+
+    Returns contiguous segments covering the whole day, off duty by default.
+    """
+    day_start, day_end = _day_bounds(day)
+    clipped = [
+        (max(start, day_start), min(end, day_end), status)
+        for start, end, status in intervals
+        if start < day_end and end > day_start
+    ]
+    points = sorted({day_start, day_end} | {t for start, end, _ in clipped for t in (start, end)})
+
+    segments = []
+    for seg_start, seg_end in zip(points, points[1:]):
+        status = OFF_DUTY
+        for start, end, candidate in clipped:
+            if start <= seg_start and end >= seg_end and _PRIORITY[candidate] > _PRIORITY[status]:
+                status = candidate
+        if segments and segments[-1]['status'] == status:
+            segments[-1]['end'] = seg_end
+        else:
+            segments.append({'status': status, 'start': seg_start, 'end': seg_end})
+    return segments
+
+
+class ELDGenerator:
+    """Generate and cache ``DailyLog`` rows for one driver."""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self._tracks = {}
+
+    def _trips(self, range_start, range_end):
+        # pickup_time/dropoff_time are at most 99.99 hours.
+        pad = timedelta(hours=100)
+        return [
+            trip for trip in Trip.objects.filter(
+                driver=self.driver,
+                status__in=['in_progress', 'completed'],
+                start_time__lt=range_end + pad,
+            ).filter(Q(end_time__isnull=True) | Q(end_time__gt=range_start - pad)).order_by('start_time')
+            if _trip_window(trip)[0] < range_end and _trip_window(trip)[1] > range_start
+        ]
+
+    def _fuel_logs(self, range_start, range_end):
+        return list(FuelLog.objects.filter(
+            driver=self.driver, timestamp__gte=range_start, timestamp__lt=range_end
+        ).order_by('timestamp'))
+
+    def _location_summary(self, range_start, range_end):
+        rows = LocationUpdate.objects.filter(
+            driver=self.driver, recorded_at__gte=range_start, recorded_at__lt=range_end
+        ).annotate(day=TruncDate('recorded_at')).values('day').annotate(
+            count=Count('id'), last_id=Max('id')
+        ).order_by()
+        return {row['day']: (row['count'], row['last_id']) for row in rows}
+
+    def input_versions(self, days, trips, fuel_logs, locations, tracks=None):
+        """Hash of every input that can change each day's log."""
+        tracks = tracks or {}
+        versions = {}
+        for day in days:
+            day_start, day_end = _day_bounds(day)
+            parts = [GENERATOR_VERSION, day.isoformat()]
+            for trip in trips:
+                start, end = _trip_window(trip)
+                if start < day_end and end > day_start:
+                    parts.append((
+                        trip.id, trip.status, trip.start_time.isoformat(),
+                        trip.end_time.isoformat() if trip.end_time else None,
+                        str(trip.pickup_time), str(trip.dropoff_time), str(trip.distance),
+                        trip.updated_at.isoformat(),
+                        # An open trip grows with the clock; rebuild it at most once a minute.
+                        None if trip.end_time else timezone.now().replace(second=0, microsecond=0).isoformat(),
+                    ))
+                    if trip.id in tracks:
+                        parts.append(('track', trip.id) + tracks[trip.id])
+            for fuel in fuel_logs:
+                if day_start <= fuel.timestamp < day_end:
+                    parts.append(('fuel', fuel.id, fuel.timestamp.isoformat(), fuel.location, str(fuel.odometer_reading)))
+            parts.append(('locations',) + tuple(locations.get(day, (0, None))))
+            versions[day] = hashlib.sha256(repr(parts).encode()).hexdigest()
+        return versions
+
+    def _track_versions(self, trips):
+        """``{trip_id: (point_count, archived_at)}`` for trips whose track is archived."""
+        return {
+            trip_id: (count, archived_at.isoformat())
+            for trip_id, count, archived_at in TripTrack.objects.filter(
+                trip__in=[trip.id for trip in trips]
+            ).values_list('trip_id', 'point_count', 'archived_at')
+        }
+
+    def _archived_points(self, trips):
+        """``(recorded_at, speed)`` of every archived fix of ``trips``, decoded once per generator."""
+        missing = [trip.id for trip in trips if trip.id not in self._tracks]
+        if missing:
+            self._tracks.update(dict.fromkeys(missing, ()))
+            for track in TripTrack.objects.filter(trip__in=missing):
+                self._tracks[track.trip_id] = [
+                    (point[0], point[3]) for point in track.arrays().points()
+                ]
+        return [point for trip in trips for point in self._tracks[trip.id]]
+
+    def _points(self, day, trips=()):
+        day_start, day_end = _day_bounds(day)
+        points = list(LocationUpdate.objects.filter(
+            driver=self.driver, recorded_at__gte=day_start, recorded_at__lt=day_end
+        ).order_by('recorded_at').values_list('recorded_at', 'speed'))
+        archived = [point for point in self._archived_points(trips) if day_start <= point[0] < day_end]
+        if archived:
+            points = sorted(points + archived, key=lambda point: point[0])
+        return points
+
+    def build_day(self, day, trips, fuel_logs):
+        """Compute one day's log (segments, events and totals) from its inputs."""
+        day_start, day_end = _day_bounds(day)
+        fuel_minutes = getattr(settings, 'ELD_FUEL_STOP_MINUTES', 15)
+        intervals = []
+        events = []
+        miles = Decimal('0.00')
+        points = None
+
+        for trip in trips:
+            window_start, window_end = _trip_window(trip)
+            if window_start >= day_end or window_end <= day_start:
+                continue
+            driving_end = trip.end_time or timezone.now()
+            intervals.append((window_start, trip.start_time, ON_DUTY))
+            intervals.append((trip.start_time, driving_end, DRIVING))
+            intervals.append((driving_end, window_end, ON_DUTY))
+
+            if points is None:
+                points = self._points(day, trips)
+            for stop_start, stop_end in stationary_periods(points, trip.start_time, driving_end):
+                intervals.append((stop_start, stop_end, ON_DUTY))
+
+            if day_start <= trip.start_time < day_end:
+                events.append({'type': 'pickup', 'at': trip.start_time, 'trip_id': trip.id,
+                               'location': trip.origin})
+            if trip.end_time and day_start <= trip.end_time < day_end:
+                events.append({'type': 'dropoff', 'at': trip.end_time, 'trip_id': trip.id,
+                               'location': trip.destination})
+
+            # Miles are apportioned to the day by the share of driving time in it.
+            driving_seconds = (driving_end - trip.start_time).total_seconds()
+            if trip.status == 'completed' and driving_seconds > 0:
+                in_day = (min(driving_end, day_end) - max(trip.start_time, day_start)).total_seconds()
+                if in_day > 0:
+                    miles += trip.distance * Decimal(in_day / driving_seconds)
+
+        for fuel in fuel_logs:
+            if day_start <= fuel.timestamp < day_end:
+                intervals.append((fuel.timestamp, fuel.timestamp + timedelta(minutes=fuel_minutes), ON_DUTY))
+                events.append({'type': 'fuel', 'at': fuel.timestamp, 'fuel_log_id': fuel.id,
+                               'location': fuel.location, 'odometer': str(fuel.odometer_reading)})
+
+        segments = build_segments(day, intervals)
+        totals = {OFF_DUTY: 0, DRIVING: 0, ON_DUTY: 0}
+        for segment in segments:
+            totals[segment['status']] += (segment['end'] - segment['start']).total_seconds()
+
+        return {
+            'segments': [
+                {'status': s['status'], 'start': s['start'].isoformat(), 'end': s['end'].isoformat()}
+                for s in segments
+            ],
+            'events': [
+                dict(event, at=event['at'].isoformat())
+                for event in sorted(events, key=lambda e: e['at'])
+            ],
+            'driving_hours': _hours(totals[DRIVING]),
+            'on_duty_hours': _hours(totals[ON_DUTY]),
+            'off_duty_hours': _hours(totals[OFF_DUTY]),
+            'miles': miles.quantize(Decimal('0.01')),
+        }
+
+    def generate_daily_logs(self, date_start, date_end):
+        """Return ``DailyLog`` rows for every day in the range, rebuilding only stale days."""
+        days = [date_start + timedelta(days=i) for i in range((date_end - date_start).days + 1)]
+        range_start, _ = _day_bounds(date_start)
+        _, range_end = _day_bounds(date_end)
+
+        trips = self._trips(range_start, range_end)
+        fuel_logs = self._fuel_logs(range_start, range_end)
+        versions = self.input_versions(
+            days, trips, fuel_logs, self._location_summary(range_start, range_end), self._track_versions(trips)
+        )
+        cached = {log.day: log for log in DailyLog.objects.filter(driver=self.driver, day__in=days)}
+
+        logs = []
+        for day in days:
+            log = cached.get(day)
+            if log is None or log.input_version != versions[day]:
+                log, _ = DailyLog.objects.update_or_create(
+                    driver=self.driver, day=day,
+                    defaults=dict(self.build_day(day, trips, fuel_logs), input_version=versions[day]),
+                )
+            logs.append(log)
+        return logs
+
+    def generate_for_trip(self, trip):
+        start, end = _trip_window(trip)
+        return self.generate_daily_logs(timezone.localtime(start).date(), timezone.localtime(end).date())
@@ -0,0 +1,70 @@
+"""Streaming ZIP export of ELD daily logs for many drivers and days.
+
+``export_archive`` is a generator of ZIP bytes. Drivers are processed one
+at a time: their daily logs are generated (reusing cached ``DailyLog``
+rows), each day is written as ``<driver>/<day>.json`` plus the requested
+sheets from the render cache, and whatever the archive has produced so far
+is yielded after every member. Memory therefore stays at about one
+driver's logs and one file chunk, however many drivers and days are asked
+for.
+"""
+import json
+import zipfile
+
+from django.utils.text import slugify
+
+from .eld import ELDGenerator
+from .eld_render import sheet_path
+from .serializers import DailyLogSerializer, ELDExportSerializer
+
+EXPORT_FORMATS = ELDExportSerializer.FORMATS
+
+
+class _ChunkBuffer:
+    """Write-only sink for ``ZipFile`` whose contents are drained by the generator.
+
+    It has no ``tell``/``seek``, so ``ZipFile`` writes in streaming mode
+    (data descriptors after each member) and never goes back.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def driver_folder(driver):
+    return f'{driver.pk}-{slugify(driver.license_number) or "driver"}'
+
+
+def export_archive(drivers, date_start, date_end, formats=EXPORT_FORMATS):
+    """Yield the bytes of a ZIP holding every driver's logs for the date range."""
+    buffer = _ChunkBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for driver in drivers:
+            folder = driver_folder(driver)
+            for log in ELDGenerator(driver).generate_daily_logs(date_start, date_end):
+                # Sheets are drawn from the log's driver.
+                log.driver = driver
+                day = log.day.isoformat()
+                if 'json' in formats:
+                    archive.writestr(
+                        f'{folder}/{day}.json',
+                        json.dumps(DailyLogSerializer(log).data, indent=2),
+                    )
+                    yield buffer.drain()
+                for fmt in ('svg', 'pdf'):
+                    if fmt in formats:
+                        archive.write(sheet_path(log, fmt), f'{folder}/{day}.{fmt}')
+                        yield buffer.drain()
+    yield buffer.drain()
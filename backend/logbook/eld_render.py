@@ -0,0 +1,243 @@
+"""Server-side rendering of ``DailyLog`` rows as driver log sheets.
+
+The sheet is the standard 24-hour grid: one row per duty status, the duty
+line drawn across it, hour totals on the right, and the day's events as
+remarks below. It is described once as a list of drawing primitives and
+written out both as SVG and as a single-page PDF, so the two formats
+always match.
+
+Rendered files are stored under ``ELD_RENDER_ROOT`` named by a hash of
+everything drawn on the sheet. ``sheet_path`` only renders when that file
+does not exist yet, so an unchanged day is rendered once and later
+downloads are plain file reads.
+"""
+from datetime import datetime
+import hashlib
+import json
+import os
+from pathlib import Path
+import tempfile
+
+from django.conf import settings
+from django.utils import timezone
+
+from .eld import DRIVING, OFF_DUTY, ON_DUTY, _day_bounds
+
+# Bump when the sheet layout changes so every cached file is re-rendered.
+RENDER_VERSION = 1
+
+FORMATS = {
+    'svg': 'image/svg+xml',
+    'pdf': 'application/pdf',
+}
+
+# US letter, landscape, in points (SVG user units are the same size).
+WIDTH = 792
+HEIGHT = 612
+GRID_LEFT = 150
+GRID_WIDTH = 576
+GRID_TOP = 160
+ROW_HEIGHT = 30
+SLEEPER = 'sleeper_berth'
+ROWS = [
+    (OFF_DUTY, '1. Off Duty'),
+    (SLEEPER, '2. Sleeper Berth'),
+    (DRIVING, '3. Driving'),
+    (ON_DUTY, '4. On Duty (not driving)'),
+]
+ROW_INDEX = {status: i for i, (status, _) in enumerate(ROWS)}
+HOUR_LABELS = ['Mid'] + [str(h) for h in range(1, 12)] + ['Noon'] + [str(h) for h in range(1, 12)] + ['Mid']
+
+
+def sheet_content(log):
+    """Everything drawn on ``log``'s sheet, as a JSON-serialisable dict."""
+    return {
+        'version': RENDER_VERSION,
+        'day': log.day.isoformat(),
+        'driver': log.driver.get_full_name() or log.driver.username,
+        'license': log.driver.license_number,
+        'segments': log.segments,
+        'events': log.events,
+        'hours': {
+            OFF_DUTY: str(log.off_duty_hours),
+            DRIVING: str(log.driving_hours),
+            ON_DUTY: str(log.on_duty_hours),
+        },
+        'miles': str(log.miles),
+    }
+
+
+def content_hash(content):
+    return hashlib.sha256(json.dumps(content, sort_keys=True).encode()).hexdigest()
+
+
+def _x(day_start, value):
+    seconds = (datetime.fromisoformat(value) - day_start).total_seconds()
+    return GRID_LEFT + GRID_WIDTH * min(max(seconds / 86400, 0), 1)
+
+
+def _row_middle(status):
+    return GRID_TOP + ROW_INDEX[status] * ROW_HEIGHT + ROW_HEIGHT / 2
+
+
+def sheet_primitives(content):
+    """Drawing primitives for a sheet.
+
+    Each is ``('line', x1, y1, x2, y2, width)``, ``('rect', x, y, w, h)`` or
+    ``('text', x, y, text, size, anchor)`` with ``anchor`` one of
+    ``start``/``middle``/``end``; y grows downwards.
+    """
+    day = datetime.fromisoformat(content['day']).date()
+    day_start, _ = _day_bounds(day)
+    grid_bottom = GRID_TOP + len(ROWS) * ROW_HEIGHT
+    grid_right = GRID_LEFT + GRID_WIDTH
+    hour_width = GRID_WIDTH / 24
+    shapes = [
+        ('text', WIDTH / 2, 40, "Driver's Daily Log", 18, 'middle'),
+        ('text', 40, 75, f"Date: {day.strftime('%m/%d/%Y')}", 11, 'start'),
+        ('text', 40, 95, f"Driver: {content['driver']}", 11, 'start'),
+        ('text', 320, 75, f"License: {content['license']}", 11, 'start'),
+        ('text', 320, 95, f"Total miles driving today: {content['miles']}", 11, 'start'),
+        ('rect', GRID_LEFT, GRID_TOP, GRID_WIDTH, len(ROWS) * ROW_HEIGHT),
+        ('text', grid_right + 33, GRID_TOP - 8, 'Total', 9, 'middle'),
+    ]
+
+    for hour, label in enumerate(HOUR_LABELS):
+        x = GRID_LEFT + hour * hour_width
+        shapes.append(('text', x, GRID_TOP - 8, label, 7, 'middle'))
+        if 0 < hour < 24:
+            shapes.append(('line', x, GRID_TOP, x, grid_bottom, 0.5))
+    for i, (status, label) in enumerate(ROWS):
+        top = GRID_TOP + i * ROW_HEIGHT
+        if i:
+            shapes.append(('line', GRID_LEFT, top, grid_right, top, 0.5))
+        shapes.append(('text', 40, top + ROW_HEIGHT / 2 + 3, label, 8, 'start'))
+        shapes.append(('text', grid_right + 33, top + ROW_HEIGHT / 2 + 3,
+                       content['hours'].get(status, '0.00'), 9, 'middle'))
+        for quarter in range(96):
+            if quarter % 4:
+                x = GRID_LEFT + quarter * hour_width / 4
+                tick = ROW_HEIGHT / 2 if quarter % 4 == 2 else ROW_HEIGHT / 4
+                shapes.append(('line', x, top, x, top + tick, 0.3))
+
+    previous = None
+    for segment in content['segments']:
+        y = _row_middle(segment['status'])
+        x1, x2 = _x(day_start, segment['start']), _x(day_start, segment['end'])
+        if previous is not None:
+            shapes.append(('line', x1, previous, x1, y, 2))
+        shapes.append(('line', x1, y, x2, y, 2))
+        previous = y
+
+    remarks_top = grid_bottom + 40
+    shapes.append(('text', 40, remarks_top, 'Remarks', 11, 'start'))
+    for i, event in enumerate(content['events']):
+        at = timezone.localtime(datetime.fromisoformat(event['at']))
+        x = _x(day_start, event['at'])
+        shapes.append(('line', x, grid_bottom, x, grid_bottom + 10, 1))
+        place = event.get('location') or ''
+        shapes.append(('text', 40, remarks_top + 18 + i * 14,
+                       f"{at.strftime('%H:%M')}  {event['type'].title()}  {place}".rstrip(), 9, 'start'))
+    return shapes
+
+
+def _escape_xml(text):
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('"', '&quot;')
+
+
+def render_svg(content):
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{WIDTH}" height="{HEIGHT}" '
+        f'viewBox="0 0 {WIDTH} {HEIGHT}" font-family="Helvetica, Arial, sans-serif">',
+        f'<rect width="{WIDTH}" height="{HEIGHT}" fill="#fff"/>',
+    ]
+    for shape in sheet_primitives(content):
+        kind = shape[0]
+        if kind == 'line':
+            _, x1, y1, x2, y2, width = shape
+            parts.append(f'<line x1="{x1:.2f}" y1="{y1:.2f}" x2="{x2:.2f}" y2="{y2:.2f}" '
+                         f'stroke="#000" stroke-width="{width}"/>')
+        elif kind == 'rect':
+            _, x, y, w, h = shape
+            parts.append(f'<rect x="{x:.2f}" y="{y:.2f}" width="{w:.2f}" height="{h:.2f}" '
+                         f'fill="none" stroke="#000" stroke-width="1"/>')
+        else:
+            _, x, y, text, size, anchor = shape
+            parts.append(f'<text x="{x:.2f}" y="{y:.2f}" font-size="{size}" '
+                         f'text-anchor="{anchor}">{_escape_xml(text)}</text>')
+    parts.append('</svg>')
+    return '\n'.join(parts).encode()
+
+
+def _escape_pdf(text):
+    text = text.encode('latin-1', 'replace').decode('latin-1')
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def render_pdf(content):
+    """A single-page PDF of the sheet using only the built-in Helvetica font."""
+    ops = []
+    for shape in sheet_primitives(content):
+        kind = shape[0]
+        if kind == 'line':
+            _, x1, y1, x2, y2, width = shape
+            ops.append(f'{width} w {x1:.2f} {HEIGHT - y1:.2f} m {x2:.2f} {HEIGHT - y2:.2f} l S')
+        elif kind == 'rect':
+            _, x, y, w, h = shape
+            ops.append(f'1 w {x:.2f} {HEIGHT - y - h:.2f} {w:.2f} {h:.2f} re S')
+        else:
+            _, x, y, text, size, anchor = shape
+            # Helvetica averages about half an em per character.
+            width = len(text) * size * 0.5
+            if anchor == 'middle':
+                x -= width / 2
+            elif anchor == 'end':
+                x -= width
+            ops.append(f'BT /F1 {size} Tf {x:.2f} {HEIGHT - y:.2f} Td ({_escape_pdf(text)}) Tj ET')
+    stream = '\n'.join(ops).encode('latin-1')
+
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {WIDTH} {HEIGHT}] '
+        f'/Resources << /Font << /F1 4 0 R >> >> /Contents 5 0 R >>'.encode(),
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>',
+        f'<< /Length {len(stream)} >>\nstream\n'.encode() + stream + b'\nendstream',
+    ]
+    out = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f'{number} 0 obj\n'.encode() + body + b'\nendobj\n'
+    xref = len(out)
+    out += f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n'.encode()
+    for offset in offsets:
+        out += f'{offset:010d} 00000 n \n'.encode()
+    out += f'trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode()
+    return bytes(out)
+
+
+RENDERERS = {
+    'svg': render_svg,
+    'pdf': render_pdf,
+}
+
+
+def render_root():
+    return Path(getattr(settings, 'ELD_RENDER_ROOT', settings.BASE_DIR / 'eld_renders'))
+
+
+def sheet_path(log, fmt):
+    """Path of ``log``'s rendered sheet in ``fmt``, rendering it only if not cached."""
+    content = sheet_content(log)
+    digest = content_hash(content)
+    path = render_root() / digest[:2] / f'{digest}.{fmt}'
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first so concurrent readers never see a
+        # partial sheet; the rename is atomic.
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(RENDERERS[fmt](content))
+        os.replace(tmp, path)
+    return path
@@ -0,0 +1,73 @@
+"""Fleet-wide live positions for the admin map.
+
+Every ingestion path calls ``publish_positions`` after broadcasting to the
+trip group. It sends one ``fleet.position`` message per batch to the
+``fleet`` group, holding only the newest fix of the batch, so a 100-point
+batch costs one message.
+
+Each ``FleetConsumer`` (admins only, ``ws/fleet/``) feeds those messages
+into a ``PositionCoalescer``, which keeps the latest position per vehicle.
+Every ``1 / FLEET_FRAME_HZ`` seconds the consumer sends one
+``fleet_frame`` with the vehicles whose position changed since the last
+frame. The socket's outbound traffic is therefore at most one frame per
+tick with one entry per vehicle, whatever the GPS rate: a truck reporting
+every second and one reporting every minute cost the same on a 1 Hz map.
+"""
+from .broadcaster import get_broadcaster
+
+FLEET_GROUP = 'fleet'
+
+
+def vehicle_position(trip, location, arrived=False):
+    return {
+        'vehicle_id': trip.vehicle_id,
+        'trip_id': trip.id,
+        'driver_id': trip.driver_id,
+        'lat': location.lat,
+        'lng': location.lng,
+        'speed': location.speed,
+        'accuracy': location.accuracy,
+        'recorded_at': location.recorded_at.isoformat(),
+        'arrived': arrived,
+    }
+
+
+def publish_positions(trip, locations, arrived=False):
+    """Queue the newest of ``locations`` for the fleet group."""
+    if not locations:
+        return
+    latest = max(locations, key=lambda location: location.recorded_at)
+    get_broadcaster().publish(FLEET_GROUP, {
+        'type': 'fleet.position',
+        'timestamp': latest.recorded_at.timestamp(),
+        'position': vehicle_position(trip, latest, arrived),
+    })
+
+
+class PositionCoalescer:
+    """Latest position per vehicle, and which ones changed since the last ``take``."""
+
+    def __init__(self):
+        self.latest = {}
+        self.sent = {}
+        self.dirty = set()
+
+    def update(self, timestamp, position):
+        vehicle = position['vehicle_id']
+        current = self.latest.get(vehicle)
+        if current is not None and current[0] > timestamp:
+            # An older fix delivered late; the map already shows a newer one.
+            return
+        self.latest[vehicle] = (timestamp, position)
+        self.dirty.add(vehicle)
+
+    def take(self):
+        """Positions that differ from what the previous frames sent."""
+        changed = []
+        for vehicle in sorted(self.dirty, key=str):
+            position = self.latest[vehicle][1]
+            if self.sent.get(vehicle) != position:
+                self.sent[vehicle] = position
+                changed.append(position)
+        self.dirty.clear()
+        return changed
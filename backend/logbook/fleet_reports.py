@@ -0,0 +1,173 @@
+"""Fleet-wide compliance report generation.
+
+A ``ReportRun`` is split into chunks of consecutive driver ids. Chunks are
+processed in a process pool; each one computes its drivers' reports with
+``build_reports`` (four queries per chunk), writes them with ``bulk_create``
+and marks itself complete in the same transaction. Re-running a run only
+processes chunks that have not completed, which is how interrupted runs
+resume.
+
+A running run's ``heartbeat_at`` is bumped whenever a chunk completes.
+``claim_report_run`` only hands a run to a new worker if it is not running
+or its heartbeat is older than ``REPORT_RUN_STALE_SECONDS``, so two workers
+never process the same chunks.
+"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import timedelta
+import logging
+import subprocess
+import sys
+import threading
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import ComplianceReport, Driver, ReportRun, ReportRunChunk
+from .reports import build_reports
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 200
+
+
+def run_drivers(run):
+    drivers = Driver.objects.filter(is_active=True)
+    if run.driver_ids is not None:
+        drivers = drivers.filter(pk__in=run.driver_ids)
+    return drivers
+
+
+def create_report_run(date_start, date_end, driver_ids=None, created_by=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Create a run and its driver-id range chunks."""
+    with transaction.atomic():
+        run = ReportRun.objects.create(
+            date_start=date_start,
+            date_end=date_end,
+            driver_ids=driver_ids,
+            created_by=created_by,
+        )
+        ids = list(run_drivers(run).order_by('pk').values_list('pk', flat=True))
+        ReportRunChunk.objects.bulk_create([
+            ReportRunChunk(
+                run=run,
+                first_driver_id=batch[0],
+                last_driver_id=batch[-1],
+                driver_count=len(batch),
+            )
+            for batch in (ids[i:i + chunk_size] for i in range(0, len(ids), chunk_size))
+        ])
+        run.total_drivers = len(ids)
+        run.save(update_fields=['total_drivers'])
+    return run
+
+
+def process_chunk(chunk_id):
+    """Generate the reports of one chunk; returns the number written (0 if already done).
+
+    Reports are computed before the write transaction so the chunk row is only
+    locked for the insert itself.
+    """
+    chunk = ReportRunChunk.objects.select_related('run').get(pk=chunk_id)
+    if chunk.completed_at is not None:
+        return 0
+    run = chunk.run
+    driver_ids = list(run_drivers(run).filter(
+        pk__gte=chunk.first_driver_id, pk__lte=chunk.last_driver_id
+    ).values_list('pk', flat=True))
+    fields = build_reports(driver_ids, run.date_start, run.date_end)
+
+    with transaction.atomic():
+        if ReportRunChunk.objects.select_for_update().filter(
+            pk=chunk_id, completed_at__isnull=False
+        ).exists():
+            return 0
+        ComplianceReport.objects.bulk_create([
+            ComplianceReport(
+                driver_id=driver_id,
+                date_start=run.date_start,
+                date_end=run.date_end,
+                run=run,
+                **fields[driver_id]
+            )
+            for driver_id in driver_ids
+        ], batch_size=500)
+        ReportRunChunk.objects.filter(pk=chunk_id).update(completed_at=timezone.now())
+        ReportRun.objects.filter(pk=run.pk).update(
+            completed_drivers=F('completed_drivers') + len(driver_ids), heartbeat_at=timezone.now()
+        )
+    return len(driver_ids)
+
+
+def _init_worker():
+    import django
+    django.setup()
+    # Never reuse a connection inherited from the parent process.
+    connections.close_all()
+
+
+def execute_report_run(run, workers=1, progress=None):
+    """Process every pending chunk of ``run``.
+
+    ``progress`` is called with ``(done_chunks, total_chunks, reports_written)``
+    after each chunk. With ``workers=1`` chunks run in this process.
+    """
+    pending = list(run.chunks.filter(completed_at__isnull=True).values_list('pk', flat=True))
+    total = run.chunks.count()
+    done = total - len(pending)
+    ReportRun.objects.filter(pk=run.pk).update(status='running', error='', heartbeat_at=timezone.now())
+
+    try:
+        if workers <= 1:
+            for chunk_id in pending:
+                written = process_chunk(chunk_id)
+                done += 1
+                if progress:
+                    progress(done, total, written)
+        else:
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+                futures = [pool.submit(process_chunk, chunk_id) for chunk_id in pending]
+                for future in as_completed(futures):
+                    written = future.result()
+                    done += 1
+                    if progress:
+                        progress(done, total, written)
+    except Exception as e:
+        logger.exception('Report run %s failed', run.pk)
+        ReportRun.objects.filter(pk=run.pk).update(status='failed', error=str(e))
+        raise
+
+    ReportRun.objects.filter(pk=run.pk).update(status='completed', finished_at=timezone.now())
+    run.refresh_from_db()
+    return run
+
+
+def claim_report_run(run):
+    """Mark ``run`` running for a new worker; ``False`` if it is completed or still alive."""
+    stale = timezone.now() - timedelta(seconds=getattr(settings, 'REPORT_RUN_STALE_SECONDS', 900))
+    claimed = ReportRun.objects.filter(pk=run.pk).exclude(status='completed').filter(
+        ~Q(status='running') | Q(heartbeat_at__isnull=True) | Q(heartbeat_at__lt=stale)
+    ).update(status='running', error='', heartbeat_at=timezone.now())
+    run.refresh_from_db()
+    return bool(claimed)
+
+
+def launch_report_run(run):
+    """Start ``generate_fleet_reports --resume`` for ``run`` in a detached process.
+
+    The child gets its own session so it outlives the request; a daemon thread
+    waits on it so it is reaped instead of lingering as a zombie.
+    """
+    process = subprocess.Popen(
+        [
+            sys.executable, str(settings.BASE_DIR / 'manage.py'), 'generate_fleet_reports',
+            '--resume', str(run.pk),
+            '--workers', str(getattr(settings, 'FLEET_REPORT_WORKERS', 4)),
+        ],
+        stdin=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    threading.Thread(target=process.wait, name=f'report-run-{run.pk}', daemon=True).start()
+    return process
@@ -0,0 +1,73 @@
+"""Maintenance of the per-driver refuel mileage counter (``DriverFuelState``).
+
+The counter holds the distance of completed trips that ended after the
+driver's latest fuel log (or of every completed trip if the driver has never
+fuelled), which is what ``Driver.miles_since_last_fuel`` used to compute on
+each call.
+"""
+from decimal import Decimal
+
+from django.db.models import F, Q, Sum
+
+from .models import Driver, DriverFuelState, FuelLog, Trip
+
+
+def compute_fuel_state(driver_id):
+    """Return ``(last_fuel_at, miles)`` from the fuel log and trip tables."""
+    last_fuel_at = FuelLog.objects.filter(driver_id=driver_id).order_by('-timestamp').values_list(
+        'timestamp', flat=True
+    ).first()
+    trips = Trip.objects.filter(driver_id=driver_id, status='completed')
+    if last_fuel_at is not None:
+        trips = trips.filter(end_time__gt=last_fuel_at)
+    miles = trips.aggregate(total=Sum('distance'))['total'] or Decimal('0.00')
+    return last_fuel_at, miles
+
+
+def refresh_fuel_state(driver_id, create=True):
+    """Recompute one driver's counter from scratch and store it.
+
+    With ``create=False`` only an existing row is updated; delete handlers use
+    this so a cascading driver delete never re-creates the row.
+    """
+    last_fuel_at, miles = compute_fuel_state(driver_id)
+    if not create:
+        DriverFuelState.objects.filter(driver_id=driver_id).update(
+            last_fuel_at=last_fuel_at, miles_since_fuel=miles
+        )
+        return None
+    state, _ = DriverFuelState.objects.update_or_create(
+        driver_id=driver_id,
+        defaults={'last_fuel_at': last_fuel_at, 'miles_since_fuel': miles},
+    )
+    return state
+
+
+def fuel_state_for(driver_id):
+    return DriverFuelState.objects.filter(driver_id=driver_id).first() or refresh_fuel_state(driver_id)
+
+
+def add_trip_miles(driver_id, end_time, distance):
+    """Add a newly completed trip to the counter in a single UPDATE.
+
+    Trips that ended before the latest fuel log do not count. If the driver has
+    no counter row yet it is built from scratch, which already includes the trip.
+    """
+    updated = DriverFuelState.objects.filter(
+        Q(last_fuel_at__isnull=True) | Q(last_fuel_at__lt=end_time),
+        driver_id=driver_id,
+    ).update(miles_since_fuel=F('miles_since_fuel') + distance)
+    if not updated and not DriverFuelState.objects.filter(driver_id=driver_id).exists():
+        refresh_fuel_state(driver_id)
+
+
+def rebuild_fuel_state(driver_ids=None):
+    """Recompute the counter for ``driver_ids`` (or every driver); returns the count."""
+    drivers = Driver.objects.all()
+    if driver_ids is not None:
+        drivers = drivers.filter(pk__in=driver_ids)
+    count = 0
+    for driver_id in drivers.values_list('pk', flat=True).iterator():
+        refresh_fuel_state(driver_id)
+        count += 1
+    return count
@@ -0,0 +1,317 @@
+"""Geofences and the trip state changes they drive.
+
+Fences are circles or polygons: each trip's pickup and destination (circles
+of ``ARRIVAL_RADIUS_METERS`` around its coordinates) plus the shared
+``Geofence`` rows (yards, fuel stops, customer sites). Shared fences live in
+a ``GridIndex`` of ``GEOFENCE_GRID_DEGREES`` cells, so a fix is only measured
+against the fences whose bounding box covers its cell. Each fence measures
+in a flat projection around its own centre, computed once when the index is
+built, so a batch of fixes costs a few multiplications per candidate fence
+and no trigonometry. The index is rebuilt when the stored fences' version
+(their count and latest ``updated_at``) moves. Each process re-reads the
+version at most every ``GEOFENCE_INDEX_CHECK_SECONDS``, so an edit made
+through any worker reaches all of them within that delay. The signal
+handlers expire the cached version at once.
+
+``process_fixes(trip, locations)`` runs a time-ordered batch through the
+fences and stores the resulting ``GeofenceEvent`` rows:
+
+* a fix *enters* a fence when it lies inside it and only *exits* once it is
+  more than ``GEOFENCE_EXIT_MARGIN_METERS`` outside, so jitter at the edge
+  does not flap;
+* *dwell* is emitted once per visit after ``GEOFENCE_DWELL_SECONDS`` inside;
+* fixes with an accuracy worse than ``GEOFENCE_MAX_ACCURACY_METERS`` are
+  ignored.
+
+The trip's latest event per fence is its state for that fence, so single
+posts, batches and the WebSocket share it. Leaving the pickup starts a
+pending trip; dwelling at the destination completes it.
+"""
+from collections import defaultdict
+from dataclasses import dataclass, field
+from itertools import chain
+from math import cos, floor, hypot, radians
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max
+
+from .models import Geofence, GeofenceEvent, Trip
+
+VERSION_KEY = 'geofence:index:version'
+
+# Metres per degree of latitude (and of longitude at the equator).
+METRES_PER_DEGREE = 6371000 * 3.141592653589793 / 180
+
+
+def _contains(vertices, x, y):
+    """Even-odd rule point-in-polygon test on projected vertices."""
+    inside = False
+    x1, y1 = vertices[-1]
+    for x2, y2 in vertices:
+        if (y1 > y) != (y2 > y) and x < (x2 - x1) * (y - y1) / (y2 - y1) + x1:
+            inside = not inside
+        x1, y1 = x2, y2
+    return inside
+
+
+def _segment_distance(x, y, x1, y1, x2, y2):
+    dx, dy = x2 - x1, y2 - y1
+    length = dx * dx + dy * dy
+    t = 0.0 if length == 0 else max(0.0, min(1.0, ((x - x1) * dx + (y - y1) * dy) / length))
+    return hypot(x - x1 - t * dx, y - y1 - t * dy)
+
+
+@dataclass
+class Fence:
+    """A circle (``radius`` metres) or polygon (``[(lat, lng), ...]``) to track trips against."""
+    key: str
+    kind: str
+    name: str
+    lat: float
+    lng: float
+    radius: float = 0.0
+    polygon: tuple = ()
+    geofence_id: int = None
+    _scale: float = field(init=False, repr=False)
+    _vertices: list = field(init=False, repr=False)
+    reach: float = field(init=False)
+
+    def __post_init__(self):
+        self._scale = cos(radians(self.lat)) * METRES_PER_DEGREE
+        self._vertices = [self._project(lat, lng) for lat, lng in self.polygon]
+        if self._vertices:
+            self.reach = max(hypot(x, y) for x, y in self._vertices)
+        else:
+            self.reach = self.radius
+
+    @classmethod
+    def from_geofence(cls, geofence):
+        polygon = tuple((float(lat), float(lng)) for lat, lng in geofence.polygon or ())
+        if polygon:
+            lat = sum(vertex[0] for vertex in polygon) / len(polygon)
+            lng = sum(vertex[1] for vertex in polygon) / len(polygon)
+        else:
+            lat, lng = geofence.lat, geofence.lng
+        return cls(
+            key=f'geofence:{geofence.pk}', kind=geofence.kind, name=geofence.name,
+            lat=lat, lng=lng, radius=geofence.radius or 0.0, polygon=polygon,
+            geofence_id=geofence.pk,
+        )
+
+    def _project(self, lat, lng):
+        return (lng - self.lng) * self._scale, (lat - self.lat) * METRES_PER_DEGREE
+
+    def distance(self, lat, lng):
+        """Metres from ``(lat, lng)`` to the fence; 0 inside it."""
+        x, y = self._project(lat, lng)
+        if not self._vertices:
+            return max(0.0, hypot(x, y) - self.radius)
+        if _contains(self._vertices, x, y):
+            return 0.0
+        vertices = self._vertices
+        return min(
+            _segment_distance(x, y, *vertices[i - 1], *vertices[i])
+            for i in range(len(vertices))
+        )
+
+    def bounds(self, margin):
+        """``(south, west, north, east)`` in degrees, widened by ``margin`` metres."""
+        dlat = (self.reach + margin) / METRES_PER_DEGREE
+        dlng = (self.reach + margin) / max(self._scale, 1.0)
+        return self.lat - dlat, self.lng - dlng, self.lat + dlat, self.lng + dlng
+
+
+class GridIndex:
+    """Fences bucketed by the grid cells their bounds (plus the exit margin) cover."""
+
+    def __init__(self, fences, cell_degrees, margin, version=None):
+        self.cell_degrees = cell_degrees
+        self.version = version
+        self.by_key = {}
+        self.cells = defaultdict(list)
+        for fence in fences:
+            self.by_key[fence.key] = fence
+            south, west, north, east = fence.bounds(margin)
+            for row in range(self._cell(south), self._cell(north) + 1):
+                for column in range(self._cell(west), self._cell(east) + 1):
+                    self.cells[(row, column)].append(fence)
+
+    def _cell(self, degrees):
+        return floor(degrees / self.cell_degrees)
+
+    def candidates(self, lat, lng):
+        return self.cells.get((self._cell(lat), self._cell(lng)), ())
+
+
+def index_version():
+    """Version of the stored fences, cached for ``GEOFENCE_INDEX_CHECK_SECONDS``."""
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        stored = Geofence.objects.aggregate(count=Count('id'), latest=Max('updated_at'))
+        version = f"{stored['count']}:{stored['latest'].isoformat() if stored['latest'] else ''}"
+        cache.set(VERSION_KEY, version, getattr(settings, 'GEOFENCE_INDEX_CHECK_SECONDS', 5))
+    return version
+
+
+def invalidate_index():
+    """Re-read the fences' version on next use instead of waiting for it to expire."""
+    cache.delete(VERSION_KEY)
+
+
+_index = None
+
+
+def get_index():
+    """The shared-fence index, rebuilt when the fences' version moves."""
+    global _index
+    version = index_version()
+    if _index is None or _index.version != version:
+        _index = GridIndex(
+            [Fence.from_geofence(geofence) for geofence in Geofence.objects.filter(is_active=True)],
+            getattr(settings, 'GEOFENCE_GRID_DEGREES', 0.01),
+            getattr(settings, 'GEOFENCE_EXIT_MARGIN_METERS', 50),
+            version=version,
+        )
+    return _index
+
+
+def trip_fences(trip):
+    """The trip's own pickup and destination circles."""
+    radius = getattr(settings, 'ARRIVAL_RADIUS_METERS', 75)
+    fences = []
+    for kind, lat, lng in (
+        ('pickup', trip.pickup_lat, trip.pickup_lng),
+        ('destination', trip.destination_lat, trip.destination_lng),
+    ):
+        if lat is not None and lng is not None:
+            fences.append(Fence(key=kind, kind=kind, name=kind, lat=float(lat), lng=float(lng), radius=radius))
+    return fences
+
+
+@dataclass
+class FenceState:
+    inside: bool
+    entered_at: object
+    dwelled: bool
+    updated_at: object
+
+
+def trip_state(trip):
+    """Per-fence state replayed from the trip's events."""
+    state = {}
+    for fence, event, occurred_at in GeofenceEvent.objects.filter(trip=trip).values_list(
+        'fence', 'event', 'occurred_at'
+    ).order_by('occurred_at', 'id'):
+        if event == GeofenceEvent.ENTER:
+            state[fence] = FenceState(True, occurred_at, False, occurred_at)
+        elif event == GeofenceEvent.DWELL and fence in state:
+            state[fence].dwelled = True
+            state[fence].updated_at = occurred_at
+        elif event == GeofenceEvent.EXIT:
+            state[fence] = FenceState(False, None, False, occurred_at)
+    return state
+
+
+def evaluate(trip, locations, state):
+    """Unsaved ``GeofenceEvent`` rows for ``locations`` (sorted by time); updates ``state``."""
+    margin = getattr(settings, 'GEOFENCE_EXIT_MARGIN_METERS', 50)
+    dwell_seconds = getattr(settings, 'GEOFENCE_DWELL_SECONDS', 60)
+    max_accuracy = getattr(settings, 'GEOFENCE_MAX_ACCURACY_METERS', 100)
+    own = trip_fences(trip)
+    index = get_index()
+    fences = {fence.key: fence for fence in own}
+    fences.update(index.by_key)
+    events = []
+
+    def emit(fence, event, location):
+        events.append(GeofenceEvent(
+            trip=trip, geofence_id=fence.geofence_id, fence=fence.key, kind=fence.kind,
+            event=event, lat=location.lat, lng=location.lng, occurred_at=location.recorded_at,
+        ))
+
+    for location in locations:
+        if location.accuracy is not None and location.accuracy > max_accuracy:
+            continue
+        at = location.recorded_at
+        # Fences near the fix, plus any the trip is inside (so far-away fixes still exit them).
+        near = {fence.key: fence for fence in chain(own, index.candidates(location.lat, location.lng))}
+        for key, current in state.items():
+            if current.inside and key not in near and key in fences:
+                near[key] = fences[key]
+        for fence in near.values():
+            current = state.get(fence.key)
+            if current is not None and at < current.updated_at:
+                # Older than what this fence has already seen.
+                continue
+            distance = fence.distance(location.lat, location.lng)
+            if current is None or not current.inside:
+                if distance == 0:
+                    state[fence.key] = FenceState(True, at, False, at)
+                    emit(fence, GeofenceEvent.ENTER, location)
+            elif distance > margin:
+                state[fence.key] = FenceState(False, None, False, at)
+                emit(fence, GeofenceEvent.EXIT, location)
+            elif not current.dwelled and (at - current.entered_at).total_seconds() >= dwell_seconds:
+                current.dwelled = True
+                current.updated_at = at
+                emit(fence, GeofenceEvent.DWELL, location)
+    return events
+
+
+def apply_events(trip, events):
+    """Move ``trip`` along its lifecycle; returns True if it was completed.
+
+    The transitions are applied to the stored trip, locked for the update,
+    and only its status and end time are written: ``trip`` may be stale (a
+    WebSocket keeps one per connection), and a trip cancelled or edited
+    meanwhile must stay that way. ``trip`` is then brought up to date.
+    """
+    transitions = [
+        event for event in events
+        if (event.fence, event.event) in (('pickup', GeofenceEvent.EXIT), ('destination', GeofenceEvent.DWELL))
+    ]
+    if not transitions:
+        return False
+    changed = arrived = False
+    with transaction.atomic():
+        stored = Trip.objects.select_for_update().filter(pk=trip.pk).first()
+        if stored is None:
+            return False
+        for event in transitions:
+            if event.fence == 'pickup' and stored.status == 'pending':
+                stored.status = 'in_progress'
+                changed = True
+            elif event.fence == 'destination' and stored.status in ('pending', 'in_progress'):
+                stored.status = 'completed'
+                stored.end_time = event.occurred_at
+                changed = arrived = True
+        if changed:
+            stored.save(update_fields=['status', 'end_time', 'updated_at'])
+    trip.status, trip.end_time, trip.updated_at = stored.status, stored.end_time, stored.updated_at
+    return arrived
+
+
+def event_payload(event):
+    return {
+        'fence': event.fence,
+        'kind': event.kind,
+        'event': event.event,
+        'lat': event.lat,
+        'lng': event.lng,
+        'occurred_at': event.occurred_at.isoformat(),
+    }
+
+
+def process_fixes(trip, locations):
+    """Evaluate ``locations`` (sorted by time), store their events and update the trip.
+
+    Returns ``(arrived, events)``.
+    """
+    if not locations:
+        return False, []
+    events = evaluate(trip, locations, trip_state(trip))
+    if events:
+        GeofenceEvent.objects.bulk_create(events)
+    return apply_events(trip, events), events
@@ -0,0 +1,343 @@
+"""Hours-of-service rules engine.
+
+A driver's duty history is flattened into a ``DutyTimeline``: three parallel
+typed arrays holding the start and end (epoch seconds) and status code of
+each driving or on-duty segment, sorted and non-overlapping. Gaps between
+segments are off duty. ``evaluate`` checks the property-carrying rules in
+one pass over the arrays:
+
+* ``driving_11``: at most ``HOS_DRIVING_LIMIT_HOURS`` of driving after
+  ``HOS_RESET_HOURS`` consecutive hours off duty;
+* ``window_14``: no driving after the ``HOS_WINDOW_HOURS``-th hour since
+  coming on duty after that rest;
+* ``break_30``: a ``HOS_BREAK_MINUTES`` non-driving interruption once
+  ``HOS_BREAK_AFTER_HOURS`` of driving have accumulated;
+* ``cycle_70``: no driving once ``HOURS_LIMIT_8_DAYS`` on-duty hours have
+  been worked in the rolling 8 x 24 hours, counted from the last
+  ``HOS_RESTART_HOURS`` consecutive hours off duty.
+
+The rolling cycle sum is read from a prefix-sum array with a binary search,
+so a driver's year of history is checked in time linear in its segments.
+Segments come from trips (pickup and dropoff on duty around the driving
+time) and fuel logs (on-duty stops of ``ELD_FUEL_STOP_MINUTES``), the same
+rules ``ELDGenerator`` uses.
+"""
+from array import array
+from bisect import bisect_right
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import FuelLog, Trip
+
+OFF_DUTY = 0
+DRIVING = 1
+ON_DUTY = 2
+
+CYCLE_DAYS = 8
+# History loaded before the evaluated range so shifts and the cycle that
+# started earlier are seen.
+LOOKBACK = timedelta(days=CYCLE_DAYS)
+
+RULE_DESCRIPTIONS = {
+    'driving_11': 'driving beyond the {driving}-hour driving limit',
+    'window_14': 'driving after the {window}-hour on-duty window',
+    'break_30': 'driving {break_after} hours without a {break_minutes}-minute break',
+    'cycle_70': 'driving over the {cycle}-hour/8-day limit',
+}
+
+
+def _limits():
+    return {
+        'driving': getattr(settings, 'HOS_DRIVING_LIMIT_HOURS', 11),
+        'window': getattr(settings, 'HOS_WINDOW_HOURS', 14),
+        'break_after': getattr(settings, 'HOS_BREAK_AFTER_HOURS', 8),
+        'break_minutes': getattr(settings, 'HOS_BREAK_MINUTES', 30),
+        'reset': getattr(settings, 'HOS_RESET_HOURS', 10),
+        'restart': getattr(settings, 'HOS_RESTART_HOURS', 34),
+        'cycle': getattr(settings, 'HOURS_LIMIT_8_DAYS', 70),
+    }
+
+
+def _epoch(value):
+    return int(value.timestamp())
+
+
+def _datetime(seconds):
+    return datetime.fromtimestamp(seconds, dt_timezone.utc)
+
+
+@dataclass(frozen=True)
+class Violation:
+    rule: str
+    start: datetime
+    end: datetime
+    hours: Decimal
+
+    def message(self):
+        description = RULE_DESCRIPTIONS[self.rule].format(**_limits())
+        start = timezone.localtime(self.start).strftime('%Y-%m-%d %H:%M')
+        return f"HOS violation: {description} ({self.hours} hrs from {start})."
+
+    def as_dict(self):
+        return {
+            'rule': self.rule,
+            'start': self.start.isoformat(),
+            'end': self.end.isoformat(),
+            'hours': float(self.hours),
+        }
+
+
+class DutyTimeline:
+    """Sorted, non-overlapping driving/on-duty segments as typed arrays."""
+
+    __slots__ = ('starts', 'ends', 'codes')
+
+    def __init__(self, starts=None, ends=None, codes=None):
+        self.starts = starts if starts is not None else array('q')
+        self.ends = ends if ends is not None else array('q')
+        self.codes = codes if codes is not None else array('b')
+
+    def __len__(self):
+        return len(self.starts)
+
+    @classmethod
+    def from_intervals(cls, intervals):
+        """Flatten possibly overlapping ``(start, end, code, ...)`` intervals.
+
+        On duty wins over driving where they overlap, so a fuel stop inside a
+        trip splits its driving time.
+        """
+        points = []
+        for interval in intervals:
+            start, end, code = interval[0], interval[1], interval[2]
+            if end > start and code != OFF_DUTY:
+                points.append((start, code, 1))
+                points.append((end, code, -1))
+        points.sort()
+
+        timeline = cls()
+        starts, ends, codes = timeline.starts, timeline.ends, timeline.codes
+        active = [0, 0, 0]
+        previous = None
+        i, n = 0, len(points)
+        while i < n:
+            at = points[i][0]
+            if previous is not None and at > previous:
+                code = ON_DUTY if active[ON_DUTY] else DRIVING if active[DRIVING] else OFF_DUTY
+                if code != OFF_DUTY:
+                    if codes and codes[-1] == code and ends[-1] == previous:
+                        ends[-1] = at
+                    else:
+                        starts.append(previous)
+                        ends.append(at)
+                        codes.append(code)
+            while i < n and points[i][0] == at:
+                active[points[i][1]] += points[i][2]
+                i += 1
+            previous = at
+        return timeline
+
+
+def evaluate(timeline, since=None, until=None):
+    """Return the ``Violation`` list of ``timeline``, ordered by start.
+
+    ``since``/``until`` (datetimes) keep only violations overlapping that
+    range; the whole timeline is still used as context.
+    """
+    limits = _limits()
+    hour = 3600
+    driving_limit = limits['driving'] * hour
+    window = limits['window'] * hour
+    break_after = limits['break_after'] * hour
+    break_length = limits['break_minutes'] * 60
+    reset = limits['reset'] * hour
+    restart = limits['restart'] * hour
+    cycle_limit = limits['cycle'] * hour
+    cycle_span = CYCLE_DAYS * 24 * hour
+
+    starts, ends, codes = timeline.starts, timeline.ends, timeline.codes
+    on_duty = array('q', [0])
+    for i in range(len(starts)):
+        on_duty.append(on_duty[-1] + ends[i] - starts[i])
+
+    found = []
+    # rule -> index in ``found`` of its latest violation and the shift or
+    # cycle it belongs to, so consecutive segments extend one violation.
+    latest = {}
+
+    def add(rule, period, start, end, excess):
+        previous = latest.get(rule)
+        if previous is not None and previous[1] == period:
+            entry = found[previous[0]]
+            entry[2] = end
+            entry[3] += excess
+        else:
+            latest[rule] = (len(found), period)
+            found.append([rule, start, end, excess])
+
+    shift_start = cycle_start = previous_end = run_start = None
+    shift_driving = since_break = resting = 0
+    for i in range(len(starts)):
+        start, end = starts[i], ends[i]
+        gap = None if previous_end is None else start - previous_end
+        if gap is None or gap >= reset:
+            shift_start = run_start = start
+            shift_driving = since_break = resting = 0
+        else:
+            resting += gap
+        if gap is None or gap >= restart:
+            cycle_start = start
+        previous_end = end
+
+        if codes[i] != DRIVING:
+            resting += end - start
+            continue
+        if resting >= break_length:
+            since_break = 0
+            run_start = start
+        resting = 0
+        duration = end - start
+
+        excess = shift_driving + duration - driving_limit
+        if excess > 0:
+            excess = min(excess, duration)
+            add('driving_11', shift_start, end - excess, end, excess)
+
+        window_end = shift_start + window
+        if end > window_end:
+            add('window_14', shift_start, max(start, window_end), end, end - max(start, window_end))
+
+        excess = since_break + duration - break_after
+        if excess > 0:
+            excess = min(excess, duration)
+            add('break_30', run_start, end - excess, end, excess)
+
+        cycle_from = max(end - cycle_span, cycle_start)
+        first = bisect_right(ends, cycle_from)
+        used = on_duty[i + 1] - on_duty[first] - max(0, cycle_from - starts[first])
+        excess = used - cycle_limit
+        if excess > 0:
+            excess = min(excess, duration)
+            add('cycle_70', (cycle_start, shift_start), end - excess, end, excess)
+
+        shift_driving += duration
+        since_break += duration
+
+    since = _epoch(since) if since is not None else None
+    until = _epoch(until) if until is not None else None
+    violations = [
+        Violation(
+            rule=rule,
+            start=_datetime(start),
+            end=_datetime(end),
+            hours=(Decimal(excess) / Decimal(hour)).quantize(Decimal('0.01')),
+        )
+        for rule, start, end, excess in found
+        if (since is None or end > since) and (until is None or start < until)
+    ]
+    violations.sort(key=lambda violation: violation.start)
+    return violations
+
+
+def trip_intervals(trip_id, start_time, end_time, pickup_time, dropoff_time, now=None):
+    """The duty intervals of one trip as ``(start, end, code, trip_id)`` epoch tuples."""
+    start = _epoch(start_time)
+    end = _epoch(end_time or now or timezone.now())
+    return [
+        (start - int(float(pickup_time) * 3600), start, ON_DUTY, trip_id),
+        (start, end, DRIVING, trip_id),
+        (end, end + int(float(dropoff_time) * 3600), ON_DUTY, trip_id),
+    ]
+
+
+def load_intervals(ranges, now=None):
+    """Load raw duty intervals for ``{driver_id: (since, until)}`` in two queries.
+
+    Returns ``{driver_id: [(start, end, code, trip_id), ...]}`` covering each
+    range plus ``LOOKBACK`` of history before it.
+    """
+    if not ranges:
+        return {}
+    # pickup_time/dropoff_time are at most 99.99 hours.
+    pad = timedelta(hours=100)
+    drivers_by_range = {}
+    for driver_id, bounds in ranges.items():
+        drivers_by_range.setdefault(bounds, []).append(driver_id)
+    trip_filter = Q()
+    fuel_filter = Q()
+    for (since, until), driver_ids in drivers_by_range.items():
+        since = since - LOOKBACK
+        trip_filter |= Q(driver_id__in=driver_ids, start_time__lt=until + pad) & (
+            Q(end_time__isnull=True) | Q(end_time__gt=since - pad)
+        )
+        fuel_filter |= Q(driver_id__in=driver_ids, timestamp__gte=since, timestamp__lt=until)
+
+    intervals = {driver_id: [] for driver_id in ranges}
+    trips = Trip.objects.filter(trip_filter, status__in=['in_progress', 'completed']).values_list(
+        'driver_id', 'id', 'start_time', 'end_time', 'pickup_time', 'dropoff_time'
+    )
+    for driver_id, *row in trips:
+        intervals[driver_id].extend(trip_intervals(*row, now=now))
+
+    fuel_stop = getattr(settings, 'ELD_FUEL_STOP_MINUTES', 15) * 60
+    for driver_id, timestamp in FuelLog.objects.filter(fuel_filter).values_list('driver_id', 'timestamp'):
+        start = _epoch(timestamp)
+        intervals[driver_id].append((start, start + fuel_stop, ON_DUTY, None))
+    return intervals
+
+
+def _range_bounds(date_start, date_end):
+    if isinstance(date_start, str):
+        date_start = parse_date(date_start)
+    if isinstance(date_end, str):
+        date_end = parse_date(date_end)
+    since = timezone.make_aware(datetime.combine(date_start, datetime.min.time()))
+    until = timezone.make_aware(datetime.combine(date_end + timedelta(days=1), datetime.min.time()))
+    return since, until
+
+
+def driver_violations(driver_ids, date_start, date_end, now=None):
+    """Return ``{driver_id: [Violation, ...]}`` for violations within the date range."""
+    since, until = _range_bounds(date_start, date_end)
+    intervals = load_intervals({driver_id: (since, until) for driver_id in driver_ids}, now)
+    return {
+        driver_id: evaluate(DutyTimeline.from_intervals(rows), since, until)
+        for driver_id, rows in intervals.items()
+    }
+
+
+def trip_window(trip):
+    """``(since, until)`` of a trip's duty time, pickup and dropoff included."""
+    end_time = trip.end_time or timezone.now()
+    return (
+        trip.start_time - timedelta(hours=float(trip.pickup_time)),
+        end_time + timedelta(hours=float(trip.dropoff_time)),
+    )
+
+
+def trip_violations(trip, intervals=None):
+    """Violations overlapping ``trip`` with the trip as it is in memory.
+
+    ``intervals`` are the driver's raw intervals around the trip (see
+    ``ComplianceContext.prefetch_hos``); they are loaded when not given. The
+    stored copy of the trip is replaced by its current, possibly unsaved, state.
+    """
+    if trip.driver_id is None or trip.start_time is None:
+        return []
+    since, until = trip_window(trip)
+    if intervals is None:
+        intervals = load_intervals({trip.driver_id: (since, until)})[trip.driver_id]
+    lower, upper = _epoch(since - LOOKBACK), _epoch(until)
+    rows = [
+        row for row in intervals
+        if row[1] > lower and row[0] < upper and (trip.pk is None or row[3] != trip.pk)
+    ]
+    if trip.status in ('in_progress', 'completed'):
+        rows.extend(trip_intervals(trip.pk, trip.start_time, trip.end_time, trip.pickup_time, trip.dropoff_time))
+    return evaluate(DutyTimeline.from_intervals(rows), since, until)
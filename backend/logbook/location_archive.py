@@ -0,0 +1,247 @@
+"""Cold archive files for months of ``location_updates``.
+
+Each archived month is ``LOCATION_ARCHIVE_ROOT/location_updates_YYYY_MM.lcol``
+plus a ``.json`` manifest (month, row count, block count, SHA-256 of the
+file). The file layout is documented in ``docs/LOCATION_ARCHIVE.md``:
+
+* ``b'LCOL'`` and a format version byte;
+* blocks of up to ``BLOCK_ROWS`` rows, each a little-endian ``uint32``
+  length followed by a zlib-compressed body.
+
+A block body is the row count followed by ten columns, each prefixed by its
+length in bytes. Rows are sorted by trip, time and id so the deltas stay
+small. Integer columns use the zigzag-varint delta coding from
+``logbook.track_archive``:
+
+* ``id``, ``trip_id`` and ``driver_id``;
+* ``recorded_at`` and ``created_at`` as epoch milliseconds;
+* ``lat`` and ``lng`` in micro-degrees;
+* ``speed`` (cm/s), ``accuracy`` (dm) and ``sequence``, each a presence
+  bitmap plus the deltas of the values that are present.
+
+``write_month`` streams a month out block by block, so memory stays at one
+block however large the month. ``restore_range`` reads the files back into
+the table, skipping rows whose trip no longer exists.
+"""
+from datetime import date, datetime, time, timezone as dt_timezone
+import hashlib
+import json
+import os
+from pathlib import Path
+import struct
+import zlib
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import LocationUpdate, Trip
+from .track_archive import (
+    ACCURACY_SCALE, LAT_LNG_SCALE, SPEED_SCALE, nullable_column, read_deltas, read_nullable,
+    read_varint, write_deltas, write_varint,
+)
+
+MAGIC = b'LCOL'
+FORMAT_VERSION = 1
+BLOCK_ROWS = 50000
+# Rows inserted per statement on restore.
+INSERT_CHUNK = 1000
+
+COLUMNS = ('id', 'trip_id', 'driver_id', 'recorded_at', 'created_at', 'lat', 'lng', 'speed', 'accuracy', 'sequence')
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_bound(month):
+    """Midnight UTC at the start of ``month``."""
+    return datetime.combine(month, time.min, tzinfo=dt_timezone.utc)
+
+
+def archive_root():
+    return Path(getattr(settings, 'LOCATION_ARCHIVE_ROOT', settings.BASE_DIR / 'location_archive'))
+
+
+def month_path(month):
+    return archive_root() / f'location_updates_{month:%Y_%m}.lcol'
+
+
+def archived_months():
+    """Months with an archive file, oldest first."""
+    months = []
+    for path in sorted(archive_root().glob('location_updates_*.lcol')):
+        year, month = path.stem.rsplit('_', 2)[-2:]
+        months.append(date(int(year), int(month), 1))
+    return months
+
+
+def _ms(value):
+    return round(value.timestamp() * 1000)
+
+
+def _datetime(ms):
+    return datetime.fromtimestamp(ms / 1000, tz=dt_timezone.utc)
+
+
+def _fixed(value, scale):
+    return None if value is None else round(value * scale)
+
+
+def encode_block(rows):
+    """Compress ``rows`` (tuples in ``COLUMNS`` order) into one block."""
+    count = len(rows)
+    columns = []
+    for index, convert in (
+        (0, int), (1, int), (2, int), (3, _ms), (4, _ms),
+        (5, lambda value: round(value * LAT_LNG_SCALE)), (6, lambda value: round(value * LAT_LNG_SCALE)),
+    ):
+        column = bytearray()
+        write_deltas(column, [convert(row[index]) for row in rows])
+        columns.append(column)
+    columns.append(nullable_column([_fixed(row[7], SPEED_SCALE) for row in rows], count))
+    columns.append(nullable_column([_fixed(row[8], ACCURACY_SCALE) for row in rows], count))
+    columns.append(nullable_column([row[9] for row in rows], count))
+
+    body = bytearray()
+    write_varint(body, count)
+    for column in columns:
+        write_varint(body, len(column))
+        body += column
+    return zlib.compress(bytes(body), 6)
+
+
+def decode_block(block):
+    """Rows (tuples in ``COLUMNS`` order) of a compressed block."""
+    body = zlib.decompress(block)
+    count, position = read_varint(body, 0)
+    columns = []
+    for _ in COLUMNS:
+        length, position = read_varint(body, position)
+        columns.append(body[position:position + length])
+        position += length
+
+    def scaled(values, scale):
+        return [None if value is None else value / scale for value in values]
+
+    return list(zip(
+        read_deltas(columns[0], count),
+        read_deltas(columns[1], count),
+        read_deltas(columns[2], count),
+        [_datetime(value) for value in read_deltas(columns[3], count)],
+        [_datetime(value) for value in read_deltas(columns[4], count)],
+        [value / LAT_LNG_SCALE for value in read_deltas(columns[5], count)],
+        [value / LAT_LNG_SCALE for value in read_deltas(columns[6], count)],
+        scaled(read_nullable(columns[7], count), SPEED_SCALE),
+        scaled(read_nullable(columns[8], count), ACCURACY_SCALE),
+        read_nullable(columns[9], count),
+    ))
+
+
+def read_archive(path):
+    """Yield every row of an archive file, block by block."""
+    with open(path, 'rb') as handle:
+        header = handle.read(len(MAGIC) + 1)
+        if header[:len(MAGIC)] != MAGIC or header[len(MAGIC)] != FORMAT_VERSION:
+            raise ValueError(f'{path} is not a location archive (or an unsupported format version)')
+        while True:
+            prefix = handle.read(4)
+            if not prefix:
+                return
+            (length,) = struct.unpack('<I', prefix)
+            yield from decode_block(handle.read(length))
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for chunk in iter(lambda: handle.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_month(month):
+    """Write the month's rows to ``month_path(month)``; returns the manifest."""
+    path = month_path(month)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    rows = LocationUpdate.objects.filter(
+        recorded_at__gte=month_bound(month), recorded_at__lt=month_bound(add_months(month, 1))
+    ).order_by('trip_id', 'recorded_at', 'id').values_list(*COLUMNS).iterator(chunk_size=BLOCK_ROWS)
+
+    temporary = path.with_suffix('.lcol.tmp')
+    total = blocks = 0
+    with open(temporary, 'wb') as handle:
+        handle.write(MAGIC + bytes([FORMAT_VERSION]))
+        block = []
+        for row in rows:
+            block.append(row)
+            if len(block) == BLOCK_ROWS:
+                data = encode_block(block)
+                handle.write(struct.pack('<I', len(data)) + data)
+                total, blocks, block = total + len(block), blocks + 1, []
+        if block:
+            data = encode_block(block)
+            handle.write(struct.pack('<I', len(data)) + data)
+            total, blocks = total + len(block), blocks + 1
+        handle.flush()
+        os.fsync(handle.fileno())
+
+    manifest = {
+        'table': 'location_updates',
+        'format_version': FORMAT_VERSION,
+        'month': month.strftime('%Y-%m'),
+        'rows': total,
+        'blocks': blocks,
+        'bytes': temporary.stat().st_size,
+        'sha256': _sha256(temporary),
+        'written_at': timezone.now().isoformat(),
+    }
+    # The manifest goes first: a month counts as archived once its file exists.
+    path.with_suffix('.json').write_text(json.dumps(manifest, indent=2))
+    os.replace(temporary, path)
+    return manifest
+
+
+def restore_range(start, end):
+    """Insert archived rows with ``start <= recorded_at < end`` (aware datetimes) back into the table.
+
+    Returns the number of rows restored. Files are checked against their
+    manifest first; rows already present are skipped. Restored rows keep
+    their id, but ``created_at`` is the time of the restore, as for any insert.
+    """
+    restored = 0
+    month = month_start(start)
+    while month_bound(month) < end:
+        path = month_path(month)
+        month = add_months(month, 1)
+        if not path.exists():
+            continue
+        manifest = json.loads(path.with_suffix('.json').read_text())
+        if manifest['sha256'] != _sha256(path):
+            raise ValueError(f'{path} does not match its manifest')
+        batch = []
+        for row in read_archive(path):
+            if start <= row[3] < end:
+                batch.append(row)
+                if len(batch) == INSERT_CHUNK:
+                    restored += _insert(batch)
+                    batch = []
+        restored += _insert(batch)
+    return restored
+
+
+def _insert(rows):
+    if not rows:
+        return 0
+    trips = set(Trip.objects.filter(pk__in={row[1] for row in rows}).values_list('pk', flat=True))
+    locations = [LocationUpdate(**dict(zip(COLUMNS, row))) for row in rows if row[1] in trips]
+    existing = set(LocationUpdate.objects.filter(
+        pk__in=[location.pk for location in locations]
+    ).values_list('pk', flat=True))
+    locations = [location for location in locations if location.pk not in existing]
+    LocationUpdate.objects.bulk_create(locations, ignore_conflicts=True)
+    return len(locations)
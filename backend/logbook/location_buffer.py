@@ -0,0 +1,489 @@
+"""Write-behind buffer for ``LocationUpdate`` rows.
+
+Every ingestion path (``TripViewSet.location``, the batch endpoint and the
+trip WebSocket) hands its rows to ``get_location_buffer().add()`` and
+broadcasts straight away; the rows reach the database in bulk when the
+buffer holds ``LOCATION_BUFFER_MAX_ROWS`` rows or every
+``LOCATION_BUFFER_FLUSH_SECONDS``, whichever comes first.
+
+Two backends share the flush logic:
+
+* ``local`` keeps rows in this process and drains them at interpreter exit,
+  so a graceful shutdown loses nothing;
+* ``redis`` keeps rows in a Redis list at ``REDIS_URL``, so they survive a
+  crashed worker and any process can flush them. Rows are removed from the
+  list only after the insert succeeded (at-least-once; a sequenced row
+  written twice carries its client ``recorded_at`` both times and is
+  dropped by the ``(trip, sequence, recorded_at)`` constraint).
+
+Sequenced rows are also deduplicated before they are queued. The buffer
+keeps the ``(trip, sequence)`` pairs it holds and ``claim`` reserves pairs
+atomically, so a retry that arrives before the flush finds its sequences
+taken. A pair is released once its row is written. ``ingest_batch`` claims
+before it looks for stored rows, so a retry racing a flush sees the row in
+one place or the other. The ``redis`` backend keeps the pairs in Redis
+sets, shared by every process.
+
+A chunk the database rejects is retried row by row. Rows that fail on
+their own (bad data rather than a lost connection) are logged and moved to
+a capped quarantine list, so they cannot hold back the rows queued after
+them; any other error leaves the whole chunk queued for the next flush.
+
+With ``LOCATION_BUFFER_FLUSH_SECONDS = 0`` no background thread is started
+and a full buffer is flushed by the caller, which the test settings use to
+keep writes synchronous.
+"""
+import atexit
+from collections import deque
+from contextlib import contextmanager
+from itertools import islice
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import DataError, IntegrityError, ProgrammingError, close_old_connections, transaction
+from django.utils.dateparse import parse_datetime
+
+from .models import LocationUpdate
+
+logger = logging.getLogger(__name__)
+
+# Rows taken from the buffer per insert statement.
+FLUSH_CHUNK = 1000
+
+# Lifetime of a trip's reserved sequences in Redis, in case their rows are
+# never flushed.
+CLAIM_TTL = 3600
+
+# Rows kept in the quarantine list for inspection; older ones are dropped.
+QUARANTINE_MAX = 1000
+
+# Errors that condemn a single row rather than the database connection.
+ROW_ERRORS = (DataError, IntegrityError, ProgrammingError, TypeError, ValueError)
+
+ROW_FIELDS = ('trip_id', 'driver_id', 'sequence', 'lat', 'lng', 'accuracy', 'speed', 'recorded_at')
+
+
+def location_row(location):
+    """The buffered form of an unsaved ``LocationUpdate``."""
+    return {
+        'trip_id': location.trip_id,
+        'driver_id': location.driver_id,
+        'sequence': location.sequence,
+        'lat': location.lat,
+        'lng': location.lng,
+        'accuracy': location.accuracy,
+        'speed': location.speed,
+        'recorded_at': location.recorded_at.isoformat(),
+    }
+
+
+def _instance(row):
+    return LocationUpdate(**dict(row, recorded_at=parse_datetime(row['recorded_at'])))
+
+
+class LocationBuffer:
+    """Shared flush, threshold and metrics logic; backends store the rows."""
+
+    def __init__(self, max_rows=500, flush_seconds=1.0):
+        self.max_rows = max_rows
+        self.flush_seconds = flush_seconds
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._thread = None
+        self._thread_lock = threading.Lock()
+
+    # Backend storage ---------------------------------------------------
+
+    def _push(self, rows):
+        raise NotImplementedError
+
+    def _peek(self, count):
+        raise NotImplementedError
+
+    def _drop(self, count):
+        raise NotImplementedError
+
+    def depth(self):
+        raise NotImplementedError
+
+    def _flush_lock(self):
+        raise NotImplementedError
+
+    def _claim(self, trip_id, sequences):
+        """Reserve ``sequences`` of the trip; returns those that were free."""
+        raise NotImplementedError
+
+    def _release(self, trip_id, sequences):
+        raise NotImplementedError
+
+    def _record(self, rows, seconds, failed=False):
+        raise NotImplementedError
+
+    def _metrics(self):
+        raise NotImplementedError
+
+    def _quarantine(self, rows):
+        """Set aside rows the database rejected."""
+        raise NotImplementedError
+
+    def quarantined(self):
+        """The most recently quarantined rows, oldest first."""
+        raise NotImplementedError
+
+    # Public API --------------------------------------------------------
+
+    def claim(self, trip_id, sequences):
+        """Reserve ``sequences`` of the trip until their rows are flushed.
+
+        Returns the set of sequences that were not reserved yet; the others
+        are queued (or being queued) by another request.
+        """
+        sequences = {sequence for sequence in sequences if sequence is not None}
+        if not sequences:
+            return set()
+        return self._claim(trip_id, sequences)
+
+    def release(self, trip_id, sequences):
+        """Give back reserved ``sequences`` whose rows will not be queued."""
+        sequences = {sequence for sequence in sequences if sequence is not None}
+        if sequences:
+            self._release(trip_id, sequences)
+
+    def add(self, rows, claimed=False):
+        """Queue ``rows`` (see ``location_row``) for the next flush.
+
+        Sequenced rows whose ``(trip, sequence)`` is already queued are
+        dropped, unless the caller reserved them with ``claim`` first
+        (``claimed=True``).
+        """
+        if not claimed:
+            rows = self._unqueued(rows)
+        if not rows:
+            return
+        self._push(rows)
+        if self.flush_seconds > 0:
+            self._ensure_thread()
+            if self.depth() >= self.max_rows:
+                self._wakeup.set()
+        elif self.depth() >= self.max_rows:
+            self.flush()
+
+    def pending(self, trip_id):
+        """The trip's rows still queued, as unsaved ``LocationUpdate`` instances."""
+        depth = self.depth()
+        if not depth:
+            return []
+        return [_instance(row) for row in self._peek(depth) if row['trip_id'] == trip_id]
+
+    def flush(self, limit=None):
+        """Insert buffered rows in chunks of ``FLUSH_CHUNK``; returns the number written.
+
+        Rows are only dropped from the buffer once their insert committed;
+        on a database error they stay queued for the next attempt.
+        """
+        written = 0
+        with self._flush_lock() as acquired:
+            if not acquired:
+                return 0
+            while limit is None or written < limit:
+                rows = self._peek(FLUSH_CHUNK)
+                if not rows:
+                    break
+                began = time.perf_counter()
+                try:
+                    rejected = self._insert(rows)
+                except Exception:
+                    self._record(len(rows), time.perf_counter() - began, failed=True)
+                    logger.exception('Location buffer flush failed; %s rows stay queued', len(rows))
+                    break
+                self._drop(len(rows))
+                self._release_rows(rows)
+                if rejected:
+                    self._quarantine(rejected)
+                self._record(len(rows) - len(rejected), time.perf_counter() - began)
+                written += len(rows) - len(rejected)
+        return written
+
+    def _insert(self, rows):
+        """Insert ``rows``; returns those the database rejected one by one.
+
+        Errors other than ``ROW_ERRORS`` propagate and leave the rows queued.
+        """
+        try:
+            with transaction.atomic():
+                LocationUpdate.objects.bulk_create([_instance(row) for row in rows], ignore_conflicts=True)
+            return []
+        except ROW_ERRORS:
+            if len(rows) == 1:
+                logger.exception('Quarantining location row the database rejected: %r', rows[0])
+                return rows
+        rejected = []
+        for row in rows:
+            try:
+                with transaction.atomic():
+                    LocationUpdate.objects.bulk_create([_instance(row)], ignore_conflicts=True)
+            except ROW_ERRORS:
+                logger.exception('Quarantining location row the database rejected: %r', row)
+                rejected.append(row)
+        return rejected
+
+    def _by_trip(self, rows):
+        sequences = {}
+        for row in rows:
+            if row['sequence'] is not None:
+                sequences.setdefault(row['trip_id'], set()).add(row['sequence'])
+        return sequences
+
+    def _unqueued(self, rows):
+        free = {trip_id: self._claim(trip_id, sequences) for trip_id, sequences in self._by_trip(rows).items()}
+        kept = []
+        for row in rows:
+            if row['sequence'] is None:
+                kept.append(row)
+            elif row['sequence'] in free[row['trip_id']]:
+                # Later rows with the same sequence are duplicates of this one.
+                free[row['trip_id']].discard(row['sequence'])
+                kept.append(row)
+        return kept
+
+    def _release_rows(self, rows):
+        for trip_id, sequences in self._by_trip(rows).items():
+            self._release(trip_id, sequences)
+
+    def metrics(self):
+        """Buffer depth plus flush counters and latencies (milliseconds)."""
+        metrics = self._metrics()
+        flushes = metrics.get('flushes', 0)
+        return {
+            'backend': self.name,
+            'depth': self.depth(),
+            'flushes': flushes,
+            'flushed_rows': metrics.get('flushed_rows', 0),
+            'failed_flushes': metrics.get('failed_flushes', 0),
+            'quarantined_rows': metrics.get('quarantined_rows', 0),
+            'last_flush_ms': round(metrics.get('last_flush_ms', 0.0), 2),
+            'max_flush_ms': round(metrics.get('max_flush_ms', 0.0), 2),
+            'avg_flush_ms': round(metrics.get('total_flush_ms', 0.0) / flushes, 2) if flushes else 0.0,
+        }
+
+    def close(self):
+        """Stop the background thread and write everything still buffered."""
+        self._stopping = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=30)
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('Location buffer could not be drained at shutdown')
+
+    # Background flusher ------------------------------------------------
+
+    def _ensure_thread(self):
+        if self._thread is not None:
+            return
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='location-buffer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stopping:
+            self._wakeup.wait(self.flush_seconds)
+            self._wakeup.clear()
+            if self._stopping:
+                break
+            try:
+                close_old_connections()
+                self.flush()
+            except Exception:
+                logger.exception('Location buffer flush failed')
+
+
+class LocalLocationBuffer(LocationBuffer):
+    name = 'local'
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._rows = deque()
+        self._quarantined = deque(maxlen=QUARANTINE_MAX)
+        self._claimed = {}
+        self._lock = threading.Lock()
+        self._flushing = threading.Lock()
+        self._counters = {}
+
+    def _push(self, rows):
+        with self._lock:
+            self._rows.extend(rows)
+
+    def _peek(self, count):
+        with self._lock:
+            return list(islice(self._rows, count))
+
+    def _drop(self, count):
+        with self._lock:
+            for _ in range(count):
+                self._rows.popleft()
+
+    def depth(self):
+        return len(self._rows)
+
+    @contextmanager
+    def _flush_lock(self):
+        with self._flushing:
+            yield True
+
+    def _claim(self, trip_id, sequences):
+        with self._lock:
+            claimed = self._claimed.setdefault(trip_id, set())
+            free = sequences - claimed
+            claimed |= free
+            return free
+
+    def _release(self, trip_id, sequences):
+        with self._lock:
+            claimed = self._claimed.get(trip_id)
+            if claimed is None:
+                return
+            claimed -= sequences
+            if not claimed:
+                del self._claimed[trip_id]
+
+    def _record(self, rows, seconds, failed=False):
+        milliseconds = seconds * 1000
+        with self._lock:
+            counters = self._counters
+            if failed:
+                counters['failed_flushes'] = counters.get('failed_flushes', 0) + 1
+                return
+            counters['flushes'] = counters.get('flushes', 0) + 1
+            counters['flushed_rows'] = counters.get('flushed_rows', 0) + rows
+            counters['last_flush_ms'] = milliseconds
+            counters['max_flush_ms'] = max(counters.get('max_flush_ms', 0.0), milliseconds)
+            counters['total_flush_ms'] = counters.get('total_flush_ms', 0.0) + milliseconds
+
+    def _metrics(self):
+        with self._lock:
+            return dict(self._counters)
+
+    def _quarantine(self, rows):
+        with self._lock:
+            self._quarantined.extend(rows)
+            self._counters['quarantined_rows'] = self._counters.get('quarantined_rows', 0) + len(rows)
+
+    def quarantined(self):
+        with self._lock:
+            return list(self._quarantined)
+
+
+class RedisLocationBuffer(LocationBuffer):
+    name = 'redis'
+    ROWS_KEY = 'location_buffer:rows'
+    METRICS_KEY = 'location_buffer:metrics'
+    LOCK_KEY = 'location_buffer:flush_lock'
+    QUARANTINE_KEY = 'location_buffer:quarantine'
+
+    def __init__(self, url, **kwargs):
+        super().__init__(**kwargs)
+        import redis
+        self.client = redis.Redis.from_url(url)
+
+    def _push(self, rows):
+        self.client.rpush(self.ROWS_KEY, *[json.dumps([row[f] for f in ROW_FIELDS]) for row in rows])
+
+    def _peek(self, count):
+        return [dict(zip(ROW_FIELDS, json.loads(raw))) for raw in self.client.lrange(self.ROWS_KEY, 0, count - 1)]
+
+    def _drop(self, count):
+        self.client.ltrim(self.ROWS_KEY, count, -1)
+
+    def depth(self):
+        return self.client.llen(self.ROWS_KEY)
+
+    @contextmanager
+    def _flush_lock(self):
+        # One flusher across all processes; the timeout frees the lock if
+        # its holder dies mid-flush.
+        lock = self.client.lock(self.LOCK_KEY, timeout=60, blocking=False)
+        acquired = lock.acquire()
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                lock.release()
+
+    def _claimed_key(self, trip_id):
+        return f'location_buffer:claimed:{trip_id}'
+
+    def _claim(self, trip_id, sequences):
+        key = self._claimed_key(trip_id)
+        sequences = sorted(sequences)
+        pipe = self.client.pipeline()
+        for sequence in sequences:
+            pipe.sadd(key, sequence)
+        pipe.expire(key, CLAIM_TTL)
+        added = pipe.execute()[:-1]
+        return {sequence for sequence, new in zip(sequences, added) if new}
+
+    def _release(self, trip_id, sequences):
+        self.client.srem(self._claimed_key(trip_id), *sequences)
+
+    def _record(self, rows, seconds, failed=False):
+        milliseconds = seconds * 1000
+        pipe = self.client.pipeline()
+        if failed:
+            pipe.hincrby(self.METRICS_KEY, 'failed_flushes', 1)
+        else:
+            pipe.hincrby(self.METRICS_KEY, 'flushes', 1)
+            pipe.hincrby(self.METRICS_KEY, 'flushed_rows', rows)
+            pipe.hset(self.METRICS_KEY, 'last_flush_ms', milliseconds)
+            pipe.hincrbyfloat(self.METRICS_KEY, 'total_flush_ms', milliseconds)
+        pipe.execute()
+        if not failed:
+            # Not atomic with the pipeline, but only ever raises the maximum.
+            current = float(self.client.hget(self.METRICS_KEY, 'max_flush_ms') or 0)
+            if milliseconds > current:
+                self.client.hset(self.METRICS_KEY, 'max_flush_ms', milliseconds)
+
+    def _metrics(self):
+        raw = {key.decode(): value.decode() for key, value in self.client.hgetall(self.METRICS_KEY).items()}
+        return {
+            key: float(value) if key.endswith('_ms') else int(value)
+            for key, value in raw.items()
+        }
+
+    def _quarantine(self, rows):
+        pipe = self.client.pipeline()
+        pipe.rpush(self.QUARANTINE_KEY, *[json.dumps([row[f] for f in ROW_FIELDS]) for row in rows])
+        pipe.ltrim(self.QUARANTINE_KEY, -QUARANTINE_MAX, -1)
+        pipe.hincrby(self.METRICS_KEY, 'quarantined_rows', len(rows))
+        pipe.execute()
+
+    def quarantined(self):
+        return [dict(zip(ROW_FIELDS, json.loads(raw))) for raw in self.client.lrange(self.QUARANTINE_KEY, 0, -1)]
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_location_buffer():
+    """The process-wide buffer configured by the ``LOCATION_BUFFER_*`` settings."""
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                options = {
+                    'max_rows': getattr(settings, 'LOCATION_BUFFER_MAX_ROWS', 500),
+                    'flush_seconds': getattr(settings, 'LOCATION_BUFFER_FLUSH_SECONDS', 1.0),
+                }
+                if getattr(settings, 'LOCATION_BUFFER_BACKEND', 'local') == 'redis':
+                    buffer = RedisLocationBuffer(settings.REDIS_URL, **options)
+                else:
+                    buffer = LocalLocationBuffer(**options)
+                atexit.register(buffer.close)
+                _buffer = buffer
+    return _buffer
@@ -0,0 +1,175 @@
+"""Location ingestion for trips.
+
+``ingest_batch`` stores a batch of client GPS fixes for one trip. Each fix
+carries a client ``sequence`` number unique within the trip, so a retried
+batch is acknowledged without storing anything twice. Fixes may arrive in
+any order: they are stored as sent, keyed by ``recorded_at``, and the batch
+is broadcast sorted by time as one ``location.batch`` message, together
+with the geofence events it raised. Rows go
+through the write-behind buffer in ``logbook.location_buffer`` and the
+broadcast through ``logbook.broadcaster``, so the request waits for neither
+the insert nor the channel layer.
+"""
+import math
+
+from rest_framework import serializers
+
+from .broadcaster import get_broadcaster
+from .fleet_live import publish_positions
+from .geofence import event_payload, process_fixes
+from .location_buffer import get_location_buffer, location_row
+from .models import LocationUpdate
+from .motion import update_motion
+from .positions import get_position_store
+from .track import dead_band
+from .track_archive import archived_sequences
+
+
+class FiniteFloatField(serializers.FloatField):
+    """A ``FloatField`` that rejects ``"NaN"`` and infinities, which ``float()`` accepts."""
+    default_error_messages = {'not_finite': 'A finite number is required.'}
+
+    def to_internal_value(self, data):
+        value = super().to_internal_value(data)
+        if not math.isfinite(value):
+            self.fail('not_finite')
+        return value
+
+
+class LocationFixSerializer(serializers.Serializer):
+    """One GPS fix as posted to ``TripViewSet.location``."""
+    lat = FiniteFloatField(min_value=-90, max_value=90)
+    lng = FiniteFloatField(min_value=-180, max_value=180)
+    accuracy = FiniteFloatField(min_value=0, required=False, allow_null=True)
+    speed = FiniteFloatField(min_value=0, required=False, allow_null=True)
+    recorded_at = serializers.DateTimeField(required=False)
+
+
+class LocationPointSerializer(LocationFixSerializer):
+    sequence = serializers.IntegerField(min_value=0)
+    # Required: a resent fix must carry the same time to match the stored
+    # (trip, sequence, recorded_at) key.
+    recorded_at = serializers.DateTimeField()
+
+
+def location_payload(location):
+    return {
+        'sequence': location.sequence,
+        'lat': location.lat,
+        'lng': location.lng,
+        'accuracy': location.accuracy,
+        'speed': location.speed,
+        'recorded_at': location.recorded_at.isoformat(),
+    }
+
+
+def broadcast_batch(trip, locations, arrived=False, events=()):
+    """Queue ``locations`` (sorted by time) and their geofence events for the trip group as one message.
+
+    The points are also recorded as the trip's last-known positions, which
+    new subscribers get as their snapshot.
+    """
+    points = [location_payload(location) for location in locations]
+    get_position_store().record(trip, points)
+    get_broadcaster().publish(f"trip_{trip.id}", {
+        'type': 'location.batch',
+        'trip_id': str(trip.id),
+        'points': points,
+        'arrived': arrived,
+        'events': [event_payload(event) for event in events],
+    })
+
+
+def queue_new_fixes(trip, by_sequence):
+    """Queue the fixes of ``{sequence: validated point}`` not seen before.
+
+    Returns ``(locations, stored)``: the new fixes as unsaved ``LocationUpdate``
+    instances sorted by time, and the sequences already stored or queued.
+
+    The sequences are reserved in the write-behind buffer before stored rows
+    are looked up, so a retry that arrives before the flush finds them
+    reserved and one that races the flush finds them in the table. Fixes
+    inside the dead-band are not stored and give their sequence back.
+    """
+    buffer = get_location_buffer()
+    claimed = buffer.claim(trip.id, by_sequence)
+    try:
+        stored = set(by_sequence) - claimed
+        stored |= set(LocationUpdate.objects.filter(
+            trip=trip, sequence__in=list(claimed)
+        ).values_list('sequence', flat=True))
+        if trip.status == 'completed':
+            # A late retry for a trip whose rows were already archived.
+            stored |= archived_sequences(trip) & claimed
+        locations = sorted(
+            (
+                LocationUpdate(
+                    trip=trip,
+                    driver_id=trip.driver_id,
+                    sequence=sequence,
+                    lat=data['lat'],
+                    lng=data['lng'],
+                    accuracy=data.get('accuracy'),
+                    speed=data.get('speed'),
+                    recorded_at=data['recorded_at'],
+                )
+                for sequence, data in by_sequence.items()
+                if sequence not in stored
+            ),
+            key=lambda location: (location.recorded_at, location.sequence),
+        )
+        kept = dead_band(trip.id, locations)
+        buffer.add([location_row(location) for location in kept], claimed=True)
+    except Exception:
+        buffer.release(trip.id, claimed)
+        raise
+    dropped = {location.sequence for location in locations} - {location.sequence for location in kept}
+    buffer.release(trip.id, (claimed & stored) | dropped)
+    return locations, stored
+
+
+def ingest_batch(trip, points):
+    """Validate, deduplicate, queue for storage and broadcast a batch of fixes.
+
+    Returns ``{'accepted', 'duplicates', 'rejected', 'arrived', 'events'}`` where
+    ``accepted`` and ``duplicates`` are sequence numbers (already stored, still
+    queued in the write-behind buffer or repeated within the batch) and
+    ``rejected`` lists ``{'index', 'sequence', 'errors'}`` for fixes that failed
+    validation. Invalid fixes do not block the rest of
+    the batch. ``events`` are the geofence events the new fixes raised (see
+    ``logbook.geofence``) and ``arrived`` tells whether they completed the trip.
+    """
+    rejected = []
+    repeated = set()
+    by_sequence = {}
+    for index, point in enumerate(points):
+        serializer = LocationPointSerializer(data=point)
+        if not serializer.is_valid():
+            rejected.append({
+                'index': index,
+                'sequence': point.get('sequence') if isinstance(point, dict) else None,
+                'errors': serializer.errors,
+            })
+            continue
+        data = serializer.validated_data
+        # A sequence repeated inside the batch keeps its first fix.
+        if data['sequence'] in by_sequence:
+            repeated.add(data['sequence'])
+        else:
+            by_sequence[data['sequence']] = data
+
+    locations, stored = queue_new_fixes(trip, by_sequence)
+
+    update_motion(trip, locations)
+    arrived, events = process_fixes(trip, locations)
+    if locations:
+        broadcast_batch(trip, locations, arrived, events)
+        publish_positions(trip, locations, arrived)
+
+    return {
+        'accepted': [location.sequence for location in locations],
+        'duplicates': sorted(stored | repeated),
+        'rejected': rejected,
+        'arrived': arrived,
+        'events': [event_payload(event) for event in events],
+    }
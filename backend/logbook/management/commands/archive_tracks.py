@@ -0,0 +1,46 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from django.utils import timezone
+
+from logbook.models import Trip
+from logbook.track_archive import archive_trip
+
+
+class Command(BaseCommand):
+    help = ('Pack the location updates of completed trips into one TripTrack blob per trip '
+            'and delete the rows.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--trip', type=int, action='append', help='Only these trip ids (repeatable)')
+        parser.add_argument('--older-than-days', type=int,
+                            help='Trips completed at least this long ago; defaults to TRACK_ARCHIVE_AFTER_DAYS')
+        parser.add_argument('--limit', type=int, help='Archive at most this many trips')
+
+    def handle(self, *args, **options):
+        trips = Trip.objects.filter(status='completed')
+        if options['trip']:
+            trips = trips.filter(pk__in=options['trip'])
+        else:
+            days = options['older_than_days']
+            if days is None:
+                days = getattr(settings, 'TRACK_ARCHIVE_AFTER_DAYS', 7)
+            trips = trips.filter(end_time__lte=timezone.now() - timedelta(days=days))
+        # Only trips that still have live rows.
+        trips = trips.annotate(live=Count('locations')).filter(live__gt=0).order_by('end_time')
+        if options['limit']:
+            trips = trips[:options['limit']]
+
+        archived = points = size = 0
+        for trip in trips:
+            track = archive_trip(trip)
+            archived += 1
+            points += trip.live
+            size += len(track.data)
+        per_point = f"{size / points:.1f}" if points else 'n/a'
+        self.stdout.write(self.style.SUCCESS(
+            f"archived {points} location updates from {archived} trips into {size} bytes "
+            f"({per_point} bytes per fix)"
+        ))
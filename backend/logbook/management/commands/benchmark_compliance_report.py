@@ -0,0 +1,64 @@
+from datetime import timedelta
+from decimal import Decimal
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from logbook.models import Driver, FuelLog, Trip
+from logbook.reports import build_report
+
+
+class Command(BaseCommand):
+    help = ('Benchmark the compliance report engine over a synthetic driver. '
+            'All synthetic rows are rolled back afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--trips', type=int, default=10000)
+        parser.add_argument('--fuel-every', type=int, default=4,
+                            help='Insert a fuel log every N trips')
+        parser.add_argument('--runs', type=int, default=3)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            driver, start, end = self._populate(options['trips'], options['fuel_every'])
+            timings = []
+            for _ in range(options['runs']):
+                with CaptureQueriesContext(connection) as ctx:
+                    began = time.perf_counter()
+                    report = build_report(driver.pk, start, end)
+                    timings.append(time.perf_counter() - began)
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"trips={report['trip_count']} miles={report['total_miles']} "
+                          f"hours={report['total_hours']} refuel_violations={report['refuel_violations']}")
+        self.stdout.write(self.style.SUCCESS(
+            f'best {min(timings) * 1000:.1f} ms over {options["runs"]} runs, '
+            f'{len(ctx.captured_queries)} queries per report'
+        ))
+
+    def _populate(self, trip_count, fuel_every):
+        rng = random.Random(0)
+        driver = Driver.objects.create(username='benchmark-report-driver', license_number='BENCH-REPORT')
+        clock = timezone.now() - timedelta(hours=trip_count * 3)
+        first = clock
+        trips, fuel_logs = [], []
+        for i in range(trip_count):
+            duration = timedelta(minutes=rng.randint(30, 150))
+            trips.append(Trip(
+                driver=driver, vehicle_id='BENCH', origin='A', destination='B',
+                distance=Decimal(rng.randint(20, 400)),
+                start_time=clock, end_time=clock + duration, status='completed',
+            ))
+            clock += duration + timedelta(minutes=rng.randint(0, 30))
+            if i % fuel_every == 0:
+                fuel_logs.append(FuelLog(
+                    driver=driver, fuel_amount=Decimal('80'), fuel_cost=Decimal('300'),
+                    odometer_reading=Decimal(i), location='Bench', timestamp=clock,
+                ))
+        Trip.objects.bulk_create(trips, batch_size=1000)
+        FuelLog.objects.bulk_create(fuel_logs, batch_size=1000)
+        return driver, first.date(), clock.date()
@@ -0,0 +1,47 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from logbook.hos import DRIVING, ON_DUTY, DutyTimeline, evaluate
+
+HOUR = 3600
+
+
+def synthetic_intervals(rng, days):
+    """A year-like duty history: one shift a day of trips split by short stops."""
+    intervals = []
+    for day in range(days):
+        clock = day * 24 * HOUR + rng.randint(4, 8) * HOUR
+        for _ in range(rng.randint(1, 4)):
+            intervals.append((clock - 1800, clock, ON_DUTY))
+            end = clock + rng.randint(1, 4) * HOUR
+            intervals.append((clock, end, DRIVING))
+            clock = end + rng.randint(10, 60) * 60
+    return intervals
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the HOS rules engine over synthetic in-memory duty histories.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--drivers', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        histories = [synthetic_intervals(rng, options['days']) for _ in range(options['drivers'])]
+
+        began = time.perf_counter()
+        single = evaluate(DutyTimeline.from_intervals(histories[0]))
+        single_ms = (time.perf_counter() - began) * 1000
+
+        began = time.perf_counter()
+        total = sum(len(evaluate(DutyTimeline.from_intervals(history))) for history in histories)
+        fleet_s = time.perf_counter() - began
+
+        self.stdout.write(f"one driver: {len(histories[0])} intervals, {len(single)} violations")
+        self.stdout.write(self.style.SUCCESS(
+            f"one driver {single_ms:.1f} ms; {options['drivers']} drivers {fleet_s:.2f} s "
+            f"({total} violations)"
+        ))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from logbook.duty_ledger import check_duty_days
+
+
+class Command(BaseCommand):
+    help = 'Compare the daily duty-hours ledger against a full scan of completed trips'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--driver', type=int, action='append', dest='drivers',
+                            help='Only check this driver id (may be repeated)')
+
+    def handle(self, *args, **options):
+        mismatches = check_duty_days(driver_ids=options['drivers'])
+        for driver_id, day, ledger_hours, trip_hours in mismatches:
+            self.stdout.write(
+                f'driver {driver_id} {day}: ledger {ledger_hours} hrs, trips {trip_hours} hrs'
+            )
+        if mismatches:
+            raise CommandError(
+                f'{len(mismatches)} duty-day buckets out of sync; run rebuild_duty_days'
+            )
+        self.stdout.write(self.style.SUCCESS('Duty-day ledger is consistent with trips'))
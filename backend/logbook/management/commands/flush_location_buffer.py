@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from logbook.location_buffer import get_location_buffer
+
+
+class Command(BaseCommand):
+    help = ('Write every location update queued in the write-behind buffer. '
+            'With the redis backend this drains rows left by any worker.')
+
+    def handle(self, *args, **options):
+        buffer = get_location_buffer()
+        written = buffer.flush()
+        metrics = buffer.metrics()
+        self.stdout.write(self.style.SUCCESS(
+            f"wrote {written} location updates; {metrics['depth']} still queued "
+            f"(last flush {metrics['last_flush_ms']} ms)"
+        ))
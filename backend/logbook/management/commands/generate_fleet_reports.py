@@ -0,0 +1,52 @@
+from datetime import date
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from logbook.fleet_reports import DEFAULT_CHUNK_SIZE, create_report_run, execute_report_run
+from logbook.models import ReportRun
+
+
+class Command(BaseCommand):
+    help = ('Generate ComplianceReport rows for every active driver (or the given drivers) '
+            'over a date range, in parallel. Use --resume to continue an interrupted run.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=date.fromisoformat, help='First day (YYYY-MM-DD)')
+        parser.add_argument('--end', type=date.fromisoformat, help='Last day (YYYY-MM-DD)')
+        parser.add_argument('--driver', type=int, action='append', dest='drivers',
+                            help='Only this driver id (may be repeated)')
+        parser.add_argument('--resume', type=int, metavar='RUN_ID',
+                            help='Continue an existing run instead of starting a new one')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help='Drivers per chunk (new runs only)')
+
+    def handle(self, *args, **options):
+        if options['resume']:
+            try:
+                run = ReportRun.objects.get(pk=options['resume'])
+            except ReportRun.DoesNotExist:
+                raise CommandError(f"Report run {options['resume']} does not exist")
+        else:
+            if not options['start'] or not options['end']:
+                raise CommandError('--start and --end are required for a new run')
+            if options['end'] < options['start']:
+                raise CommandError('--end must not be before --start')
+            run = create_report_run(
+                options['start'], options['end'],
+                driver_ids=options['drivers'], chunk_size=options['chunk_size'],
+            )
+
+        self.stdout.write(
+            f'Run {run.pk}: {run.total_drivers} drivers, {run.date_start} to {run.date_end}, '
+            f"{options['workers']} workers"
+        )
+
+        def progress(done, total, written):
+            self.stdout.write(f'[{done}/{total}] chunk done, {written} reports')
+
+        run = execute_report_run(run, workers=options['workers'], progress=progress)
+        self.stdout.write(self.style.SUCCESS(
+            f'Run {run.pk} {run.status}: {run.completed_drivers}/{run.total_drivers} drivers'
+        ))
@@ -0,0 +1,57 @@
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from logbook.location_archive import restore_range
+from logbook.partitions import apply_retention, ensure_partitions, is_partitioned, purge_restored
+
+
+def _day(value):
+    day = parse_date(value)
+    if day is None:
+        raise CommandError(f'{value!r} is not a YYYY-MM-DD date')
+    return day
+
+
+class Command(BaseCommand):
+    help = ('Apply the location_updates retention policy: create upcoming monthly partitions, '
+            'write months older than LOCATION_RETENTION_DAYS to the cold archive and purge them. '
+            'Also restores archived date ranges on demand.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Keep this many days online; defaults to LOCATION_RETENTION_DAYS')
+        parser.add_argument('--dry-run', action='store_true', help='Only list the months that would be archived')
+        parser.add_argument('--restore', nargs=2, metavar=('START', 'END'),
+                            help='Restore archived fixes recorded between these dates (inclusive)')
+        parser.add_argument('--purge-restored', action='store_true', help='Drop previously restored fixes again')
+
+    def handle(self, *args, **options):
+        if options['restore']:
+            start, end = (_day(value) for value in options['restore'])
+            restored = restore_range(
+                datetime.combine(start, time.min, tzinfo=dt_timezone.utc),
+                datetime.combine(end + timedelta(days=1), time.min, tzinfo=dt_timezone.utc),
+            )
+            self.stdout.write(self.style.SUCCESS(f"restored {restored} location updates from {start} to {end}"))
+            return
+
+        if options['purge_restored']:
+            removed = purge_restored()
+            detail = 'partition truncated' if removed is None else f'{removed} rows'
+            self.stdout.write(self.style.SUCCESS(f"purged restored location updates ({detail})"))
+            return
+
+        created = [] if options['dry_run'] else ensure_partitions()
+        if created:
+            self.stdout.write(f"created partitions {', '.join(created)}")
+        results = apply_retention(options['days'], dry_run=options['dry_run'])
+        for month, manifest in results:
+            if manifest is None:
+                self.stdout.write(f"would archive {month:%Y-%m}")
+            else:
+                self.stdout.write(
+                    f"archived {month:%Y-%m}: {manifest['rows']} rows, {manifest['bytes']} bytes"
+                )
+        mode = 'partitioned' if is_partitioned() else 'unpartitioned'
+        self.stdout.write(self.style.SUCCESS(f"retention applied to {len(results)} months ({mode} table)"))
@@ -0,0 +1,19 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from logbook.duty_ledger import rebuild_duty_days
+
+
+class Command(BaseCommand):
+    help = 'Backfill or rebuild the per-driver daily duty-hours ledger from completed trips'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--driver', type=int, action='append', dest='drivers',
+                            help='Only rebuild this driver id (may be repeated)')
+        parser.add_argument('--since', type=date.fromisoformat,
+                            help='Only rebuild days on or after this date (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        rows = rebuild_duty_days(driver_ids=options['drivers'], since=options['since'])
+        self.stdout.write(self.style.SUCCESS(f'Wrote {rows} duty-day rows'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from logbook.fuel_ledger import rebuild_fuel_state
+
+
+class Command(BaseCommand):
+    help = 'Backfill or rebuild the per-driver "miles since last refuel" counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--driver', type=int, action='append', dest='drivers',
+                            help='Only rebuild this driver id (may be repeated)')
+
+    def handle(self, *args, **options):
+        count = rebuild_fuel_state(driver_ids=options['drivers'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt refuel counters for {count} drivers'))
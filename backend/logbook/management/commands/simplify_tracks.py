@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from logbook.models import Trip
+from logbook.track import simplify_trip
+
+
+class Command(BaseCommand):
+    help = ('Simplify the GPS tracks of completed trips (Douglas-Peucker, keeping stops) '
+            'and report how many fixes were dropped and the resulting track error.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--trip', type=int, action='append', help='Only these trip ids (repeatable)')
+        parser.add_argument('--tolerance', type=float, help='Metres; defaults to TRACK_SIMPLIFY_TOLERANCE_METERS')
+        parser.add_argument('--all', action='store_true', help='Also re-simplify trips that were already simplified')
+
+    def handle(self, *args, **options):
+        # Archived tracks have no rows left to simplify.
+        trips = Trip.objects.filter(status='completed', track__isnull=True)
+        if options['trip']:
+            trips = trips.filter(pk__in=options['trip'])
+        elif not options['all']:
+            trips = trips.filter(track_compression__isnull=True)
+
+        received = kept = 0
+        worst = 0.0
+        for trip in trips.iterator():
+            compression = simplify_trip(trip, options['tolerance'])
+            received += compression.received_points
+            kept += compression.kept_points
+            worst = max(worst, compression.max_error)
+            self.stdout.write(
+                f"trip {trip.pk}: {compression.kept_points}/{compression.received_points} fixes kept "
+                f"(max error {compression.max_error} m, mean {compression.mean_error} m)"
+            )
+        ratio = f"{kept / received:.1%}" if received else 'n/a'
+        self.stdout.write(self.style.SUCCESS(
+            f"kept {kept} of {received} fixes ({ratio}); worst track error {worst:.2f} m"
+        ))
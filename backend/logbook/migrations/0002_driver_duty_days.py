@@ -0,0 +1,45 @@
+# Generated by Django 5.2.3 on 2026-10-17 02:59
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_duty_days(apps, schema_editor):
+    """Fill the ledger from the existing completed trips, as ``rebuild_duty_days`` does.
+
+    The split of a trip into days lives on the app's models, not on the
+    historical ones. The trips table is unchanged by later migrations, so
+    the app's own rebuild can run here.
+    """
+    from logbook.duty_ledger import rebuild_duty_days
+
+    rebuild_duty_days()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logbook', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DriverDutyDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('hours', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=6)),
+                ('trip_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('driver', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='duty_days', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'driver_duty_days',
+                'ordering': ['-day'],
+                'constraints': [models.UniqueConstraint(fields=('driver', 'day'), name='driver_duty_days_driver_day_uniq')],
+            },
+        ),
+        migrations.RunPython(backfill_duty_days, migrations.RunPython.noop),
+    ]
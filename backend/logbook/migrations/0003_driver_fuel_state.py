@@ -0,0 +1,40 @@
+# Generated by Django 5.2.3 on 2026-10-17 03:01
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_fuel_state(apps, schema_editor):
+    """Create every existing driver's counter, as ``rebuild_fuel_state`` does.
+
+    Without it the fleet dashboard misses drivers that need fuel, and the
+    first compliance read builds the missing rows one driver at a time.
+    """
+    from logbook.fuel_ledger import rebuild_fuel_state
+
+    rebuild_fuel_state()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logbook', '0002_driver_duty_days'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DriverFuelState',
+            fields=[
+                ('driver', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='fuel_state', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('last_fuel_at', models.DateTimeField(blank=True, null=True)),
+                ('miles_since_fuel', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'driver_fuel_state',
+            },
+        ),
+        migrations.RunPython(backfill_fuel_state, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.3 on 2026-10-17 03:08
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logbook', '0004_report_runs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('input_version', models.CharField(max_length=64)),
+                ('segments', models.JSONField(default=list)),
+                ('events', models.JSONField(default=list)),
+                ('driving_hours', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=5)),
+                ('on_duty_hours', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=5)),
+                ('off_duty_hours', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=5)),
+                ('miles', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=10)),
+                ('generated_at', models.DateTimeField(auto_now=True)),
+                ('driver', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_logs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'daily_logs',
+                'ordering': ['day'],
+                'constraints': [models.UniqueConstraint(fields=('driver', 'day'), name='daily_logs_driver_day_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-17 03:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logbook', '0005_daily_logs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='compliancereport',
+            name='hos_violations',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
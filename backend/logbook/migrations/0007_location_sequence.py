@@ -0,0 +1,22 @@
+# Generated by Django 5.2.3 on 2026-10-17 03:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logbook', '0006_compliance_report_hos_violations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='locationupdate',
+            name='sequence',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='locationupdate',
+            constraint=models.UniqueConstraint(fields=('trip', 'sequence'), name='unique_trip_location_sequence'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.3 on 2026-10-17 03:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logbook', '0007_location_sequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Geofence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('kind', models.CharField(choices=[('yard', 'Yard'), ('fuel_stop', 'Fuel stop'), ('pickup', 'Pickup site'), ('destination', 'Destination site')], max_length=20)),
+                ('lat', models.FloatField(blank=True, null=True)),
+                ('lng', models.FloatField(blank=True, null=True)),
+                ('radius', models.FloatField(blank=True, null=True)),
+                ('polygon', models.JSONField(blank=True, default=list)),
+                ('is_active', models.BooleanField(default=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'geofences',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='GeofenceEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fence', models.CharField(max_length=40)),
+                ('kind', models.CharField(max_length=20)),
+                ('event', models.CharField(choices=[('enter', 'Enter'), ('dwell', 'Dwell'), ('exit', 'Exit')], max_length=10)),
+                ('lat', models.FloatField()),
+                ('lng', models.FloatField()),
+                ('occurred_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('geofence', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='events', to='logbook.geofence')),
+                ('trip', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='geofence_events', to='logbook.trip')),
+            ],
+            options={
+                'db_table': 'geofence_events',
+                'ordering': ['occurred_at', 'id'],
+                'indexes': [models.Index(fields=['trip', 'occurred_at'], name='geofence_ev_trip_id_20cb4a_idx')],
+            },
+        ),
+    ]
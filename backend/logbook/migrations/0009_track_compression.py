@@ -0,0 +1,30 @@
+# Generated by Django 5.2.3 on 2026-10-17 03:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logbook', '0008_geofences'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrackCompression',
+            fields=[
+                ('trip', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='track_compression', serialize=False, to='logbook.trip')),
+                ('deadband_dropped', models.PositiveIntegerField(default=0)),
+                ('stored_points', models.PositiveIntegerField(default=0)),
+                ('kept_points', models.PositiveIntegerField(default=0)),
+                ('tolerance', models.FloatField()),
+                ('max_error', models.FloatField(default=0.0)),
+                ('mean_error', models.FloatField(default=0.0)),
+                ('simplified_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'track_compression',
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.3 on 2026-10-17 03:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logbook', '0009_track_compression'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TripTrack',
+            fields=[
+                ('trip', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='track', serialize=False, to='logbook.trip')),
+                ('point_count', models.PositiveIntegerField(default=0)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('ended_at', models.DateTimeField(blank=True, null=True)),
+                ('data', models.BinaryField()),
+                ('archived_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'trip_tracks',
+            },
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 5.2.3 on 2026-10-17 03:31
+
+from datetime import date
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+# Months of empty partitions created ahead of today.
+MONTHS_AHEAD = 3
+
+
+def _month(index):
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_table(apps, schema_editor):
+    """Partition location_updates by month of recorded_at (MySQL only).
+
+    MySQL needs the partitioning column in every unique key, so the primary
+    key becomes (id, recorded_at); id stays unique through AUTO_INCREMENT.
+    """
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('SELECT MIN(recorded_at) FROM location_updates')
+        oldest = cursor.fetchone()[0] or timezone.now()
+    today = timezone.now().date()
+    first = oldest.year * 12 + oldest.month - 1
+    last = today.year * 12 + today.month - 1 + MONTHS_AHEAD
+    partitions = [f"PARTITION p_restored VALUES LESS THAN ('{_month(first):%Y-%m-%d}')"]
+    for index in range(first, last + 1):
+        partitions.append(
+            f"PARTITION p{_month(index):%Y%m} VALUES LESS THAN ('{_month(index + 1):%Y-%m-%d}')"
+        )
+    partitions.append('PARTITION p_future VALUES LESS THAN (MAXVALUE)')
+    schema_editor.execute(
+        'ALTER TABLE location_updates DROP PRIMARY KEY, ADD PRIMARY KEY (id, recorded_at)'
+    )
+    schema_editor.execute(
+        'ALTER TABLE location_updates PARTITION BY RANGE COLUMNS(recorded_at) (' + ', '.join(partitions) + ')'
+    )
+
+
+def unpartition_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    schema_editor.execute('ALTER TABLE location_updates REMOVE PARTITIONING')
+    schema_editor.execute('ALTER TABLE location_updates DROP PRIMARY KEY, ADD PRIMARY KEY (id)')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logbook', '0010_trip_tracks'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='locationupdate',
+            name='unique_trip_location_sequence',
+        ),
+        migrations.AlterField(
+            model_name='locationupdate',
+            name='driver',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='location_updates', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='locationupdate',
+            name='trip',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='locations', to='logbook.trip'),
+        ),
+        migrations.AddConstraint(
+            model_name='locationupdate',
+            constraint=models.UniqueConstraint(fields=('trip', 'sequence', 'recorded_at'), name='unique_trip_location_sequence'),
+        ),
+        migrations.RunPython(partition_table, unpartition_table),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.3 on 2026-10-17 03:43
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logbook', '0011_location_updates_partitioning'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TripMotion',
+            fields=[
+                ('trip', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='motion', serialize=False, to='logbook.trip')),
+                ('point_count', models.PositiveIntegerField(default=0)),
+                ('distance', models.FloatField(default=0.0)),
+                ('moving_seconds', models.FloatField(default=0.0)),
+                ('idle_seconds', models.FloatField(default=0.0)),
+                ('max_speed', models.FloatField(default=0.0)),
+                ('stop_count', models.PositiveIntegerField(default=0)),
+                ('last_lat', models.FloatField(blank=True, null=True)),
+                ('last_lng', models.FloatField(blank=True, null=True)),
+                ('last_recorded_at', models.DateTimeField(blank=True, null=True)),
+                ('idle_since', models.DateTimeField(blank=True, null=True)),
+                ('in_stop', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'trip_motion',
+            },
+        ),
+        migrations.AddField(
+            model_name='compliancereport',
+            name='gps_miles',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=10),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-17 03:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logbook', '0012_trip_motion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportrun',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, help_text='Last time a worker started the run or finished a chunk', null=True),
+        ),
+    ]
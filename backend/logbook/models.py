@@ -2,11 +2,18 @@ from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import MinValueValidator
 from django.utils import timezone
-from datetime import timedelta
 from django.conf import settings
 from decimal import Decimal
 
 
+def trip_hours(start_time, end_time, pickup_time, dropoff_time):
+    """Driving time between start and end plus pickup and dropoff hours."""
+    if not end_time:
+        return Decimal('0.00')
+    driving_time = Decimal((end_time - start_time).total_seconds() / 3600)
+    return round(driving_time + pickup_time + dropoff_time, 2)
+
+
 class Driver(AbstractUser):
     license_number = models.CharField(max_length=50, unique=True)
     phone = models.CharField(max_length=20, blank=True)
@@ -35,41 +42,39 @@ class Driver(AbstractUser):
 
     @property
     def total_hours_8days(self):
-        eight_days_ago = timezone.now() - timedelta(days=8)
-        trips = self.trips.filter(status='completed', end_time__gte=eight_days_ago)
-        total_hours = sum(trip.total_trip_hours for trip in trips)
+        if hasattr(self, '_compliance_cache'):
+            return self._compliance_cache.total_hours_8days
+        from .duty_ledger import window_start
+        total_hours = self.duty_days.filter(day__gte=window_start()).aggregate(
+            total=models.Sum('hours')
+        )['total'] or Decimal('0.00')
         return round(total_hours, 2)
 
     @property
     def remaining_hours_8days(self):
+        if hasattr(self, '_compliance_cache'):
+            return self._compliance_cache.remaining_hours_8days
         limit = getattr(settings, 'HOURS_LIMIT_8_DAYS', 70)
         return round(max(0, limit - self.total_hours_8days), 2)
 
     @property
     def compliance_status(self):
-        used = self.total_hours_8days
-        limit = getattr(settings, 'HOURS_LIMIT_8_DAYS', 70)
-        if used >= limit:
-            return 'exceeded'
-        elif used >= limit * 0.9:
-            return 'warning'
-        return 'compliant'
+        if hasattr(self, '_compliance_cache'):
+            return self._compliance_cache.compliance_status
+        from .compliance import hours_status
+        return hours_status(self.total_hours_8days)
 
     @property
     def miles_since_last_fuel(self):
-        last_fuel = self.fuel_logs.order_by('-timestamp').first()
-        if not last_fuel:
-            total_miles = self.trips.filter(status='completed').aggregate(
-                total=models.Sum('distance')
-            )['total'] or Decimal('0.00')
-            return round(total_miles, 2)
-
-        trips_after_fuel = self.trips.filter(status='completed', end_time__gt=last_fuel.timestamp)
-        miles = trips_after_fuel.aggregate(total=models.Sum('distance'))['total'] or Decimal('0.00')
-        return round(miles, 2)
+        if hasattr(self, '_compliance_cache'):
+            return self._compliance_cache.miles_since_last_fuel
+        from .fuel_ledger import fuel_state_for
+        return round(fuel_state_for(self.pk).miles_since_fuel, 2)
 
     @property
     def needs_refuel(self):
+        if hasattr(self, '_compliance_cache'):
+            return self._compliance_cache.needs_refuel
         limit = getattr(settings, 'REFUEL_MILES_LIMIT', 500)
         return self.miles_since_last_fuel >= limit
 
@@ -125,16 +130,24 @@ class Trip(models.Model):
 
     @property
     def total_trip_hours(self):
-        if not self.end_time:
-            return Decimal('0.00')
-        driving_time = Decimal((self.end_time - self.start_time).total_seconds() / 3600)
-        return round(driving_time + self.pickup_time + self.dropoff_time, 2)
+        return trip_hours(self.start_time, self.end_time, self.pickup_time, self.dropoff_time)
 
     @property
     def driver_hours_after_trip(self):
         return round(self.driver.total_hours_8days + self.total_trip_hours, 2)
 
+    def hos_violations(self):
+        """Hours-of-service violations overlapping this trip (see ``logbook.hos``)."""
+        from .hos import trip_violations
+        return trip_violations(self, getattr(self, '_hos_intervals', None))
+
     def validate_compliance(self):
+        """Problems that block starting or completing the trip.
+
+        Hours-of-service violations are not among them: completing the trip is
+        how a violation gets on record, so they are reported by
+        ``compliance_warnings`` instead.
+        """
         errors = []
         if self.driver.needs_refuel:
             errors.append(f"Refueling required. Miles since last fuel: {self.driver.miles_since_last_fuel}")
@@ -149,6 +162,12 @@ class Trip(models.Model):
                 )
         return errors
 
+    def compliance_warnings(self):
+        """Hours-of-service violations of the trip, as messages."""
+        if self.status != 'completed' or not self.end_time:
+            return []
+        return [violation.message() for violation in self.hos_violations()]
+
 
 class FuelLog(models.Model):
     FUEL_TYPE_CHOICES = [
@@ -208,7 +227,10 @@ class ComplianceReport(models.Model):
     trip_count = models.IntegerField(default=0)
     limit_exceeded = models.BooleanField(default=False)
     refuel_violations = models.IntegerField(default=0)
+    hos_violations = models.JSONField(default=list, blank=True)
+    gps_miles = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
     notes = models.TextField(blank=True)
+    run = models.ForeignKey('ReportRun', on_delete=models.SET_NULL, null=True, blank=True, related_name='reports')
     generated_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -222,13 +244,76 @@ class ComplianceReport(models.Model):
         return f"Compliance Report for {self.driver.get_full_name()} ({self.date_start} to {self.date_end})"
 
 
+class ReportRun(models.Model):
+    """A fleet-wide compliance report generation over a date range.
+
+    The drivers are split into ``ReportRunChunk`` rows by driver-id range when
+    the run is created; a chunk is marked complete in the same transaction that
+    writes its reports, so an interrupted run resumes with the remaining chunks.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    date_start = models.DateField()
+    date_end = models.DateField()
+    driver_ids = models.JSONField(null=True, blank=True, help_text="Restrict the run to these drivers")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    total_drivers = models.IntegerField(default=0)
+    completed_drivers = models.IntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_by = models.ForeignKey(
+        Driver, on_delete=models.SET_NULL, null=True, blank=True, related_name='report_runs'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    heartbeat_at = models.DateTimeField(
+        null=True, blank=True, help_text="Last time a worker started the run or finished a chunk"
+    )
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'report_runs'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Report run {self.id} ({self.date_start} to {self.date_end}): {self.status}"
+
+
+class ReportRunChunk(models.Model):
+    run = models.ForeignKey(ReportRun, on_delete=models.CASCADE, related_name='chunks')
+    first_driver_id = models.BigIntegerField()
+    last_driver_id = models.BigIntegerField()
+    driver_count = models.IntegerField(default=0)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'report_run_chunks'
+        ordering = ['first_driver_id']
+
+    def __str__(self):
+        return f"Run {self.run_id} drivers {self.first_driver_id}-{self.last_driver_id}"
+
+
 class LocationUpdate(models.Model):
-    trip = models.ForeignKey(Trip, on_delete=models.CASCADE, related_name='locations')
-    driver = models.ForeignKey(Driver, on_delete=models.CASCADE, related_name='location_updates')
+    """One GPS fix.
+
+    On MySQL the table is partitioned by month of ``recorded_at`` (see
+    ``logbook.partitions``). Partitioned tables cannot have foreign keys and
+    every unique key must include ``recorded_at``, hence ``db_constraint=False``
+    and the three-column sequence constraint; deletes still cascade through
+    the ORM.
+    """
+    trip = models.ForeignKey(Trip, on_delete=models.CASCADE, related_name='locations', db_constraint=False)
+    driver = models.ForeignKey(Driver, on_delete=models.CASCADE, related_name='location_updates', db_constraint=False)
     lat = models.FloatField()
     lng = models.FloatField()
     accuracy = models.FloatField(null=True, blank=True)
     speed = models.FloatField(null=True, blank=True)
+    # Client sequence number, unique per trip; used to deduplicate retried batches.
+    sequence = models.BigIntegerField(null=True, blank=True)
     recorded_at = models.DateTimeField(default=timezone.now)
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -239,6 +324,257 @@ class LocationUpdate(models.Model):
             models.Index(fields=['trip', 'recorded_at']),
             models.Index(fields=['driver', 'recorded_at']),
         ]
+        constraints = [
+            models.UniqueConstraint(fields=['trip', 'sequence', 'recorded_at'], name='unique_trip_location_sequence'),
+        ]
 
     def __str__(self):
         return f"LocationUpdate {self.id} for Trip {self.trip_id} at {self.recorded_at}"
+
+
+class DriverDutyDay(models.Model):
+    """Per-driver, per-day on-duty hours ledger.
+
+    Maintained from completed trips by the handlers in ``logbook.signals`` so
+    the 8-day window is a read of at most eight small rows instead of a scan
+    over the driver's trips. Use the ``rebuild_duty_days`` command to backfill
+    and ``check_duty_days`` to compare the ledger against the trip table.
+    """
+    driver = models.ForeignKey(Driver, on_delete=models.CASCADE, related_name='duty_days')
+    day = models.DateField()
+    hours = models.DecimalField(max_digits=6, decimal_places=2, default=Decimal('0.00'))
+    trip_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'driver_duty_days'
+        ordering = ['-day']
+        constraints = [
+            models.UniqueConstraint(fields=['driver', 'day'], name='driver_duty_days_driver_day_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.driver_id} on {self.day}: {self.hours} hrs"
+
+
+class DriverFuelState(models.Model):
+    """Running "miles since last refuel" counter for a driver.
+
+    Completing a trip adds its distance; logging fuel (including back-dated
+    logs) and editing or cancelling completed trips recompute the counter from
+    the trips after the latest fuel log. See ``logbook.fuel_ledger``.
+    """
+    driver = models.OneToOneField(Driver, on_delete=models.CASCADE, primary_key=True, related_name='fuel_state')
+    last_fuel_at = models.DateTimeField(null=True, blank=True)
+    miles_since_fuel = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'driver_fuel_state'
+
+    def __str__(self):
+        return f"{self.driver_id}: {self.miles_since_fuel} mi since fuel"
+
+
+class DailyLog(models.Model):
+    """One generated ELD day for a driver; see ``logbook.eld``.
+
+    ``input_version`` is a hash of the trips, fuel logs and location stream
+    that fed the day, so an unchanged day is served as stored.
+    """
+    driver = models.ForeignKey(Driver, on_delete=models.CASCADE, related_name='daily_logs')
+    day = models.DateField()
+    input_version = models.CharField(max_length=64)
+    segments = models.JSONField(default=list)
+    events = models.JSONField(default=list)
+    driving_hours = models.DecimalField(max_digits=5, decimal_places=2, default=Decimal('0.00'))
+    on_duty_hours = models.DecimalField(max_digits=5, decimal_places=2, default=Decimal('0.00'))
+    off_duty_hours = models.DecimalField(max_digits=5, decimal_places=2, default=Decimal('0.00'))
+    miles = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
+    generated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'daily_logs'
+        ordering = ['day']
+        constraints = [
+            models.UniqueConstraint(fields=['driver', 'day'], name='daily_logs_driver_day_uniq'),
+        ]
+
+    def __str__(self):
+        return f"Daily log for {self.driver_id} on {self.day}"
+
+
+class Geofence(models.Model):
+    """A shared area trips are tracked against; see ``logbook.geofence``.
+
+    Either a circle (``lat``/``lng`` and ``radius``, in metres) or a polygon
+    (``polygon``, a list of ``[lat, lng]`` vertices).
+    """
+    KIND_CHOICES = [
+        ('yard', 'Yard'),
+        ('fuel_stop', 'Fuel stop'),
+        ('pickup', 'Pickup site'),
+        ('destination', 'Destination site'),
+    ]
+
+    name = models.CharField(max_length=255)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    lat = models.FloatField(null=True, blank=True)
+    lng = models.FloatField(null=True, blank=True)
+    radius = models.FloatField(null=True, blank=True)
+    polygon = models.JSONField(default=list, blank=True)
+    is_active = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'geofences'
+        ordering = ['name']
+
+    def __str__(self):
+        return f"{self.get_kind_display()}: {self.name}"
+
+    def clean(self):
+        from django.core.exceptions import ValidationError
+        if self.polygon:
+            if len(self.polygon) < 3 or any(len(vertex) != 2 for vertex in self.polygon):
+                raise ValidationError({'polygon': 'A polygon needs at least three [lat, lng] vertices.'})
+        elif self.lat is None or self.lng is None or not self.radius or self.radius <= 0:
+            raise ValidationError('Give either a polygon or a centre (lat, lng) and a positive radius.')
+
+
+class GeofenceEvent(models.Model):
+    """A trip entering, dwelling in or leaving a fence.
+
+    ``fence`` is ``'pickup'`` or ``'destination'`` for the trip's own
+    fences and ``'geofence:<id>'`` for shared ones. The latest event per
+    fence is the trip's state for that fence.
+    """
+    ENTER = 'enter'
+    DWELL = 'dwell'
+    EXIT = 'exit'
+    EVENT_CHOICES = [
+        (ENTER, 'Enter'),
+        (DWELL, 'Dwell'),
+        (EXIT, 'Exit'),
+    ]
+
+    trip = models.ForeignKey(Trip, on_delete=models.CASCADE, related_name='geofence_events')
+    geofence = models.ForeignKey(Geofence, on_delete=models.SET_NULL, null=True, blank=True, related_name='events')
+    fence = models.CharField(max_length=40)
+    kind = models.CharField(max_length=20)
+    event = models.CharField(max_length=10, choices=EVENT_CHOICES)
+    lat = models.FloatField()
+    lng = models.FloatField()
+    occurred_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'geofence_events'
+        ordering = ['occurred_at', 'id']
+        indexes = [
+            models.Index(fields=['trip', 'occurred_at']),
+        ]
+
+    def __str__(self):
+        return f"Trip {self.trip_id} {self.event} {self.fence} at {self.occurred_at}"
+
+
+class TrackCompression(models.Model):
+    """How much of a trip's GPS track compression dropped; see ``logbook.track``.
+
+    ``deadband_dropped`` fixes were never stored, ``stored_points`` were
+    stored and ``kept_points`` survived simplification. ``max_error`` and
+    ``mean_error`` are the distances (metres) between the deleted fixes and
+    the simplified track.
+    """
+    trip = models.OneToOneField(Trip, on_delete=models.CASCADE, primary_key=True, related_name='track_compression')
+    deadband_dropped = models.PositiveIntegerField(default=0)
+    stored_points = models.PositiveIntegerField(default=0)
+    kept_points = models.PositiveIntegerField(default=0)
+    tolerance = models.FloatField()
+    max_error = models.FloatField(default=0.0)
+    mean_error = models.FloatField(default=0.0)
+    simplified_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'track_compression'
+
+    def __str__(self):
+        return f"Trip {self.trip_id}: {self.kept_points} of {self.received_points} fixes kept"
+
+    @property
+    def received_points(self):
+        return self.deadband_dropped + self.stored_points
+
+    @property
+    def ratio(self):
+        """Fraction of received fixes still stored."""
+        return round(self.kept_points / self.received_points, 4) if self.received_points else 1.0
+
+
+class TripMotion(models.Model):
+    """Running GPS motion totals of a trip; see ``logbook.motion``.
+
+    Distances are metres, times seconds and speeds m/s. ``last_*``,
+    ``idle_since`` and ``in_stop`` carry the state between batches.
+    """
+    trip = models.OneToOneField(Trip, on_delete=models.CASCADE, primary_key=True, related_name='motion')
+    point_count = models.PositiveIntegerField(default=0)
+    distance = models.FloatField(default=0.0)
+    moving_seconds = models.FloatField(default=0.0)
+    idle_seconds = models.FloatField(default=0.0)
+    max_speed = models.FloatField(default=0.0)
+    stop_count = models.PositiveIntegerField(default=0)
+    last_lat = models.FloatField(null=True, blank=True)
+    last_lng = models.FloatField(null=True, blank=True)
+    last_recorded_at = models.DateTimeField(null=True, blank=True)
+    idle_since = models.DateTimeField(null=True, blank=True)
+    in_stop = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'trip_motion'
+
+    def __str__(self):
+        return f"Trip {self.trip_id}: {self.miles} GPS miles"
+
+    @property
+    def miles(self):
+        from .motion import METERS_PER_MILE
+        return round(self.distance / METERS_PER_MILE, 2)
+
+    @property
+    def average_speed(self):
+        """Average speed while moving, in m/s."""
+        return round(self.distance / self.moving_seconds, 2) if self.moving_seconds else 0.0
+
+
+class TripTrack(models.Model):
+    """A completed trip's GPS fixes packed into one blob; see ``logbook.track_archive``.
+
+    Archiving moves the trip's ``LocationUpdate`` rows here, so reading the
+    track is a single row.
+    """
+    trip = models.OneToOneField(Trip, on_delete=models.CASCADE, primary_key=True, related_name='track')
+    point_count = models.PositiveIntegerField(default=0)
+    started_at = models.DateTimeField(null=True, blank=True)
+    ended_at = models.DateTimeField(null=True, blank=True)
+    data = models.BinaryField()
+    archived_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'trip_tracks'
+
+    def __str__(self):
+        return f"Track of trip {self.trip_id} ({self.point_count} fixes)"
+
+    def arrays(self):
+        """The fixes as column arrays (see ``track_archive.TrackArrays``)."""
+        from .track_archive import unpack
+        return unpack(bytes(self.data))
+
+    def polyline(self, precision=5):
+        """The track as an encoded polyline."""
+        from .track_archive import encode_polyline
+        arrays = self.arrays()
+        return encode_polyline(arrays.lats, arrays.lngs, precision)
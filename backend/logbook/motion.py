@@ -0,0 +1,175 @@
+"""GPS motion metrics for trips.
+
+``update_motion`` folds every ingested batch into the trip's ``TripMotion``
+running totals, so trip detail and reports read GPS-derived figures from
+one row instead of scanning the track.
+
+* Consecutive fixes form segments. A segment is moving when its speed,
+  the reported speed of its later fix or else distance over time, is at
+  least ``ELD_STATIONARY_SPEED``. Otherwise it is idle.
+* Moving segments add their haversine length to ``distance``, so GPS
+  jitter while parked adds no miles, and their duration to
+  ``moving_seconds``. Idle segments add their duration to ``idle_seconds``.
+* An idle run counts as one stop once it lasts ``ELD_STATIONARY_MINUTES``,
+  the same rule the ELD generator uses (``eld.stationary_periods``).
+* ``max_speed`` is the highest segment speed. The average is distance
+  over moving time.
+
+``accumulate`` skips a fix at or before the last one folded in. Such late
+fixes, e.g. an offline backlog uploaded after newer fixes, go to
+``fold_late`` instead, which swaps the segment between their neighbours
+for the path through them. The neighbours come from the stored rows around
+the late fixes, the trip's rows still in the write-behind buffer and the
+last fix folded in, so the track is never rescanned. Fixes the dead-band
+kept out of the table are not neighbours; they sit on the predicted path,
+so the swapped segment measures about the same.
+``path_distances`` measures a whole batch in one pass, computing each
+latitude's cosine once rather than once per pair.
+"""
+from bisect import bisect_left
+from math import asin, cos, radians, sin, sqrt
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import LocationUpdate, TripMotion
+
+EARTH_RADIUS_METERS = 6371000
+METERS_PER_MILE = 1609.344
+
+
+def path_distances(lats, lngs):
+    """Haversine distances in metres between consecutive ``(lats[i], lngs[i])`` points."""
+    phis = [radians(lat) for lat in lats]
+    lambdas = [radians(lng) for lng in lngs]
+    cosines = [cos(phi) for phi in phis]
+    return [
+        2 * EARTH_RADIUS_METERS * asin(sqrt(min(1.0, sin((phi2 - phi1) / 2) ** 2
+                                                + cos1 * cos2 * sin((lambda2 - lambda1) / 2) ** 2)))
+        for phi1, phi2, lambda1, lambda2, cos1, cos2
+        in zip(phis, phis[1:], lambdas, lambdas[1:], cosines, cosines[1:])
+    ]
+
+
+def accumulate(motion, fixes):
+    """Fold ``(recorded_at, lat, lng, speed)`` fixes, sorted by time, into ``motion`` (unsaved)."""
+    threshold = getattr(settings, 'ELD_STATIONARY_SPEED', 2.2)
+    minimum = getattr(settings, 'ELD_STATIONARY_MINUTES', 5) * 60
+
+    if motion.last_recorded_at is not None:
+        fixes = [fix for fix in fixes if fix[0] > motion.last_recorded_at]
+    motion.point_count += len(fixes)
+    if not fixes:
+        return motion
+    if motion.last_recorded_at is not None:
+        fixes = [(motion.last_recorded_at, motion.last_lat, motion.last_lng, None)] + fixes
+
+    distances = path_distances([fix[1] for fix in fixes], [fix[2] for fix in fixes])
+    for previous, fix, distance in zip(fixes, fixes[1:], distances):
+        seconds = (fix[0] - previous[0]).total_seconds()
+        if seconds <= 0:
+            continue
+        speed = fix[3] if fix[3] is not None else distance / seconds
+        if speed >= threshold:
+            motion.distance += distance
+            motion.moving_seconds += seconds
+            motion.max_speed = max(motion.max_speed, speed)
+            motion.idle_since = None
+            motion.in_stop = False
+        else:
+            motion.idle_seconds += seconds
+            if motion.idle_since is None:
+                motion.idle_since = previous[0]
+            if not motion.in_stop and (fix[0] - motion.idle_since).total_seconds() >= minimum:
+                motion.stop_count += 1
+                motion.in_stop = True
+
+    motion.last_recorded_at, motion.last_lat, motion.last_lng = fixes[-1][:3]
+    return motion
+
+
+def fold_late(motion, fixes, known):
+    """Fold late ``fixes`` (sorted by time) into ``motion`` between their ``known`` neighbours.
+
+    ``known`` are fixes already folded in, sorted by time. The late fixes
+    between the same two known fixes replace the segment joining those two:
+    its distance and time come out and the path through the late fixes goes
+    in. Stops on that path are added only if the replaced segment was
+    moving; an idle one was already part of the streamed stops.
+    """
+    times = [fix[0] for fix in known]
+    groups = {}
+    for fix in fixes:
+        groups.setdefault(bisect_left(times, fix[0]), []).append(fix)
+    for index, group in groups.items():
+        added = accumulate(TripMotion(), known[index - 1:index] + group + known[index:index + 1])
+        replaced = accumulate(TripMotion(), known[index - 1:index + 1] if index else [])
+        motion.distance += added.distance - replaced.distance
+        motion.moving_seconds += added.moving_seconds - replaced.moving_seconds
+        motion.idle_seconds += added.idle_seconds - replaced.idle_seconds
+        motion.max_speed = max(motion.max_speed, added.max_speed)
+        if not replaced.idle_seconds:
+            motion.stop_count += added.stop_count
+        motion.point_count += len(group)
+    return motion
+
+
+def known_fixes(trip, motion, start, end, exclude=()):
+    """Fixes of ``trip`` already folded into ``motion`` around ``[start, end]``, sorted by time.
+
+    The stored rows in the range and the nearest one on either side, the
+    trip's rows still in the write-behind buffer and the last fix folded in.
+    ``exclude`` holds the ``(recorded_at, lat, lng)`` of the fixes being
+    folded, which are queued already.
+    """
+    from .location_buffer import get_location_buffer
+
+    fields = ('recorded_at', 'lat', 'lng', 'speed')
+    rows = LocationUpdate.objects.filter(trip=trip)
+    candidates = list(rows.filter(recorded_at__gte=start, recorded_at__lte=end).values_list(*fields))
+    candidates += rows.filter(recorded_at__lt=start).order_by('-recorded_at', '-id').values_list(*fields)[:1]
+    candidates += rows.filter(recorded_at__gt=end).order_by('recorded_at', 'id').values_list(*fields)[:1]
+    candidates += [
+        (location.recorded_at, location.lat, location.lng, location.speed)
+        for location in get_location_buffer().pending(trip.id)
+    ]
+    candidates.append((motion.last_recorded_at, motion.last_lat, motion.last_lng, None))
+    known = {}
+    for fix in candidates:
+        if fix[:3] not in exclude:
+            known.setdefault(fix[:3], fix)
+    return sorted(known.values(), key=lambda fix: fix[0])
+
+
+def update_motion(trip, locations):
+    """Add ``locations`` (``LocationUpdate`` instances, stored or not) to the trip's motion totals."""
+    if not locations:
+        return None
+    fixes = sorted(
+        ((location.recorded_at, location.lat, location.lng, location.speed) for location in locations),
+        key=lambda fix: fix[0],
+    )
+    with transaction.atomic():
+        motion, _ = TripMotion.objects.select_for_update().get_or_create(trip=trip)
+        if motion.last_recorded_at is not None:
+            late = [fix for fix in fixes if fix[0] <= motion.last_recorded_at]
+            if late:
+                known = known_fixes(trip, motion, late[0][0], late[-1][0], {fix[:3] for fix in fixes})
+                fold_late(motion, late, known)
+        accumulate(motion, fixes)
+        motion.save()
+    return motion
+
+
+def motion_payload(motion):
+    if motion is None:
+        return None
+    return {
+        'gps_miles': motion.miles,
+        'moving_seconds': round(motion.moving_seconds),
+        'idle_seconds': round(motion.idle_seconds),
+        'max_speed': round(motion.max_speed, 2),
+        'average_speed': motion.average_speed,
+        'stop_count': motion.stop_count,
+        'point_count': motion.point_count,
+    }
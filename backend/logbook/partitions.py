@@ -0,0 +1,185 @@
+"""Monthly partitions of ``location_updates`` and the retention policy.
+
+On MySQL the table is ``PARTITION BY RANGE COLUMNS(recorded_at)`` (set up by
+migration 0011) with:
+
+* ``p_restored``: everything before the oldest live month. Purged months are
+  merged into it once emptied, and rows brought back by ``restore_range``
+  land here until ``purge_restored``;
+* ``pYYYYMM``: one partition per live month;
+* ``p_future``: a ``MAXVALUE`` catch-all that ``ensure_partitions`` splits
+  into new months ahead of time, which is cheap while it is empty.
+
+``apply_retention`` writes every month that ended more than
+``LOCATION_RETENTION_DAYS`` ago to a cold archive file (see
+``logbook.location_archive``) and then purges it. Completed trips with rows
+in that month are first packed into their ``TripTrack`` (see
+``logbook.track_archive``), so the ELD generator and replay still find
+their tracks. On MySQL the purge is a
+metadata operation, ``TRUNCATE PARTITION`` plus merging the empty partition
+into ``p_restored``, never a large ``DELETE``. Databases without partitions
+(SQLite in tests and development) delete the month in chunks instead.
+
+A month with an archive file is archived: its rows are never exported
+again, so anything found there later was restored and only
+``purge_restored`` removes it.
+"""
+from datetime import date, timedelta
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from .location_archive import add_months, archived_months, month_bound, month_start, write_month
+from .models import LocationUpdate, Trip
+from .track_archive import archive_trip
+
+TABLE = 'location_updates'
+RESTORED = 'p_restored'
+FUTURE = 'p_future'
+MONTH_PARTITION = re.compile(r'^p(\d{4})(\d{2})$')
+
+# Rows deleted per statement where there are no partitions.
+DELETE_CHUNK = 5000
+
+
+def partition_name(month):
+    return f'p{month:%Y%m}'
+
+
+def is_partitioned():
+    if connection.vendor != 'mysql':
+        return False
+    return bool(mysql_partitions())
+
+
+def mysql_partitions():
+    """``[(name, upper bound literal)]`` of the table's partitions in order."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT PARTITION_NAME, PARTITION_DESCRIPTION FROM information_schema.PARTITIONS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL "
+            "ORDER BY PARTITION_ORDINAL_POSITION",
+            [TABLE],
+        )
+        return cursor.fetchall()
+
+
+def live_months():
+    """Months that hold live (not yet archived) rows, oldest first."""
+    if is_partitioned():
+        months = []
+        for name, _ in mysql_partitions():
+            match = MONTH_PARTITION.match(name)
+            if match:
+                months.append(date(int(match.group(1)), int(match.group(2)), 1))
+        return months
+    archived = set(archived_months())
+    return [
+        month_start(day)
+        for day in LocationUpdate.objects.dates('recorded_at', 'month')
+        if month_start(day) not in archived
+    ]
+
+
+def split_future_sql(month):
+    return (
+        f"ALTER TABLE {TABLE} REORGANIZE PARTITION {FUTURE} INTO ("
+        f"PARTITION {partition_name(month)} VALUES LESS THAN ('{add_months(month, 1):%Y-%m-%d}'), "
+        f"PARTITION {FUTURE} VALUES LESS THAN (MAXVALUE))"
+    )
+
+
+def purge_month_sql(month):
+    return [
+        f"ALTER TABLE {TABLE} TRUNCATE PARTITION {partition_name(month)}",
+        f"ALTER TABLE {TABLE} REORGANIZE PARTITION {RESTORED}, {partition_name(month)} INTO ("
+        f"PARTITION {RESTORED} VALUES LESS THAN ('{add_months(month, 1):%Y-%m-%d}'))",
+    ]
+
+
+def ensure_partitions(months_ahead=None, today=None):
+    """Create the partitions for this month and ``months_ahead`` more; returns their names."""
+    if not is_partitioned():
+        return []
+    if months_ahead is None:
+        months_ahead = getattr(settings, 'LOCATION_PARTITION_MONTHS_AHEAD', 3)
+    current = month_start(today or timezone.now().date())
+    existing = {name for name, _ in mysql_partitions()}
+    last = max(live_months(), default=add_months(current, -1))
+    created = []
+    with connection.cursor() as cursor:
+        month = add_months(last, 1)
+        while month <= add_months(current, months_ahead):
+            if partition_name(month) not in existing:
+                cursor.execute(split_future_sql(month))
+                created.append(partition_name(month))
+            month = add_months(month, 1)
+    return created
+
+
+def _delete_range(start, end):
+    deleted = 0
+    while True:
+        ids = list(LocationUpdate.objects.filter(
+            recorded_at__gte=start, recorded_at__lt=end
+        ).values_list('id', flat=True)[:DELETE_CHUNK])
+        if not ids:
+            return deleted
+        deleted += LocationUpdate.objects.filter(pk__in=ids).delete()[0]
+
+
+def purge_month(month):
+    """Remove a month's live rows (after it was archived)."""
+    if is_partitioned():
+        with connection.cursor() as cursor:
+            for statement in purge_month_sql(month):
+                cursor.execute(statement)
+        return
+    _delete_range(month_bound(month), month_bound(add_months(month, 1)))
+
+
+def expired_months(days=None, today=None):
+    """Live months that ended more than ``days`` (``LOCATION_RETENTION_DAYS``) ago."""
+    if days is None:
+        days = getattr(settings, 'LOCATION_RETENTION_DAYS', 90)
+    cutoff = (today or timezone.now().date()) - timedelta(days=days)
+    return [month for month in live_months() if add_months(month, 1) <= cutoff]
+
+
+def archive_completed_trips(month):
+    """Pack the completed trips with live rows in ``month`` into their ``TripTrack``."""
+    trips = Trip.objects.filter(
+        status='completed',
+        locations__recorded_at__gte=month_bound(month),
+        locations__recorded_at__lt=month_bound(add_months(month, 1)),
+    ).distinct()
+    return [archive_trip(trip) for trip in trips]
+
+
+def apply_retention(days=None, today=None, dry_run=False):
+    """Archive and purge every expired month; returns ``[(month, manifest or None)]``."""
+    results = []
+    for month in expired_months(days, today):
+        if dry_run:
+            results.append((month, None))
+            continue
+        archive_completed_trips(month)
+        manifest = write_month(month)
+        purge_month(month)
+        results.append((month, manifest))
+    return results
+
+
+def purge_restored():
+    """Drop rows brought back by ``restore_range``; returns the number removed, if known."""
+    if is_partitioned():
+        with connection.cursor() as cursor:
+            cursor.execute(f"ALTER TABLE {TABLE} TRUNCATE PARTITION {RESTORED}")
+        return None
+    return sum(
+        _delete_range(month_bound(month), month_bound(add_months(month, 1)))
+        for month in archived_months()
+    )
+
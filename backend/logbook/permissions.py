@@ -8,6 +8,11 @@ class IsAdminOrReadOnly(permissions.BasePermission):
         return request.user and request.user.is_admin
 
 
+class IsAdmin(permissions.BasePermission):
+    def has_permission(self, request, view):
+        return bool(request.user and request.user.is_authenticated and request.user.is_admin)
+
+
 class IsOwnerOrAdmin(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         if request.user.is_admin:
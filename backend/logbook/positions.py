@@ -0,0 +1,209 @@
+"""Last-known positions of trips and drivers.
+
+Ingestion records every broadcast fix here as well. For each trip the store
+keeps the last ``POSITION_SNAPSHOT_POINTS`` points (the same payloads as
+the ``location_batch`` frames), and for each driver it keeps the newest
+point with its trip.
+
+``TripConsumer`` answers a connect by the trip's driver or an admin with a
+``location_snapshot`` taken from the store. A client that reconnects with
+``?since=<sequence>`` gets only the points after the last sequence it saw.
+A trip the store has not seen yet is loaded from ``location_updates``, and
+a trip with no fixes is remembered as empty, so a reconnect storm after a
+deploy costs store reads rather than queries.
+
+Two backends, chosen by ``POSITION_STORE_BACKEND``:
+
+* ``local`` keeps positions in this process, for at most
+  ``POSITION_STORE_MAX_TRIPS`` trips in LRU order. Fixes ingested by other
+  workers never reach it, so each trip is trusted for only
+  ``POSITION_STORE_LOCAL_TTL`` seconds after it was first stored and then
+  loaded again;
+* ``redis`` keeps them at ``REDIS_URL``, shared by every worker and
+  surviving restarts. Each trip is a capped list and each driver a JSON
+  value, all expiring after ``POSITION_STORE_TTL`` seconds.
+"""
+from collections import OrderedDict, deque
+import json
+import threading
+import time
+
+from django.conf import settings
+
+from .models import LocationUpdate
+
+
+def _key(value):
+    return str(value)
+
+
+class PositionStore:
+    """Snapshot and resume logic; backends hold the points."""
+
+    def __init__(self, points=50, ttl=86400):
+        self.points = points
+        self.ttl = ttl
+
+    # Backend storage ---------------------------------------------------
+
+    def _record(self, trip_id, driver_id, points):
+        raise NotImplementedError
+
+    def _trip_points(self, trip_id):
+        """The stored points, oldest first, or ``None`` if the trip is unknown."""
+        raise NotImplementedError
+
+    def _mark_empty(self, trip_id):
+        raise NotImplementedError
+
+    def driver_position(self, driver_id):
+        """``{'trip_id', ...point}`` of the driver's newest fix, or ``None``."""
+        raise NotImplementedError
+
+    # Public API --------------------------------------------------------
+
+    def record(self, trip, points):
+        """Remember ``points`` (payloads sorted by time) as the trip's newest fixes."""
+        if points:
+            self._record(trip.id, trip.driver_id, list(points)[-self.points:])
+
+    def snapshot(self, trip_id, since=None):
+        """The trip's recent points, only those with a sequence above ``since`` if given."""
+        points = self._trip_points(trip_id)
+        if points is None:
+            points = self._load(trip_id)
+        if since is None:
+            return points
+        return [point for point in points if point['sequence'] is not None and point['sequence'] > since]
+
+    def _load(self, trip_id):
+        from .locations import location_payload
+
+        try:
+            rows = list(LocationUpdate.objects.filter(trip_id=trip_id).order_by('-recorded_at', '-id')[:self.points])
+        except (ValueError, TypeError):
+            return []
+        if not rows:
+            self._mark_empty(trip_id)
+            return []
+        points = [location_payload(row) for row in reversed(rows)]
+        self._record(trip_id, rows[0].driver_id, points)
+        return points
+
+
+class LocalPositionStore(PositionStore):
+    name = 'local'
+
+    def __init__(self, max_trips=10000, local_ttl=5, **kwargs):
+        super().__init__(**kwargs)
+        self.max_trips = max_trips
+        self.local_ttl = local_ttl
+        # trip -> (expires at, points); points keep accumulating until the
+        # entry expires, at which point the trip is loaded again.
+        self._trips = OrderedDict()
+        self._drivers = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _remember(self, entries, key, value):
+        entries[key] = value
+        entries.move_to_end(key)
+        while len(entries) > self.max_trips:
+            entries.popitem(last=False)
+
+    def _entry(self):
+        return time.monotonic() + self.local_ttl, deque(maxlen=self.points)
+
+    def _record(self, trip_id, driver_id, points):
+        with self._lock:
+            entry = self._trips.get(_key(trip_id)) or self._entry()
+            entry[1].extend(points)
+            self._remember(self._trips, _key(trip_id), entry)
+            self._remember(self._drivers, _key(driver_id), dict(points[-1], trip_id=trip_id))
+
+    def _trip_points(self, trip_id):
+        with self._lock:
+            entry = self._trips.get(_key(trip_id))
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._trips[_key(trip_id)]
+                return None
+            self._trips.move_to_end(_key(trip_id))
+            return list(entry[1])
+
+    def _mark_empty(self, trip_id):
+        with self._lock:
+            self._remember(self._trips, _key(trip_id), self._entry())
+
+    def driver_position(self, driver_id):
+        with self._lock:
+            return self._drivers.get(_key(driver_id))
+
+
+class RedisPositionStore(PositionStore):
+    name = 'redis'
+
+    def __init__(self, url, **kwargs):
+        super().__init__(**kwargs)
+        import redis
+        self.client = redis.Redis.from_url(url)
+
+    def _trip_key(self, trip_id):
+        return f'positions:trip:{trip_id}'
+
+    def _empty_key(self, trip_id):
+        return f'positions:trip:{trip_id}:empty'
+
+    def _driver_key(self, driver_id):
+        return f'positions:driver:{driver_id}'
+
+    def _record(self, trip_id, driver_id, points):
+        key = self._trip_key(trip_id)
+        pipe = self.client.pipeline()
+        pipe.rpush(key, *[json.dumps(point) for point in points])
+        pipe.ltrim(key, -self.points, -1)
+        pipe.expire(key, self.ttl)
+        pipe.delete(self._empty_key(trip_id))
+        pipe.set(self._driver_key(driver_id), json.dumps(dict(points[-1], trip_id=trip_id)), ex=self.ttl)
+        pipe.execute()
+
+    def _trip_points(self, trip_id):
+        pipe = self.client.pipeline()
+        pipe.lrange(self._trip_key(trip_id), 0, -1)
+        pipe.exists(self._empty_key(trip_id))
+        raw, empty = pipe.execute()
+        if not raw:
+            return [] if empty else None
+        return [json.loads(point) for point in raw]
+
+    def _mark_empty(self, trip_id):
+        self.client.set(self._empty_key(trip_id), 1, ex=self.ttl)
+
+    def driver_position(self, driver_id):
+        raw = self.client.get(self._driver_key(driver_id))
+        return json.loads(raw) if raw else None
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_position_store():
+    """The process-wide store configured by the ``POSITION_*`` settings."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                options = {
+                    'points': getattr(settings, 'POSITION_SNAPSHOT_POINTS', 50),
+                    'ttl': getattr(settings, 'POSITION_STORE_TTL', 86400),
+                }
+                if getattr(settings, 'POSITION_STORE_BACKEND', 'local') == 'redis':
+                    _store = RedisPositionStore(settings.REDIS_URL, **options)
+                else:
+                    _store = LocalPositionStore(
+                        max_trips=getattr(settings, 'POSITION_STORE_MAX_TRIPS', 10000),
+                        local_ttl=getattr(settings, 'POSITION_STORE_LOCAL_TTL', 5),
+                        **options
+                    )
+    return _store
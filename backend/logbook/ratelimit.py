@@ -0,0 +1,169 @@
+"""Shared rate limiting.
+
+Limits are token buckets described by named policies in the
+``RATE_LIMITS`` setting: ``{'name': {'rate': tokens, 'period': seconds,
+'burst': capacity}}``. A bucket starts full and refills at ``rate`` tokens
+per ``period``; each request takes one token.
+
+Two backends implement the same check:
+
+* ``local`` keeps buckets in this process in an LRU map capped at
+  ``RATE_LIMIT_MAX_KEYS`` entries, so memory stays bounded (an evicted key
+  simply starts again with a full bucket);
+* ``redis`` keeps each bucket in a Redis hash that expires once it would be
+  full again, and refills and takes a token in one Lua script: one atomic
+  round trip per check, shared by every worker.
+
+Views call ``check_rate_limit(request, policy, key)``, which returns ``None``
+or the 429 response to send.
+"""
+from collections import OrderedDict
+from dataclasses import dataclass
+import math
+import threading
+import time
+
+from django.conf import settings
+from rest_framework import status
+from rest_framework.response import Response
+
+DEFAULT_POLICIES = {
+    # Geocoding autocomplete, per client IP.
+    'address_search': {'rate': 5, 'period': 10, 'burst': 5},
+    # Single location updates, per driver.
+    'trip_location': {'rate': 1, 'period': 1, 'burst': 1},
+}
+
+
+@dataclass(frozen=True)
+class Policy:
+    name: str
+    rate: float
+    period: float
+    burst: int
+
+    @property
+    def per_second(self):
+        return self.rate / self.period
+
+
+@dataclass(frozen=True)
+class RateLimitResult:
+    allowed: bool
+    remaining: float
+    retry_after: float
+
+
+def get_policy(name):
+    """The policy called ``name`` from ``RATE_LIMITS``, falling back to the defaults."""
+    config = getattr(settings, 'RATE_LIMITS', {}).get(name) or DEFAULT_POLICIES.get(name)
+    if config is None:
+        raise KeyError(f'No rate limit policy named {name!r}')
+    return Policy(name=name, rate=config['rate'], period=config['period'],
+                  burst=config.get('burst', config['rate']))
+
+
+class LocalRateLimiter:
+    """Token buckets in an LRU map bounded to ``max_keys`` entries."""
+
+    def __init__(self, max_keys=10000, clock=time.monotonic):
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, policy, key):
+        bucket_key = (policy.name, key)
+        now = self.clock()
+        with self._lock:
+            tokens, updated = self._buckets.pop(bucket_key, (policy.burst, now))
+            tokens = min(policy.burst, tokens + (now - updated) * policy.per_second)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[bucket_key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        retry_after = 0.0 if allowed else (1 - tokens) / policy.per_second
+        return RateLimitResult(allowed=allowed, remaining=tokens, retry_after=retry_after)
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+# KEYS[1] bucket; ARGV: tokens per second, capacity. Uses the Redis clock so
+# every worker agrees on time.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate * 1000) + 1000)
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisRateLimiter:
+    """Token buckets in Redis, checked atomically with one script call."""
+
+    prefix = 'ratelimit'
+
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self._script = self.client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    def hit(self, policy, key):
+        allowed, tokens = self._script(
+            keys=[f'{self.prefix}:{policy.name}:{key}'],
+            args=[policy.per_second, policy.burst],
+        )
+        tokens = float(tokens)
+        allowed = bool(allowed)
+        retry_after = 0.0 if allowed else (1 - tokens) / policy.per_second
+        return RateLimitResult(allowed=allowed, remaining=tokens, retry_after=retry_after)
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """The process-wide limiter selected by ``RATE_LIMIT_BACKEND``."""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                if getattr(settings, 'RATE_LIMIT_BACKEND', 'local') == 'redis':
+                    _limiter = RedisRateLimiter(settings.REDIS_URL)
+                else:
+                    _limiter = LocalRateLimiter(getattr(settings, 'RATE_LIMIT_MAX_KEYS', 10000))
+    return _limiter
+
+
+def client_ip(request):
+    return request.META.get('REMOTE_ADDR', 'anon')
+
+
+def check_rate_limit(request, policy_name, key=None):
+    """Take a token for ``key`` (the client IP by default) under ``policy_name``.
+
+    Returns ``None`` when allowed, otherwise a 429 response with ``Retry-After``.
+    """
+    policy = get_policy(policy_name)
+    result = get_rate_limiter().hit(policy, key if key is not None else client_ip(request))
+    if result.allowed:
+        return None
+    response = Response({'error': 'rate limit exceeded'}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+    response['Retry-After'] = str(max(1, math.ceil(result.retry_after)))
+    return response
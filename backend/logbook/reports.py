@@ -0,0 +1,140 @@
+"""Compliance report engine.
+
+A report covers the driver's completed trips that started within the date
+range and the fuel logs timestamped within it. Trips and fuel logs are read
+once each, ordered by time, and a single merge pass produces every figure:
+a refuel violation is a pair of consecutive fuel logs with more than the
+refuel limit driven by trips ending in ``[previous fill, next fill)``.
+
+Hours-of-service violations within the range come from ``logbook.hos``,
+which loads the drivers' duty intervals with two more queries.
+
+``gps_miles`` sums the GPS-measured distance of the same trips (see
+``logbook.motion``), read through a join on the trip query.
+"""
+from decimal import Decimal
+from itertools import groupby
+from operator import itemgetter
+
+from django.conf import settings
+
+from .hos import driver_violations
+from .models import FuelLog, Trip, trip_hours
+from .motion import METERS_PER_MILE
+
+
+def _trip_rows(driver_id, date_start, date_end):
+    return Trip.objects.filter(
+        driver_id=driver_id,
+        status='completed',
+        start_time__date__gte=date_start,
+        start_time__date__lte=date_end,
+    ).order_by('end_time').values_list(
+        'start_time', 'end_time', 'pickup_time', 'dropoff_time', 'distance', 'motion__distance'
+    ).iterator(chunk_size=2000)
+
+
+def _fuel_times(driver_id, date_start, date_end):
+    return list(FuelLog.objects.filter(
+        driver_id=driver_id,
+        timestamp__date__gte=date_start,
+        timestamp__date__lte=date_end,
+    ).order_by('timestamp').values_list('timestamp', flat=True))
+
+
+def sweep_report(trips, fuel_times):
+    """Merge time-ordered trip rows with sorted fuel timestamps.
+
+    ``trips`` yields ``(start_time, end_time, pickup_time, dropoff_time,
+    distance, gps_distance)`` ordered by ``end_time`` (trips without an end
+    time may come anywhere); ``gps_distance`` is in metres, ``None`` for trips
+    without GPS fixes. ``fuel_times`` is a sorted list. Returns the report
+    fields.
+    """
+    hours_limit = getattr(settings, 'HOURS_LIMIT_8_DAYS', 70)
+    miles_limit = getattr(settings, 'REFUEL_MILES_LIMIT', 1000)
+
+    total_hours = Decimal('0.00')
+    total_miles = Decimal('0.00')
+    gps_meters = 0.0
+    trip_count = 0
+    refuel_violations = 0
+
+    # ``interval`` is the index of the latest fuel log at or before the
+    # current trip's end; only intervals closed by a later fuel log count.
+    interval = -1
+    interval_miles = Decimal('0.00')
+    last_interval = len(fuel_times) - 2
+
+    for start_time, end_time, pickup_time, dropoff_time, distance, gps_distance in trips:
+        trip_count += 1
+        total_miles += distance
+        gps_meters += gps_distance or 0.0
+        total_hours += trip_hours(start_time, end_time, pickup_time, dropoff_time)
+        if end_time is None or not fuel_times:
+            continue
+
+        while interval + 1 < len(fuel_times) and fuel_times[interval + 1] <= end_time:
+            if 0 <= interval <= last_interval and interval_miles > miles_limit:
+                refuel_violations += 1
+            interval += 1
+            interval_miles = Decimal('0.00')
+        if 0 <= interval <= last_interval:
+            interval_miles += distance
+
+    if 0 <= interval <= last_interval and interval_miles > miles_limit:
+        refuel_violations += 1
+
+    return {
+        'total_hours': total_hours,
+        'total_miles': total_miles,
+        'gps_miles': Decimal(gps_meters / METERS_PER_MILE).quantize(Decimal('0.01')),
+        'trip_count': trip_count,
+        'limit_exceeded': total_hours > hours_limit,
+        'refuel_violations': refuel_violations,
+    }
+
+
+def build_report(driver_id, date_start, date_end):
+    """Compute the ``ComplianceReport`` fields for one driver in four queries."""
+    fields = sweep_report(
+        _trip_rows(driver_id, date_start, date_end),
+        _fuel_times(driver_id, date_start, date_end),
+    )
+    violations = driver_violations([driver_id], date_start, date_end)[driver_id]
+    fields['hos_violations'] = [violation.as_dict() for violation in violations]
+    return fields
+
+
+def build_reports(driver_ids, date_start, date_end):
+    """Compute report fields for many drivers with a fixed number of queries.
+
+    Returns ``{driver_id: fields}`` with an entry for every requested driver.
+    """
+    trips = Trip.objects.filter(
+        driver_id__in=driver_ids,
+        status='completed',
+        start_time__date__gte=date_start,
+        start_time__date__lte=date_end,
+    ).order_by('driver_id', 'end_time').values_list(
+        'driver_id', 'start_time', 'end_time', 'pickup_time', 'dropoff_time', 'distance', 'motion__distance'
+    ).iterator(chunk_size=2000)
+    fuel_logs = FuelLog.objects.filter(
+        driver_id__in=driver_ids,
+        timestamp__date__gte=date_start,
+        timestamp__date__lte=date_end,
+    ).order_by('driver_id', 'timestamp').values_list('driver_id', 'timestamp')
+
+    fuel_times = {
+        driver_id: [timestamp for _, timestamp in rows]
+        for driver_id, rows in groupby(fuel_logs, key=itemgetter(0))
+    }
+    reports = {}
+    for driver_id, rows in groupby(trips, key=itemgetter(0)):
+        reports[driver_id] = sweep_report((row[1:] for row in rows), fuel_times.get(driver_id, []))
+    for driver_id in driver_ids:
+        if driver_id not in reports:
+            reports[driver_id] = sweep_report([], fuel_times.get(driver_id, []))
+    for driver_id, violations in driver_violations(driver_ids, date_start, date_end).items():
+        reports[driver_id]['hos_violations'] = [violation.as_dict() for violation in violations]
+    return reports
@@ -1,6 +1,7 @@
 from django.urls import re_path
-from .consumers import TripConsumer
+from .consumers import FleetConsumer, TripConsumer
 
 websocket_urlpatterns = [
     re_path(r'ws/trips/(?P<trip_id>[^/]+)/$', TripConsumer.as_asgi()),
+    re_path(r'ws/fleet/$', FleetConsumer.as_asgi()),
 ]
@@ -1,7 +1,9 @@
 from rest_framework import serializers
 from django.contrib.auth.password_validation import validate_password
-from .models import Driver, Trip, FuelLog, ComplianceReport
-from .models import LocationUpdate
+from .models import Driver, Trip, FuelLog, ComplianceReport, ReportRun, DailyLog
+from .models import LocationUpdate, TripMotion
+from .compliance import compliance_context
+from .motion import motion_payload
 
 
 class DriverRegistrationSerializer(serializers.ModelSerializer):
@@ -26,6 +28,13 @@ class DriverRegistrationSerializer(serializers.ModelSerializer):
         return driver
 
 
+class DriverListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        drivers = data.all() if hasattr(data, 'all') else data
+        drivers = compliance_context(self.context.get('request')).prefetch(drivers)
+        return super().to_representation(drivers)
+
+
 class DriverSerializer(serializers.ModelSerializer):
     total_hours_8days = serializers.ReadOnlyField()
     remaining_hours_8days = serializers.ReadOnlyField()
@@ -43,6 +52,12 @@ class DriverSerializer(serializers.ModelSerializer):
             'needs_refuel', 'created_at'
         ]
         read_only_fields = ['id', 'created_at']
+        list_serializer_class = DriverListSerializer
+
+    def to_representation(self, instance):
+        if not hasattr(instance, '_compliance_cache'):
+            compliance_context(self.context.get('request')).prefetch([instance])
+        return super().to_representation(instance)
 
     def get_full_name(self, obj):
         return obj.get_full_name()
@@ -54,11 +69,22 @@ class DriverUpdateSerializer(serializers.ModelSerializer):
         fields = ['first_name', 'last_name', 'email', 'phone']
 
 
+class TripListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        trips = list(data.all() if hasattr(data, 'all') else data)
+        context = compliance_context(self.context.get('request'))
+        context.prefetch(trip.driver for trip in trips)
+        context.prefetch_hos(trips)
+        return super().to_representation(trips)
+
+
 class TripSerializer(serializers.ModelSerializer):
     total_trip_hours = serializers.ReadOnlyField()
     driver_hours_after_trip = serializers.ReadOnlyField()
     driver_name = serializers.CharField(source='driver.get_full_name', read_only=True)
     compliance_errors = serializers.SerializerMethodField()
+    compliance_warnings = serializers.SerializerMethodField()
+    motion = serializers.SerializerMethodField()
 
     class Meta:
         model = Trip
@@ -67,13 +93,29 @@ class TripSerializer(serializers.ModelSerializer):
             'pickup_lat', 'pickup_lng', 'destination_lat', 'destination_lng',
             'distance', 'start_time', 'end_time', 'pickup_time', 'dropoff_time',
             'status', 'notes', 'total_trip_hours', 'driver_hours_after_trip',
-            'compliance_errors', 'created_at', 'updated_at'
+            'compliance_errors', 'compliance_warnings', 'motion', 'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
+        list_serializer_class = TripListSerializer
+
+    def to_representation(self, instance):
+        if not hasattr(instance.driver, '_compliance_cache'):
+            compliance_context(self.context.get('request')).prefetch([instance.driver])
+        return super().to_representation(instance)
 
     def get_compliance_errors(self, obj):
         return obj.validate_compliance()
 
+    def get_compliance_warnings(self, obj):
+        return obj.compliance_warnings()
+
+    def get_motion(self, obj):
+        """GPS-derived figures (``logbook.motion``), or ``None`` before the first fix."""
+        try:
+            return motion_payload(obj.motion)
+        except TripMotion.DoesNotExist:
+            return None
+
     def validate(self, attrs):
         if attrs.get('end_time') and attrs.get('start_time'):
             if attrs['end_time'] < attrs['start_time']:
@@ -160,12 +202,84 @@ class ComplianceReportSerializer(serializers.ModelSerializer):
         model = ComplianceReport
         fields = [
             'id', 'driver', 'driver_name', 'date_start', 'date_end',
-            'total_hours', 'total_miles', 'trip_count', 'limit_exceeded',
-            'refuel_violations', 'notes', 'generated_at'
+            'total_hours', 'total_miles', 'gps_miles', 'trip_count', 'limit_exceeded',
+            'refuel_violations', 'hos_violations', 'notes', 'generated_at'
         ]
         read_only_fields = ['id', 'generated_at']
 
 
+class ReportRunSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ReportRun
+        fields = [
+            'id', 'date_start', 'date_end', 'driver_ids', 'status', 'total_drivers',
+            'completed_drivers', 'error', 'created_by', 'created_at', 'heartbeat_at', 'finished_at'
+        ]
+        read_only_fields = fields
+
+
+class ReportRunCreateSerializer(serializers.Serializer):
+    date_start = serializers.DateField()
+    date_end = serializers.DateField()
+    driver_ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False)
+
+    def validate(self, attrs):
+        if attrs['date_end'] < attrs['date_start']:
+            raise serializers.ValidationError({"date_end": "End date must not be before start date."})
+        return attrs
+
+
+class ELDRangeSerializer(serializers.Serializer):
+    """Day range of an ELD request, at most ``MAX_RANGE_DAYS`` days long."""
+    MAX_RANGE_DAYS = 31
+
+    date_start = serializers.DateField()
+    date_end = serializers.DateField()
+
+    def validate(self, attrs):
+        date_start, date_end = attrs.get('date_start'), attrs.get('date_end')
+        if date_start and date_end and (
+            date_end < date_start or (date_end - date_start).days >= self.MAX_RANGE_DAYS
+        ):
+            raise serializers.ValidationError(
+                {"date_end": f"Date range must be 1 to {self.MAX_RANGE_DAYS} days."}
+            )
+        return attrs
+
+
+class ELDGenerateSerializer(ELDRangeSerializer):
+    driver_id = serializers.IntegerField(required=False, allow_null=True)
+    trip_id = serializers.IntegerField(required=False, allow_null=True)
+    date_start = serializers.DateField(required=False)
+    date_end = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        if not attrs.get('trip_id') and not (attrs.get('date_start') and attrs.get('date_end')):
+            raise serializers.ValidationError("trip_id or date_start and date_end required.")
+        return attrs
+
+
+class ELDExportSerializer(ELDRangeSerializer):
+    """Body of an export request; ``driver_ids`` and ``formats`` are optional."""
+    FORMATS = ('json', 'svg', 'pdf')
+
+    driver_ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False)
+    formats = serializers.ListField(
+        child=serializers.ChoiceField(choices=FORMATS), required=False, allow_empty=False
+    )
+
+
+class DailyLogSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DailyLog
+        fields = [
+            'id', 'driver', 'day', 'segments', 'events', 'driving_hours',
+            'on_duty_hours', 'off_duty_hours', 'miles', 'input_version', 'generated_at'
+        ]
+        read_only_fields = fields
+
+
 class DashboardStatsSerializer(serializers.Serializer):
     total_drivers = serializers.IntegerField()
     active_trips = serializers.IntegerField()
@@ -177,7 +291,7 @@ class DashboardStatsSerializer(serializers.Serializer):
 class LocationUpdateSerializer(serializers.ModelSerializer):
     class Meta:
         model = LocationUpdate
-        fields = ['id', 'trip', 'driver', 'lat', 'lng', 'accuracy', 'speed', 'recorded_at', 'created_at']
+        fields = ['id', 'trip', 'driver', 'lat', 'lng', 'accuracy', 'speed', 'sequence', 'recorded_at', 'created_at']
         read_only_fields = ['id', 'created_at']
 
     def validate(self, attrs):
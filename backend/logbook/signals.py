@@ -0,0 +1,117 @@
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .dashboard import invalidate_fleet_snapshot
+from .duty_ledger import refresh_duty_days, trip_days
+from .fuel_ledger import add_trip_miles, refresh_fuel_state
+from .geofence import invalidate_index
+from .models import Driver, DriverFuelState, FuelLog, Geofence, Trip
+from .track import simplify_trip
+
+
+@receiver(post_save, sender=Driver)
+def create_fuel_state(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if created and not raw:
+        DriverFuelState.objects.get_or_create(driver=instance)
+    # Logins only touch last_login, which the dashboard does not show.
+    if update_fields is None or set(update_fields) - {'last_login'}:
+        invalidate_fleet_snapshot()
+
+
+@receiver(post_delete, sender=Driver)
+def invalidate_snapshot_on_driver_delete(sender, **kwargs):
+    invalidate_fleet_snapshot()
+
+
+def _stored_trip(pk):
+    if pk is None:
+        return None
+    return Trip.objects.filter(pk=pk).values(
+        'driver_id', 'start_time', 'end_time', 'status', 'distance'
+    ).first()
+
+
+@receiver(pre_save, sender=Trip)
+def remember_stored_trip(sender, instance, raw=False, **kwargs):
+    """Remember the stored version of the trip so its old days/miles can be undone."""
+    if raw:
+        return
+    instance._stored_before = _stored_trip(instance.pk)
+
+
+def _update_duty_days(before, after):
+    touched = {}
+    for stored in (before, after):
+        if stored:
+            touched.setdefault(stored['driver_id'], set()).update(
+                trip_days(stored['start_time'], stored['end_time'])
+            )
+    for driver_id, days in touched.items():
+        refresh_duty_days(driver_id, days)
+
+
+def _update_fuel_state(before, after):
+    was_completed = bool(before) and before['status'] == 'completed'
+    is_completed = bool(after) and after['status'] == 'completed' and after['end_time'] is not None
+    if not was_completed and is_completed:
+        add_trip_miles(after['driver_id'], after['end_time'], after['distance'])
+    elif was_completed:
+        for driver_id in {before['driver_id'], after['driver_id'] if after else None} - {None}:
+            refresh_fuel_state(driver_id)
+
+
+@receiver(post_save, sender=Trip)
+def update_ledgers_on_trip_save(sender, instance, raw=False, **kwargs):
+    """Refresh the duty ledger and refuel counter for the old and new trip."""
+    if raw:
+        return
+    before = getattr(instance, '_stored_before', None)
+    after = _stored_trip(instance.pk)
+    _update_duty_days(before, after)
+    _update_fuel_state(before, after)
+    invalidate_fleet_snapshot()
+    was_completed = bool(before) and before['status'] == 'completed'
+    if (after and after['status'] == 'completed' and not was_completed
+            and getattr(settings, 'TRACK_SIMPLIFY_ON_COMPLETE', True)):
+        transaction.on_commit(partial(simplify_trip, instance))
+
+
+@receiver(post_delete, sender=Trip)
+def update_ledgers_on_trip_delete(sender, instance, **kwargs):
+    refresh_duty_days(instance.driver_id, trip_days(instance.start_time, instance.end_time))
+    if instance.status == 'completed':
+        refresh_fuel_state(instance.driver_id, create=False)
+    invalidate_fleet_snapshot()
+
+
+@receiver(pre_save, sender=FuelLog)
+def remember_fuel_log_driver(sender, instance, raw=False, **kwargs):
+    if raw or instance.pk is None:
+        return
+    instance._driver_before = FuelLog.objects.filter(pk=instance.pk).values_list('driver_id', flat=True).first()
+
+
+@receiver(post_save, sender=FuelLog)
+def reset_fuel_state_on_fuel_log(sender, instance, raw=False, **kwargs):
+    """Logging fuel (possibly back-dated) resets the counter to the trips after the latest log."""
+    if raw:
+        return
+    for driver_id in {instance.driver_id, getattr(instance, '_driver_before', None)} - {None}:
+        refresh_fuel_state(driver_id)
+    invalidate_fleet_snapshot()
+
+
+@receiver(post_delete, sender=FuelLog)
+def reset_fuel_state_on_fuel_log_delete(sender, instance, **kwargs):
+    refresh_fuel_state(instance.driver_id, create=False)
+    invalidate_fleet_snapshot()
+
+
+@receiver(post_save, sender=Geofence)
+@receiver(post_delete, sender=Geofence)
+def invalidate_geofence_index(sender, **kwargs):
+    invalidate_index()
@@ -0,0 +1,101 @@
+import asyncio
+import threading
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from rest_framework.test import APIClient
+
+from logbook.broadcaster import Broadcaster
+
+
+class FakeLayer:
+    """Records sends; ``release`` gates them, ``fail`` names groups whose send raises."""
+
+    def __init__(self, fail=(), hang=()):
+        self.sent = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+        self.fail = set(fail)
+        self.hang = set(hang)
+
+    async def group_send(self, group, message):
+        self.started.set()
+        while not self.release.is_set():
+            await asyncio.sleep(0.005)
+        if group in self.fail:
+            raise ConnectionError('redis went away')
+        if group in self.hang:
+            await asyncio.sleep(60)
+        self.sent.append((group, message['n']))
+
+
+class BroadcasterTest(SimpleTestCase):
+    def _broadcaster(self, layer, **options):
+        patcher = mock.patch('logbook.broadcaster.get_channel_layer', return_value=layer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        broadcaster = Broadcaster(**options)
+        self.addCleanup(broadcaster.close)
+        return broadcaster
+
+    def test_messages_are_sent_in_batches_off_the_caller_thread(self):
+        layer = FakeLayer()
+        broadcaster = self._broadcaster(layer, batch_size=10)
+        for n in range(25):
+            self.assertTrue(broadcaster.publish('trip_1', {'n': n}))
+        broadcaster.close()
+        self.assertEqual(sorted(n for _, n in layer.sent), list(range(25)))
+        metrics = broadcaster.metrics()
+        self.assertEqual((metrics['published'], metrics['sent'], metrics['failed'], metrics['depth']), (25, 25, 0, 0))
+        self.assertLessEqual(metrics['batches'], 25)
+
+    def test_full_queue_drops_the_oldest_messages(self):
+        layer = FakeLayer()
+        layer.release.clear()
+        broadcaster = self._broadcaster(layer, max_queue=3, batch_size=1)
+        broadcaster.publish('trip_1', {'n': 0})
+        self.assertTrue(layer.started.wait(5))
+
+        results = [broadcaster.publish('trip_1', {'n': n}) for n in range(1, 11)]
+        self.assertEqual(results, [True] * 3 + [False] * 7)
+        self.assertEqual(broadcaster.metrics()['depth'], 3)
+
+        layer.release.set()
+        broadcaster.close()
+        self.assertEqual([n for _, n in layer.sent], [0, 8, 9, 10])
+        self.assertEqual(broadcaster.metrics()['dropped'], 7)
+
+    def test_failures_and_timeouts_are_counted(self):
+        layer = FakeLayer(fail={'down'}, hang={'slow'})
+        broadcaster = self._broadcaster(layer, send_timeout=0.05)
+        broadcaster.publish('down', {'n': 1})
+        broadcaster.publish('slow', {'n': 2})
+        broadcaster.publish('trip_1', {'n': 3})
+        with self.assertLogs('logbook.broadcaster', 'WARNING'):
+            broadcaster.close()
+        self.assertEqual(layer.sent, [('trip_1', 3)])
+        metrics = broadcaster.metrics()
+        self.assertEqual((metrics['sent'], metrics['failed']), (1, 2))
+
+    def test_inline_mode_sends_before_returning(self):
+        layer = FakeLayer()
+        broadcaster = self._broadcaster(layer, background=False)
+        broadcaster.publish('trip_1', {'n': 7})
+        self.assertEqual(layer.sent, [('trip_1', 7)])
+        self.assertIsNone(broadcaster._thread)
+
+
+class BroadcastMetricsViewTest(TestCase):
+    def test_admins_only(self):
+        User = get_user_model()
+        client = APIClient()
+        client.force_authenticate(user=User.objects.create_user(username='d', password='x', license_number='BM1'))
+        self.assertEqual(client.get('/api/metrics/broadcasts/').status_code, 403)
+        client.force_authenticate(user=User.objects.create_user(
+            username='a', password='x', license_number='BM2', is_admin=True
+        ))
+        resp = client.get('/api/metrics/broadcasts/')
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn('dropped', resp.json())
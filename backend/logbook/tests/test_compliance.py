@@ -0,0 +1,84 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from logbook.compliance import compute_compliance
+from logbook.models import Driver, FuelLog, Trip
+
+
+class FleetComplianceTest(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.admin = User.objects.create_user(
+            username='admin', password='testpass', license_number='ADM', is_admin=True
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+
+    def _driver(self, n, fuelled=False):
+        driver = get_user_model().objects.create_user(
+            username=f'driver{n}', password='testpass', license_number=f'DL{n}'
+        )
+        now = timezone.now()
+        for days_ago in (1, 3):
+            Trip.objects.create(
+                driver=driver, vehicle_id='T', origin='A', destination='B',
+                distance=Decimal('120.50'),
+                start_time=now - timedelta(days=days_ago, hours=5),
+                end_time=now - timedelta(days=days_ago),
+                status='completed',
+            )
+        if fuelled:
+            FuelLog.objects.create(
+                driver=driver, fuel_amount=Decimal('50'), fuel_cost=Decimal('150'),
+                odometer_reading=Decimal('1000'), location='Stop',
+                timestamp=now - timedelta(days=2),
+            )
+        return driver
+
+    def test_matches_per_driver_properties(self):
+        drivers = [self._driver(n, fuelled=n % 2 == 0) for n in range(4)]
+        results = compute_compliance(Driver.objects.filter(pk__in=[d.pk for d in drivers]))
+        for driver in drivers:
+            driver = Driver.objects.get(pk=driver.pk)
+            row = results[driver.pk]
+            self.assertEqual(row.total_hours_8days, driver.total_hours_8days)
+            self.assertEqual(row.remaining_hours_8days, driver.remaining_hours_8days)
+            self.assertEqual(row.compliance_status, driver.compliance_status)
+            self.assertEqual(row.miles_since_last_fuel, driver.miles_since_last_fuel)
+            self.assertEqual(row.needs_refuel, driver.needs_refuel)
+
+    def _count_list_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get('/api/drivers/')
+        self.assertEqual(resp.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_driver_list_query_count_is_constant(self):
+        self._driver(0)
+        small = self._count_list_queries()
+        for n in range(1, 15):
+            self._driver(n, fuelled=n % 3 == 0)
+        self.assertEqual(self._count_list_queries(), small)
+
+    def _count_trip_list_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get('/api/trips/')
+        self.assertEqual(resp.status_code, 200)
+        return len(ctx.captured_queries), resp.json()
+
+    def test_trip_list_query_count_is_constant(self):
+        self._driver(0)
+        small, _ = self._count_trip_list_queries()
+        for n in range(1, 8):
+            self._driver(n, fuelled=n % 2 == 0)
+        large, body = self._count_trip_list_queries()
+        self.assertEqual(large, small)
+        self.assertEqual(body['count'], 16)
+        self.assertTrue(all(trip['driver_hours_after_trip'] is not None for trip in body['results']))
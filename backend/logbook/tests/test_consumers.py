@@ -0,0 +1,257 @@
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from logbook.fleet_live import PositionCoalescer
+from logbook.locations import ingest_batch
+from logbook.models import LocationUpdate, Trip
+from logbook.positions import LocalPositionStore
+from logbook.routing import websocket_urlpatterns
+from logbook.ws_auth import JWTAuthMiddleware
+
+application = JWTAuthMiddleware(URLRouter(websocket_urlpatterns))
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class TripConsumerLocationTest(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.driver = User.objects.create_user(username='ws', password='testpass', license_number='W1')
+        self.other = User.objects.create_user(username='ws2', password='testpass', license_number='W2')
+        self.trip = Trip.objects.create(
+            driver=self.driver, vehicle_id='T1', origin='A', destination='B', distance=1.0,
+            start_time='2025-10-15T00:00:00Z', status='in_progress',
+        )
+        store = mock.patch('logbook.positions._store', LocalPositionStore(points=5))
+        store.start()
+        self.addCleanup(store.stop)
+
+    def _communicator(self, user=None, since=None):
+        path = f'/ws/trips/{self.trip.pk}/'
+        query = []
+        if user is not None:
+            query.append(f'token={AccessToken.for_user(user)}')
+        if since is not None:
+            query.append(f'since={since}')
+        if query:
+            path += '?' + '&'.join(query)
+        return WebsocketCommunicator(application, path)
+
+    async def _connect(self, communicator):
+        """Connect and return the snapshot every connection starts with."""
+        await communicator.connect()
+        snapshot = await communicator.receive_json_from(timeout=5)
+        self.assertEqual(snapshot['type'], 'location_snapshot')
+        return snapshot
+
+    def _point(self, sequence, minute=0):
+        return {'sequence': sequence, 'lat': 1.0, 'lng': 2.0, 'recorded_at': f'2025-10-15T12:{minute:02d}:00Z'}
+
+    def test_driver_frames_are_stored_acked_and_fanned_out(self):
+        async def scenario():
+            driver = self._communicator(self.driver)
+            watcher = self._communicator()
+            await self._connect(driver)
+            await watcher.connect()
+
+            await driver.send_json_to(dict(self._point(1), type='location'))
+            await driver.send_json_to({'type': 'locations', 'points': [self._point(3, 2), self._point(2, 1)]})
+            frames = [await driver.receive_json_from(timeout=5) for _ in range(2)]
+            acked = set()
+            for frame in frames:
+                if frame['type'] == 'ack':
+                    acked.update(frame['sequences'])
+            while acked != {1, 2, 3}:
+                frame = await driver.receive_json_from(timeout=5)
+                if frame['type'] == 'ack':
+                    acked.update(frame['sequences'])
+
+            seen = []
+            while len(seen) < 3:
+                frame = await watcher.receive_json_from(timeout=5)
+                self.assertEqual(frame['type'], 'location_batch')
+                seen += [p['sequence'] for p in frame['points']]
+
+            # A retry after a lost ack is acknowledged without a second copy.
+            await driver.send_json_to(dict(self._point(2, 1), type='location'))
+            while True:
+                frame = await driver.receive_json_from(timeout=5)
+                if frame['type'] == 'ack':
+                    break
+            self.assertEqual(frame['sequences'], [2])
+            await driver.disconnect()
+            await watcher.disconnect()
+            return sorted(seen)
+
+        self.assertEqual(async_to_sync(scenario)(), [1, 2, 3])
+        self.assertEqual(
+            sorted(LocationUpdate.objects.filter(trip=self.trip).values_list('sequence', flat=True)), [1, 2, 3]
+        )
+
+    def test_only_the_trip_driver_may_send(self):
+        async def scenario():
+            replies = []
+            for user in (None, self.other):
+                communicator = self._communicator(user)
+                # No snapshot: the first frame is the reply.
+                await communicator.connect()
+                await communicator.send_json_to(dict(self._point(1), type='location'))
+                replies.append(await communicator.receive_json_from(timeout=5))
+                await communicator.disconnect()
+            return replies
+
+        for reply in async_to_sync(scenario)():
+            self.assertEqual(reply, {'type': 'error', 'error': 'not authorized', 'sequences': [1]})
+        self.assertFalse(LocationUpdate.objects.exists())
+
+    def test_invalid_points_are_rejected_in_the_ack(self):
+        async def scenario():
+            communicator = self._communicator(self.driver)
+            await self._connect(communicator)
+            await communicator.send_json_to({'type': 'location', 'sequence': 4, 'lat': 500, 'lng': 2})
+            frame = await communicator.receive_json_from(timeout=5)
+            await communicator.disconnect()
+            return frame
+
+        frame = async_to_sync(scenario)()
+        self.assertEqual(frame['type'], 'ack')
+        self.assertEqual(frame['sequences'], [])
+        self.assertEqual(frame['rejected'][0]['sequence'], 4)
+
+    def test_each_batch_sees_the_current_trip(self):
+        async def ack(communicator):
+            while (await communicator.receive_json_from(timeout=5))['type'] != 'ack':
+                pass
+
+        async def scenario():
+            communicator = self._communicator(self.driver)
+            await self._connect(communicator)
+            await communicator.send_json_to(dict(self._point(1), type='location'))
+            await ack(communicator)
+            await database_sync_to_async(
+                Trip.objects.filter(pk=self.trip.pk).update
+            )(status='cancelled', notes='called off')
+            await communicator.send_json_to(dict(self._point(2, 1), type='location'))
+            await ack(communicator)
+            await communicator.disconnect()
+
+        with mock.patch('logbook.consumers.ingest_batch', wraps=ingest_batch) as ingest:
+            async_to_sync(scenario)()
+        self.assertEqual([call.args[0].status for call in ingest.call_args_list], ['in_progress', 'cancelled'])
+        self.assertEqual(Trip.objects.get(pk=self.trip.pk).notes, 'called off')
+
+    def test_only_the_driver_and_admins_get_a_snapshot(self):
+        async def scenario():
+            received = []
+            for user in (self.driver, self.other, None):
+                communicator = self._communicator(user)
+                await communicator.connect()
+                received.append(await communicator.receive_nothing(timeout=0.2))
+                await communicator.disconnect()
+            return received
+
+        self.assertEqual(async_to_sync(scenario)(), [False, True, True])
+
+    def test_connect_sends_a_snapshot_and_resumes_after_since(self):
+        LocationUpdate.objects.bulk_create([
+            LocationUpdate(trip=self.trip, driver=self.driver, lat=1.0, lng=2.0, sequence=sequence,
+                           recorded_at=f'2025-10-15T11:{sequence:02d}:00Z')
+            for sequence in range(8)
+        ])
+
+        admin = get_user_model().objects.create_user(
+            username='wsadmin', password='testpass', license_number='W3', is_admin=True,
+        )
+
+        async def scenario():
+            snapshots = []
+            for since in (None, 5, 5):
+                communicator = self._communicator(admin, since=since)
+                snapshots.append(await self._connect(communicator))
+                await communicator.disconnect()
+            return snapshots
+
+        # One query per connect authenticates the token. The first connect
+        # also loads the store; reconnects are served from it.
+        with self.assertNumQueries(4):
+            full, resumed, again = async_to_sync(scenario)()
+        self.assertEqual([point['sequence'] for point in full['points']], [3, 4, 5, 6, 7])
+        self.assertEqual([point['sequence'] for point in resumed['points']], [6, 7])
+        self.assertEqual(resumed['since'], 5)
+        self.assertEqual(again['points'], resumed['points'])
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}, FLEET_FRAME_HZ=20)
+class FleetConsumerTest(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.admin = User.objects.create_user(username='fleet', password='testpass', license_number='F0', is_admin=True)
+        self.trips = []
+        for index in range(2):
+            driver = User.objects.create_user(username=f'fd{index}', password='testpass', license_number=f'F{index + 1}')
+            self.trips.append(Trip.objects.create(
+                driver=driver, vehicle_id=f'TRUCK-{index}', origin='A', destination='B', distance=1.0,
+                start_time='2025-10-15T00:00:00Z', status='in_progress',
+            ))
+
+    def _points(self, count, lat=1.0):
+        return [
+            {'sequence': i, 'lat': lat + i / 1000, 'lng': 2.0, 'recorded_at': f'2025-10-15T12:00:{i:02d}Z'}
+            for i in range(count)
+        ]
+
+    def test_fixes_are_coalesced_into_frames(self):
+        async def scenario():
+            communicator = WebsocketCommunicator(application, f'/ws/fleet/?token={AccessToken.for_user(self.admin)}')
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            # Sixty fixes from one truck and five from the other, one at a time.
+            for point in self._points(60):
+                await database_sync_to_async(ingest_batch)(self.trips[0], [point])
+            for point in self._points(5, lat=3.0):
+                await database_sync_to_async(ingest_batch)(self.trips[1], [point])
+
+            frames, latest = [], {}
+            while set(latest) != {'TRUCK-0', 'TRUCK-1'} or latest['TRUCK-0']['lat'] != 1.059 \
+                    or latest['TRUCK-1']['lat'] != 3.004:
+                frame = await communicator.receive_json_from(timeout=5)
+                frames.append(frame)
+                latest.update((vehicle['vehicle_id'], vehicle) for vehicle in frame['vehicles'])
+            # Nothing moved, so nothing is sent.
+            self.assertTrue(await communicator.receive_nothing(timeout=0.2))
+            await communicator.disconnect()
+            return frames, latest
+
+        frames, latest = async_to_sync(scenario)()
+        self.assertTrue(all(frame['type'] == 'fleet_frame' for frame in frames))
+        self.assertLess(sum(len(frame['vehicles']) for frame in frames), 65)
+        self.assertEqual(latest['TRUCK-1']['trip_id'], self.trips[1].pk)
+
+    def test_only_admins_may_connect(self):
+        async def scenario():
+            results = []
+            for path in ('/ws/fleet/', f'/ws/fleet/?token={AccessToken.for_user(self.trips[0].driver)}'):
+                communicator = WebsocketCommunicator(application, path)
+                results.append(await communicator.connect())
+            return results
+
+        self.assertEqual(async_to_sync(scenario)(), [(False, 4403), (False, 4403)])
+
+
+class PositionCoalescerTest(TestCase):
+    def test_only_changes_are_taken(self):
+        positions = PositionCoalescer()
+        positions.update(10, {'vehicle_id': 'A', 'lat': 1.0})
+        positions.update(11, {'vehicle_id': 'A', 'lat': 1.1})
+        positions.update(5, {'vehicle_id': 'B', 'lat': 2.0})
+        positions.update(4, {'vehicle_id': 'B', 'lat': 1.9})
+        self.assertEqual(positions.take(), [{'vehicle_id': 'A', 'lat': 1.1}, {'vehicle_id': 'B', 'lat': 2.0}])
+        self.assertEqual(positions.take(), [])
+        positions.update(12, {'vehicle_id': 'A', 'lat': 1.1})
+        self.assertEqual(positions.take(), [])
@@ -0,0 +1,54 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from logbook.models import Trip
+
+
+class DashboardStatsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        self.admin = User.objects.create_user(
+            username='admin', password='testpass', license_number='ADM', is_admin=True
+        )
+        self.driver = User.objects.create_user(username='d1', password='testpass', license_number='D1')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+
+    def _trip(self, hours, miles, status='completed'):
+        now = timezone.now()
+        return Trip.objects.create(
+            driver=self.driver, vehicle_id='T', origin='A', destination='B',
+            distance=Decimal(miles),
+            start_time=now - timedelta(hours=hours),
+            end_time=now if status == 'completed' else None,
+            status=status,
+        )
+
+    def test_snapshot_is_cached_until_data_changes(self):
+        self._trip(69, '600.00')
+        self._trip(1, '10.00', status='in_progress')
+
+        first = self.client.get('/api/dashboard/stats/').json()
+        self.assertEqual(first, {
+            'total_drivers': 2,
+            'active_trips': 1,
+            'completed_trips_today': 1,
+            'compliance_violations': 1,
+            'drivers_needing_refuel': 0,
+        })
+
+        # Auth is forced, so a cached snapshot costs no queries at all.
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/dashboard/stats/').json(), first)
+
+        self._trip(2, '500.00')
+        second = self.client.get('/api/dashboard/stats/').json()
+        self.assertEqual(second['completed_trips_today'], 2)
+        self.assertEqual(second['drivers_needing_refuel'], 1)
@@ -0,0 +1,131 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from importlib import import_module
+from io import StringIO
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from logbook.duty_ledger import check_duty_days, rebuild_duty_days
+from logbook.models import DriverDutyDay, Trip
+
+
+class DutyLedgerTest(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.driver = User.objects.create_user(username='ledger', password='testpass', license_number='L1')
+        self.today = timezone.localdate()
+        self.midnight = datetime.combine(self.today, datetime.min.time(), tzinfo=dt_timezone.utc)
+
+    def _trip(self, start, hours, status='completed'):
+        return Trip.objects.create(
+            driver=self.driver,
+            vehicle_id='T1',
+            origin='A',
+            destination='B',
+            distance=Decimal('100.00'),
+            start_time=start,
+            end_time=start + timedelta(hours=hours),
+            pickup_time=Decimal('1.00'),
+            dropoff_time=Decimal('1.00'),
+            status=status,
+        )
+
+    def _ledger(self):
+        return {row.day: row.hours for row in DriverDutyDay.objects.filter(driver=self.driver)}
+
+    def test_trip_crossing_midnight_is_split(self):
+        self._trip(self.midnight - timedelta(hours=2), 4)
+        yesterday = self.today - timedelta(days=1)
+        self.assertEqual(self._ledger(), {yesterday: Decimal('3.00'), self.today: Decimal('3.00')})
+        self.assertEqual(self.driver.total_hours_8days, Decimal('6.00'))
+
+    def test_edit_and_cancel_move_hours(self):
+        trip = self._trip(self.midnight + timedelta(hours=1), 2, status='in_progress')
+        self.assertEqual(self._ledger(), {})
+
+        trip.status = 'completed'
+        trip.save()
+        self.assertEqual(self._ledger(), {self.today: Decimal('4.00')})
+
+        trip.start_time -= timedelta(days=2)
+        trip.end_time -= timedelta(days=2)
+        trip.save()
+        self.assertEqual(self._ledger(), {self.today - timedelta(days=2): Decimal('4.00')})
+
+        trip.status = 'cancelled'
+        trip.save()
+        self.assertEqual(self._ledger(), {})
+
+    def test_window_ignores_days_outside_eight_days(self):
+        self._trip(self.midnight - timedelta(days=8) + timedelta(hours=1), 2)
+        self._trip(self.midnight - timedelta(days=7) + timedelta(hours=1), 2)
+        self.assertEqual(self.driver.total_hours_8days, Decimal('4.00'))
+
+    def test_rebuild_and_check(self):
+        self._trip(self.midnight - timedelta(hours=5), 8)
+        self._trip(self.midnight - timedelta(days=3), 1)
+        expected = self._ledger()
+
+        DriverDutyDay.objects.all().delete()
+        self.assertTrue(check_duty_days())
+
+        rebuild_duty_days()
+        self.assertEqual(self._ledger(), expected)
+        self.assertEqual(check_duty_days(), [])
+        call_command('check_duty_days', stdout=StringIO())
+
+    def test_migration_backfills_existing_trips(self):
+        self._trip(self.midnight - timedelta(hours=5), 8)
+        expected = self._ledger()
+        DriverDutyDay.objects.all().delete()
+
+        migration = import_module('logbook.migrations.0002_driver_duty_days')
+        migration.backfill_duty_days(apps, None)
+        self.assertEqual(self._ledger(), expected)
+
+
+class HoursRecoveryTest(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.driver = User.objects.create_user(username='recover', password='testpass', license_number='R1')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.driver)
+        today = timezone.localdate()
+        for days_ago, hours in [(7, 20), (5, 30), (1, 15)]:
+            DriverDutyDay.objects.create(
+                driver=self.driver, day=today - timedelta(days=days_ago), hours=Decimal(hours)
+            )
+
+    def test_timeline_rolls_days_off(self):
+        resp = self.client.get(f'/api/drivers/{self.driver.pk}/hours_recovery/', {'duration': '25'})
+        self.assertEqual(resp.status_code, 200)
+        body = resp.json()
+        available = [point['hours_available'] for point in body['timeline']]
+        # 65 hrs used: day -7 (20) leaves tomorrow, day -5 (30) in three days, day -1 (15) in seven.
+        self.assertEqual(available, [5, 25, 25, 55, 55, 55, 55, 70, 70])
+        tomorrow = datetime.combine(timezone.localdate() + timedelta(days=1), datetime.min.time(), tzinfo=dt_timezone.utc)
+        self.assertEqual(datetime.fromisoformat(body['earliest_start'].replace('Z', '+00:00')), tomorrow)
+
+    def test_duration_over_limit_never_fits(self):
+        body = self.client.get(f'/api/drivers/{self.driver.pk}/hours_recovery/', {'duration': '71'}).json()
+        self.assertIsNone(body['earliest_start'])
+        for duration in ('x', 'nan', 'Infinity', '-2'):
+            resp = self.client.get(f'/api/drivers/{self.driver.pk}/hours_recovery/', {'duration': duration})
+            self.assertEqual(resp.status_code, 400, duration)
+
+    def test_fleet_variant_uses_one_ledger_query(self):
+        admin = get_user_model().objects.create_user(
+            username='boss', password='testpass', license_number='ADM', is_admin=True
+        )
+        self.client.force_authenticate(user=admin)
+        # driver ids + ledger rows
+        with self.assertNumQueries(2):
+            resp = self.client.get('/api/drivers/hours_recovery/', {'duration': '10'})
+        by_driver = {row['driver_id']: row for row in resp.json()}
+        self.assertEqual(by_driver[admin.pk]['timeline'][0]['hours_available'], 70)
+        self.assertIsNotNone(by_driver[self.driver.pk]['earliest_start'])
@@ -0,0 +1,232 @@
+from datetime import date, datetime, timezone as dt_timezone
+from decimal import Decimal
+import io
+import json
+import shutil
+import tempfile
+from unittest import mock
+import zipfile
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from logbook import eld_render
+from logbook.eld import ELDGenerator
+from logbook.models import DailyLog, FuelLog, LocationUpdate, Trip
+
+
+def at(day, hour, minute=0):
+    return datetime(2025, 6, day, hour, minute, tzinfo=dt_timezone.utc)
+
+
+class ELDGeneratorTest(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.driver = User.objects.create_user(username='eld', password='testpass', license_number='E1')
+        self.trip = Trip.objects.create(
+            driver=self.driver, vehicle_id='T', origin='Chicago', destination='Denver',
+            distance=Decimal('600.00'), start_time=at(1, 20), end_time=at(2, 6),
+            pickup_time=Decimal('1.00'), dropoff_time=Decimal('0.50'), status='completed',
+        )
+        FuelLog.objects.create(
+            driver=self.driver, trip=self.trip, fuel_amount=Decimal('80'), fuel_cost=Decimal('300'),
+            odometer_reading=Decimal('12000'), location='Iowa', timestamp=at(2, 2),
+        )
+        # Ten minutes stopped at 23:00 on the first day.
+        for minute in range(0, 11, 2):
+            LocationUpdate.objects.create(
+                trip=self.trip, driver=self.driver, lat=41.0, lng=-93.0, speed=0.0,
+                recorded_at=at(1, 23, minute),
+            )
+        self.generator = ELDGenerator(self.driver)
+
+    def _statuses(self, log):
+        return [(s['status'], s['start'][11:16], s['end'][11:16]) for s in log.segments]
+
+    def test_multi_day_trip_segments(self):
+        first, second = self.generator.generate_daily_logs(date(2025, 6, 1), date(2025, 6, 2))
+        self.assertEqual(self._statuses(first), [
+            ('off_duty', '00:00', '19:00'),
+            ('on_duty', '19:00', '20:00'),
+            ('driving', '20:00', '23:00'),
+            ('on_duty', '23:00', '23:10'),
+            ('driving', '23:10', '00:00'),
+        ])
+        self.assertEqual(self._statuses(second), [
+            ('driving', '00:00', '02:00'),
+            ('on_duty', '02:00', '02:15'),
+            ('driving', '02:15', '06:00'),
+            ('on_duty', '06:00', '06:30'),
+            ('off_duty', '06:30', '00:00'),
+        ])
+        self.assertEqual(first.driving_hours + second.driving_hours, Decimal('9.58'))
+        self.assertEqual(first.miles + second.miles, Decimal('600.00'))
+        self.assertEqual([e['type'] for e in second.events], ['fuel', 'dropoff'])
+
+    def test_unchanged_days_are_not_rebuilt(self):
+        self.generator.generate_daily_logs(date(2025, 5, 25), date(2025, 6, 5))
+        stamps = dict(DailyLog.objects.values_list('day', 'generated_at'))
+
+        Trip.objects.create(
+            driver=self.driver, vehicle_id='T', origin='A', destination='B',
+            distance=Decimal('50.00'), start_time=at(4, 10), end_time=at(4, 12), status='completed',
+        )
+        logs = self.generator.generate_daily_logs(date(2025, 5, 25), date(2025, 6, 5))
+        rebuilt = [log.day for log in logs if log.generated_at != stamps[log.day]]
+        self.assertEqual(rebuilt, [date(2025, 6, 4)])
+
+    def test_generate_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(user=self.driver)
+        resp = client.post('/api/eld/generate/', {'trip_id': self.trip.pk}, format='json')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual([log['day'] for log in resp.json()['daily_logs']], ['2025-06-01', '2025-06-02'])
+
+        other = get_user_model().objects.create_user(username='other', password='testpass', license_number='E2')
+        resp = client.post('/api/eld/generate/', {
+            'driver_id': other.pk, 'date_start': '2025-06-01', 'date_end': '2025-06-02'
+        }, format='json')
+        self.assertEqual(resp.status_code, 403)
+
+        for body in ({'trip_id': [self.trip.pk]}, {'driver_id': {'id': 1}, 'trip_id': self.trip.pk},
+                     {'date_start': '2025-06-01'}, {'date_start': '2025-06-01', 'date_end': '2025-08-01'}):
+            self.assertEqual(client.post('/api/eld/generate/', body, format='json').status_code, 400, body)
+
+
+class ELDSheetRenderTest(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        override = override_settings(ELD_RENDER_ROOT=self.root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.driver = get_user_model().objects.create_user(
+            username='sheet', password='testpass', license_number='S1', first_name='Sam', last_name='Lee'
+        )
+        Trip.objects.create(
+            driver=self.driver, vehicle_id='T', origin='Reno', destination='Elko & Wells',
+            distance=Decimal('290.00'), start_time=at(3, 8), end_time=at(3, 13), status='completed',
+        )
+        self.log, = ELDGenerator(self.driver).generate_daily_logs(date(2025, 6, 3), date(2025, 6, 3))
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.driver)
+
+    def test_svg_sheet(self):
+        svg = eld_render.sheet_path(self.log, 'svg').read_text()
+        self.assertTrue(svg.startswith('<svg'))
+        self.assertIn('Sam Lee', svg)
+        self.assertIn('Elko &amp; Wells', svg)
+        # Driving from 08:00 to 13:00 on the driving row.
+        self.assertIn('<line x1="342.00" y1="235.00" x2="462.00" y2="235.00"', svg)
+
+    def test_pdf_sheet(self):
+        pdf = eld_render.sheet_path(self.log, 'pdf').read_bytes()
+        self.assertTrue(pdf.startswith(b'%PDF-1.4'))
+        self.assertTrue(pdf.rstrip().endswith(b'%%EOF'))
+        self.assertIn(b'(Driver: Sam Lee) Tj', pdf)
+
+    def test_unchanged_day_is_rendered_once(self):
+        first = eld_render.sheet_path(self.log, 'svg')
+        with mock.patch.dict(eld_render.RENDERERS, svg=mock.Mock(side_effect=AssertionError)):
+            self.assertEqual(eld_render.sheet_path(self.log, 'svg'), first)
+
+        Trip.objects.create(
+            driver=self.driver, vehicle_id='T', origin='Elko', destination='Ely',
+            distance=Decimal('190.00'), start_time=at(3, 15), end_time=at(3, 18), status='completed',
+        )
+        log, = ELDGenerator(self.driver).generate_daily_logs(date(2025, 6, 3), date(2025, 6, 3))
+        self.assertNotEqual(eld_render.sheet_path(log, 'svg'), first)
+
+    def test_generate_returns_sheet_urls(self):
+        resp = self.client.post('/api/eld/generate/', {
+            'date_start': '2025-06-03', 'date_end': '2025-06-03'
+        }, format='json')
+        self.assertEqual(resp.status_code, 200)
+        pdf_url = resp.json()['pdf_urls'][0]
+        self.assertTrue(pdf_url.endswith(f'/api/eld/logs/{self.log.pk}/sheet.pdf'))
+
+        resp = self.client.get(pdf_url)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp['Content-Type'], 'application/pdf')
+        self.assertTrue(b''.join(resp.streaming_content).startswith(b'%PDF'))
+        self.assertEqual(self.client.get(pdf_url, HTTP_IF_NONE_MATCH=resp['ETag']).status_code, 304)
+
+        other = get_user_model().objects.create_user(username='other', password='testpass', license_number='S2')
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.client.get(pdf_url).status_code, 403)
+
+
+class ELDExportTest(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        override = override_settings(ELD_RENDER_ROOT=self.root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        User = get_user_model()
+        self.admin = User.objects.create_user(username='boss', password='testpass', license_number='A1', is_admin=True)
+        self.drivers = [
+            User.objects.create_user(username=f'd{n}', password='testpass', license_number=f'CDL {n}')
+            for n in range(2)
+        ]
+        for driver in self.drivers:
+            Trip.objects.create(
+                driver=driver, vehicle_id='T', origin='A', destination='B',
+                distance=Decimal('100.00'), start_time=at(5, 8), end_time=at(5, 10), status='completed',
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+
+    def _export(self, **data):
+        resp = self.client.post('/api/eld/export/', dict({
+            'driver_ids': [d.pk for d in self.drivers], 'date_start': '2025-06-04', 'date_end': '2025-06-06',
+        }, **data), format='json')
+        self.assertEqual(resp.status_code, 200)
+        chunks = list(resp.streaming_content)
+        return chunks, zipfile.ZipFile(io.BytesIO(b''.join(chunks)))
+
+    def test_archive_streams_every_driver_and_day(self):
+        chunks, archive = self._export()
+        self.assertEqual(len(archive.namelist()), 2 * 3 * 3)
+        folder = f'{self.drivers[0].pk}-cdl-0'
+        self.assertIn(f'{folder}/2025-06-05.pdf', archive.namelist())
+        log = json.loads(archive.read(f'{folder}/2025-06-05.json'))
+        self.assertEqual(log['driving_hours'], '2.00')
+        self.assertTrue(archive.read(f'{folder}/2025-06-05.svg').startswith(b'<svg'))
+        # Bytes leave as each member is written, not once at the end.
+        self.assertGreater(len([chunk for chunk in chunks if chunk]), 2 * 3 * 3)
+
+    def test_cached_sheets_are_reused(self):
+        self._export(formats=['svg'])
+        with mock.patch.dict(eld_render.RENDERERS, svg=mock.Mock(side_effect=AssertionError)):
+            _, archive = self._export(formats=['json', 'svg'])
+        self.assertEqual(len(archive.namelist()), 2 * 3 * 2)
+
+    def test_invalid_bodies_are_rejected(self):
+        for extra in ({'formats': [['svg']]}, {'formats': ['doc']}, {'driver_ids': [{'id': 1}]},
+                      {'driver_ids': 'all'}, {'date_end': '2025-08-01'}):
+            resp = self.client.post('/api/eld/export/', dict({
+                'driver_ids': [d.pk for d in self.drivers], 'date_start': '2025-06-04', 'date_end': '2025-06-06',
+            }, **extra), format='json')
+            self.assertEqual(resp.status_code, 400, extra)
+
+    def test_repeated_ids_and_formats_are_merged(self):
+        pk = self.drivers[0].pk
+        _, archive = self._export(driver_ids=[pk, str(pk)], formats=['json', 'json'])
+        self.assertEqual(len(archive.namelist()), 3)
+
+    def test_drivers_export_only_their_own_logs(self):
+        self.client.force_authenticate(user=self.drivers[0])
+        resp = self.client.post('/api/eld/export/', {
+            'driver_ids': [self.drivers[1].pk], 'date_start': '2025-06-04', 'date_end': '2025-06-06',
+        }, format='json')
+        self.assertEqual(resp.status_code, 403)
+        resp = self.client.post('/api/eld/export/', {
+            'date_start': '2025-06-04', 'date_end': '2025-06-06', 'formats': ['json'],
+        }, format='json')
+        self.assertEqual(resp.status_code, 200)
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(resp.streaming_content)))
+        self.assertEqual(len(archive.namelist()), 3)
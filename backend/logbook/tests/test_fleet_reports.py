@@ -0,0 +1,121 @@
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+import time
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from logbook.fleet_reports import create_report_run, execute_report_run, launch_report_run, process_chunk
+from logbook.models import ComplianceReport, ReportRun, Trip
+from logbook.reports import build_report
+
+
+class FleetReportRunTest(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.drivers = [
+            User.objects.create_user(username=f'fleet{n}', password='testpass', license_number=f'FL{n}')
+            for n in range(7)
+        ]
+        User.objects.create_user(username='inactive', password='testpass', license_number='IN', is_active=False)
+        start = datetime(2025, 5, 2, 8, tzinfo=dt_timezone.utc)
+        for n, driver in enumerate(self.drivers):
+            for i in range(n):
+                Trip.objects.create(
+                    driver=driver, vehicle_id='T', origin='A', destination='B',
+                    distance=Decimal(100 + i), start_time=start + timedelta(days=i),
+                    end_time=start + timedelta(days=i, hours=3), status='completed',
+                )
+
+    def test_run_generates_one_report_per_active_driver(self):
+        run = create_report_run(date(2025, 5, 1), date(2025, 5, 31), chunk_size=3)
+        self.assertEqual(run.total_drivers, 7)
+        self.assertEqual(run.chunks.count(), 3)
+
+        progress = []
+        run = execute_report_run(run, progress=lambda *args: progress.append(args))
+        self.assertEqual(run.status, 'completed')
+        self.assertEqual(run.completed_drivers, 7)
+        self.assertEqual([p[:2] for p in progress], [(1, 3), (2, 3), (3, 3)])
+
+        for driver in self.drivers:
+            report = ComplianceReport.objects.get(driver=driver, run=run)
+            expected = build_report(driver.pk, date(2025, 5, 1), date(2025, 5, 31))
+            self.assertEqual(report.trip_count, expected['trip_count'])
+            self.assertEqual(report.total_hours, expected['total_hours'])
+            self.assertEqual(report.total_miles, expected['total_miles'])
+
+    def test_resume_skips_completed_chunks(self):
+        run = create_report_run(date(2025, 5, 1), date(2025, 5, 31), chunk_size=2)
+        first = run.chunks.first()
+        self.assertEqual(process_chunk(first.pk), 2)
+        # Simulate an interruption after the first chunk, then resume.
+        execute_report_run(run)
+        self.assertEqual(process_chunk(first.pk), 0)
+        self.assertEqual(ComplianceReport.objects.filter(run=run).count(), 7)
+        self.assertEqual(ReportRun.objects.get(pk=run.pk).completed_drivers, 7)
+
+    def test_driver_filter(self):
+        ids = [self.drivers[1].pk, self.drivers[4].pk]
+        run = execute_report_run(create_report_run(date(2025, 5, 1), date(2025, 5, 31), driver_ids=ids))
+        self.assertEqual(sorted(run.reports.values_list('driver_id', flat=True)), sorted(ids))
+
+    @patch('logbook.views.launch_report_run')
+    def test_api_is_admin_only(self, launch):
+        client = APIClient()
+        client.force_authenticate(user=self.drivers[0])
+        payload = {'date_start': '2025-05-01', 'date_end': '2025-05-31'}
+        resp = client.post('/api/compliance-reports/generate_fleet/', payload, format='json')
+        self.assertEqual(resp.status_code, 403)
+        launch.assert_not_called()
+
+        admin = get_user_model().objects.create_user(
+            username='boss', password='testpass', license_number='ADM', is_admin=True
+        )
+        client.force_authenticate(user=admin)
+        resp = client.post('/api/compliance-reports/generate_fleet/', payload, format='json')
+        self.assertEqual(resp.status_code, 202)
+        self.assertEqual(resp.json()['total_drivers'], 8)
+        launch.assert_called_once()
+
+        resp = client.get(f"/api/report-runs/{resp.json()['id']}/")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()['status'], 'pending')
+
+    @patch('logbook.views.launch_report_run')
+    def test_resume_refuses_live_runs(self, launch):
+        admin = get_user_model().objects.create_user(
+            username='boss', password='testpass', license_number='ADM', is_admin=True
+        )
+        client = APIClient()
+        client.force_authenticate(user=admin)
+        run = create_report_run(date(2025, 5, 1), date(2025, 5, 31))
+        ReportRun.objects.filter(pk=run.pk).update(status='running', heartbeat_at=timezone.now())
+
+        resp = client.post(f'/api/report-runs/{run.pk}/resume/')
+        self.assertEqual(resp.status_code, 409)
+        launch.assert_not_called()
+
+        ReportRun.objects.filter(pk=run.pk).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+        resp = client.post(f'/api/report-runs/{run.pk}/resume/')
+        self.assertEqual(resp.status_code, 202)
+        self.assertEqual(resp.json()['status'], 'running')
+        self.assertGreater(ReportRun.objects.get(pk=run.pk).heartbeat_at, timezone.now() - timedelta(minutes=1))
+        launch.assert_called_once()
+
+        # The claim itself marks the run live, so an immediate second resume is refused.
+        self.assertEqual(client.post(f'/api/report-runs/{run.pk}/resume/').status_code, 409)
+
+    @patch('logbook.fleet_reports.subprocess.Popen')
+    def test_launched_workers_are_reaped(self, popen):
+        process = launch_report_run(create_report_run(date(2025, 5, 1), date(2025, 5, 31)))
+        self.assertIs(process, popen.return_value)
+        self.assertTrue(popen.call_args.kwargs['start_new_session'])
+        for _ in range(100):
+            if process.wait.called:
+                break
+            time.sleep(0.01)
+        process.wait.assert_called_once_with()
@@ -0,0 +1,91 @@
+from datetime import timedelta
+from decimal import Decimal
+from importlib import import_module
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.utils import timezone
+
+from logbook.fuel_ledger import compute_fuel_state
+from logbook.models import DriverFuelState, FuelLog, Trip
+
+
+class FuelLedgerTest(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.driver = User.objects.create_user(username='fuel', password='testpass', license_number='F1')
+        self.now = timezone.now()
+
+    def _trip(self, days_ago, miles, status='completed'):
+        return Trip.objects.create(
+            driver=self.driver, vehicle_id='T', origin='A', destination='B',
+            distance=Decimal(miles),
+            start_time=self.now - timedelta(days=days_ago, hours=4),
+            end_time=self.now - timedelta(days=days_ago),
+            status=status,
+        )
+
+    def _fuel(self, days_ago):
+        return FuelLog.objects.create(
+            driver=self.driver, fuel_amount=Decimal('50'), fuel_cost=Decimal('150'),
+            odometer_reading=Decimal('1000'), location='Stop',
+            timestamp=self.now - timedelta(days=days_ago),
+        )
+
+    def _miles(self):
+        state = DriverFuelState.objects.get(driver=self.driver)
+        self.assertEqual(state.miles_since_fuel, compute_fuel_state(self.driver.pk)[1])
+        return state.miles_since_fuel
+
+    def test_completing_trips_adds_miles(self):
+        self._trip(3, '100.00')
+        trip = self._trip(1, '250.50', status='in_progress')
+        self.assertEqual(self._miles(), Decimal('100.00'))
+        trip.status = 'completed'
+        trip.save()
+        self.assertEqual(self._miles(), Decimal('350.50'))
+
+    def test_fuel_log_resets_counter_including_back_dated(self):
+        self._trip(5, '100.00')
+        self._trip(3, '200.00')
+        self._trip(1, '300.00')
+        self._fuel(0)
+        self.assertEqual(self._miles(), Decimal('0.00'))
+
+        latest = FuelLog.objects.get()
+        latest.timestamp = self.now - timedelta(days=4)
+        latest.save()
+        self.assertEqual(self._miles(), Decimal('500.00'))
+
+        latest.delete()
+        self.assertEqual(self._miles(), Decimal('600.00'))
+
+    def test_edit_and_cancel_completed_trip(self):
+        self._fuel(4)
+        self._trip(5, '100.00')
+        trip = self._trip(1, '300.00')
+        self.assertEqual(self._miles(), Decimal('300.00'))
+
+        trip.distance = Decimal('120.00')
+        trip.save()
+        self.assertEqual(self._miles(), Decimal('120.00'))
+
+        trip.status = 'cancelled'
+        trip.save()
+        self.assertEqual(self._miles(), Decimal('0.00'))
+
+    def test_migration_backfills_existing_drivers(self):
+        self._fuel(4)
+        self._trip(1, '300.00')
+        DriverFuelState.objects.all().delete()
+
+        migration = import_module('logbook.migrations.0003_driver_fuel_state')
+        migration.backfill_fuel_state(apps, None)
+        self.assertEqual(self._miles(), Decimal('300.00'))
+
+    def test_driver_delete_cascades(self):
+        self._trip(1, '100.00')
+        self._fuel(0)
+        self.driver.delete()
+        self.assertFalse(DriverFuelState.objects.exists())
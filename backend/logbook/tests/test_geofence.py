@@ -0,0 +1,145 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from logbook.geofence import VERSION_KEY, Fence, GridIndex, get_index, process_fixes
+from logbook.models import Geofence, GeofenceEvent, LocationUpdate, Trip
+
+# About 11 m of latitude.
+STEP = 0.0001
+
+
+@override_settings(ARRIVAL_RADIUS_METERS=50, GEOFENCE_EXIT_MARGIN_METERS=30, GEOFENCE_DWELL_SECONDS=60)
+class GeofenceEngineTest(TestCase):
+    def setUp(self):
+        self.driver = get_user_model().objects.create_user(username='geo', password='testpass', license_number='G1')
+        self.trip = Trip.objects.create(
+            driver=self.driver, vehicle_id='T1', origin='A', destination='B', distance=1.0,
+            start_time='2025-10-15T00:00:00Z', status='pending',
+            pickup_lat=40.0, pickup_lng=-105.0, destination_lat=41.0, destination_lng=-105.0,
+        )
+        self.start = timezone.now().replace(microsecond=0)
+
+    def _fixes(self, coordinates, seconds=10, accuracy=5.0):
+        return [
+            LocationUpdate(
+                trip=self.trip, driver=self.driver, lat=lat, lng=lng, accuracy=accuracy,
+                recorded_at=self.start + timedelta(seconds=index * seconds),
+            )
+            for index, (lat, lng) in enumerate(coordinates)
+        ]
+
+    def _events(self, events):
+        return [(event.fence, event.event) for event in events]
+
+    def test_jitter_at_the_edge_does_not_flap(self):
+        # In at 0 m, then wandering 55-70 m from the centre: outside the
+        # 50 m radius but within the 30 m exit margin.
+        fixes = self._fixes([(41.0, -105.0)] + [(41.0 + STEP * (5 + i % 2), -105.0) for i in range(4)])
+        arrived, events = process_fixes(self.trip, fixes)
+        self.assertEqual(self._events(events), [('destination', 'enter')])
+        self.assertFalse(arrived)
+
+    def test_dwell_at_destination_completes_trip(self):
+        arrived, events = process_fixes(self.trip, self._fixes([(41.0, -105.0)] * 4, seconds=30))
+        self.assertTrue(arrived)
+        self.assertEqual(self._events(events), [('destination', 'enter'), ('destination', 'dwell')])
+        self.trip.refresh_from_db()
+        self.assertEqual(self.trip.status, 'completed')
+        self.assertEqual(self.trip.end_time, self.start + timedelta(seconds=60))
+
+    def test_state_carries_across_batches(self):
+        process_fixes(self.trip, self._fixes([(41.0, -105.0)]))
+        self.start += timedelta(seconds=90)
+        arrived, events = process_fixes(self.trip, self._fixes([(41.0, -105.0)]))
+        self.assertTrue(arrived)
+        self.assertEqual(self._events(events), [('destination', 'dwell')])
+
+    def test_leaving_pickup_starts_trip(self):
+        arrived, events = process_fixes(self.trip, self._fixes([(40.0, -105.0), (40.01, -105.0)]))
+        self.assertEqual(self._events(events), [('pickup', 'enter'), ('pickup', 'exit')])
+        self.trip.refresh_from_db()
+        self.assertEqual(self.trip.status, 'in_progress')
+        self.assertEqual(GeofenceEvent.objects.filter(trip=self.trip).count(), 2)
+
+    def test_inaccurate_fixes_are_ignored(self):
+        arrived, events = process_fixes(self.trip, self._fixes([(41.0, -105.0)], accuracy=500))
+        self.assertEqual(events, [])
+
+    def test_shared_polygon_fence(self):
+        yard = Geofence.objects.create(
+            name='Yard', kind='yard',
+            polygon=[[40.5, -105.01], [40.5, -104.99], [40.51, -104.99], [40.51, -105.01]],
+        )
+        fixes = self._fixes([(40.49, -105.0), (40.505, -105.0), (40.505, -105.0), (40.52, -105.0)], seconds=60)
+        arrived, events = process_fixes(self.trip, fixes)
+        key = f'geofence:{yard.pk}'
+        self.assertEqual(self._events(events), [(key, 'enter'), (key, 'dwell'), (key, 'exit')])
+        self.assertEqual(events[0].geofence_id, yard.pk)
+
+    def test_index_is_rebuilt_when_fences_change(self):
+        self.assertEqual(get_index().by_key, {})
+        fence = Geofence.objects.create(name='Fuel', kind='fuel_stop', lat=40.2, lng=-105.0, radius=100)
+        self.assertIn(f'geofence:{fence.pk}', get_index().by_key)
+        fence.delete()
+        self.assertEqual(get_index().by_key, {})
+
+    def test_edits_from_other_workers_are_picked_up(self):
+        get_index()
+        # bulk_create sends no signal, like a save in another worker whose
+        # cache this process does not share.
+        fence, = Geofence.objects.bulk_create([
+            Geofence(name='Fuel', kind='fuel_stop', lat=40.2, lng=-105.0, radius=100)
+        ])
+        with override_settings(GEOFENCE_INDEX_CHECK_SECONDS=0):
+            cache.delete(VERSION_KEY)
+            self.assertIn(f'geofence:{fence.pk}', get_index().by_key)
+            Geofence.objects.filter(pk=fence.pk).delete()
+            self.assertEqual(get_index().by_key, {})
+
+    def test_stale_trip_does_not_undo_a_cancellation(self):
+        Trip.objects.filter(pk=self.trip.pk).update(status='in_progress')
+        self.trip.status = 'in_progress'
+        Trip.objects.filter(pk=self.trip.pk).update(status='cancelled', notes='called off')
+        arrived, events = process_fixes(self.trip, self._fixes([(41.0, -105.0)] * 8, seconds=30))
+        self.assertFalse(arrived)
+        self.assertIn(('destination', 'dwell'), self._events(events))
+        stored = Trip.objects.get(pk=self.trip.pk)
+        self.assertEqual((stored.status, stored.notes), ('cancelled', 'called off'))
+        self.assertEqual(self.trip.status, 'cancelled')
+
+    def test_completion_keeps_edits_made_meanwhile(self):
+        Trip.objects.filter(pk=self.trip.pk).update(status='in_progress', destination='Depot 9')
+        self.trip.status = 'in_progress'
+        arrived, _ = process_fixes(self.trip, self._fixes([(41.0, -105.0)] * 8, seconds=30))
+        self.assertTrue(arrived)
+        stored = Trip.objects.get(pk=self.trip.pk)
+        self.assertEqual((stored.status, stored.destination), ('completed', 'Depot 9'))
+
+    def test_geofence_needs_a_shape(self):
+        with self.assertRaises(ValidationError):
+            Geofence(name='Empty', kind='yard').clean()
+        with self.assertRaises(ValidationError):
+            Geofence(name='Line', kind='yard', polygon=[[1, 2], [3, 4]]).clean()
+
+
+class GridIndexTest(TestCase):
+    def test_candidates_only_cover_nearby_cells(self):
+        near = Fence(key='near', kind='yard', name='near', lat=40.0, lng=-105.0, radius=200)
+        far = Fence(key='far', kind='yard', name='far', lat=45.0, lng=-100.0, radius=200)
+        index = GridIndex([near, far], cell_degrees=0.01, margin=50)
+        self.assertEqual([fence.key for fence in index.candidates(40.001, -105.001)], ['near'])
+        self.assertEqual(list(index.candidates(42.0, -102.0)), [])
+
+    def test_circle_and_polygon_distance(self):
+        circle = Fence(key='c', kind='yard', name='c', lat=0.0, lng=0.0, radius=100)
+        self.assertEqual(circle.distance(0.0, 0.0), 0.0)
+        self.assertAlmostEqual(circle.distance(0.002, 0.0), 122.4, places=0)
+        square = Fence(key='p', kind='yard', name='p', lat=0.0, lng=0.0,
+                       polygon=((-0.001, -0.001), (-0.001, 0.001), (0.001, 0.001), (0.001, -0.001)))
+        self.assertEqual(square.distance(0.0005, 0.0), 0.0)
+        self.assertAlmostEqual(square.distance(0.002, 0.0), 111.2, places=0)
@@ -0,0 +1,115 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from logbook.hos import DRIVING, ON_DUTY, DutyTimeline, evaluate
+from logbook.models import Trip
+from logbook.reports import build_report
+
+H = 3600
+
+
+def timeline(*intervals):
+    return DutyTimeline.from_intervals(intervals)
+
+
+def rules(violations):
+    return [(v.rule, v.hours) for v in violations]
+
+
+class HOSRulesTest(SimpleTestCase):
+    def test_flatten_splits_driving_at_on_duty_stops(self):
+        flat = timeline((0, 10 * H, DRIVING), (2 * H, 2 * H + 900, ON_DUTY), (-H, 0, ON_DUTY))
+        self.assertEqual(list(flat.starts), [-H, 0, 2 * H, 2 * H + 900])
+        self.assertEqual(list(flat.codes), [ON_DUTY, DRIVING, ON_DUTY, DRIVING])
+
+    def test_driving_limit_and_break(self):
+        self.assertEqual(rules(evaluate(timeline((0, 12 * H, DRIVING)))), [
+            ('break_30', Decimal('4.00')), ('driving_11', Decimal('1.00')),
+        ])
+        # A 30-minute break satisfies the break rule but not the driving limit.
+        self.assertEqual(rules(evaluate(timeline((0, 8 * H, DRIVING), (8 * H + 1800, 12 * H, DRIVING)))), [
+            ('driving_11', Decimal('0.50')),
+        ])
+
+    def test_window_counts_short_rests(self):
+        # Four hours off does not reset the 14-hour window; ten would.
+        short = timeline((0, H, ON_DUTY), (H, 5 * H, DRIVING), (9 * H, 15 * H, DRIVING))
+        self.assertEqual(rules(evaluate(short)), [('window_14', Decimal('1.00'))])
+        rested = timeline((0, H, ON_DUTY), (H, 5 * H, DRIVING), (15 * H, 21 * H, DRIVING))
+        self.assertEqual(evaluate(rested), [])
+
+    def _days(self, count, first=0):
+        day = 24 * H
+        intervals = []
+        for d in range(first, first + count):
+            intervals += [(d * day, d * day + 5 * H, DRIVING), (d * day + 5 * H + 1800, d * day + 10 * H + 1800, DRIVING)]
+        return intervals
+
+    def test_cycle_limit_and_restart(self):
+        violations = evaluate(timeline(*self._days(8)))
+        self.assertEqual(rules(violations), [('cycle_70', Decimal('10.00'))])
+        self.assertEqual(violations[0].start, datetime(1970, 1, 8, tzinfo=dt_timezone.utc))
+
+        # 34 hours off after day 4 restarts the cycle.
+        restarted = self._days(4) + [
+            (s + 34 * H, e + 34 * H, code) for s, e, code in self._days(4, first=4)
+        ]
+        self.assertEqual(evaluate(timeline(*restarted)), [])
+
+    def test_range_filter(self):
+        violations = evaluate(
+            timeline(*self._days(8)),
+            since=datetime(1970, 1, 1, tzinfo=dt_timezone.utc),
+            until=datetime(1970, 1, 7, tzinfo=dt_timezone.utc),
+        )
+        self.assertEqual(violations, [])
+
+
+class HOSIntegrationTest(TestCase):
+    def setUp(self):
+        self.driver = get_user_model().objects.create_user(username='hos', password='testpass', license_number='H1')
+        self.start = datetime(2025, 6, 2, 6, tzinfo=dt_timezone.utc)
+
+    def test_completing_a_long_trip_reports_violations(self):
+        trip = Trip.objects.create(
+            driver=self.driver, vehicle_id='T', origin='A', destination='B',
+            distance=Decimal('700.00'), start_time=self.start, status='in_progress',
+        )
+        trip.end_time = self.start + timedelta(hours=12)
+        trip.status = 'completed'
+        warnings = trip.compliance_warnings()
+        self.assertEqual(len(warnings), 2)
+        self.assertIn('30-minute break', warnings[0])
+        self.assertIn('11-hour driving limit', warnings[1])
+        self.assertEqual(trip.validate_compliance(), [])
+
+        trip.end_time = self.start + timedelta(hours=7)
+        self.assertEqual(trip.compliance_warnings(), [])
+
+    def test_violations_do_not_block_completion(self):
+        trip = Trip.objects.create(
+            driver=self.driver, vehicle_id='T', origin='A', destination='B',
+            distance=Decimal('700.00'), start_time=timezone.now() - timedelta(hours=12), status='in_progress',
+        )
+        client = APIClient()
+        client.force_authenticate(user=self.driver)
+        resp = client.post(f'/api/trips/{trip.pk}/complete/')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()['status'], 'completed')
+        self.assertEqual(resp.json()['compliance_errors'], [])
+        self.assertEqual(len(resp.json()['compliance_warnings']), 2)
+
+    def test_report_lists_violations_in_range(self):
+        Trip.objects.create(
+            driver=self.driver, vehicle_id='T', origin='A', destination='B',
+            distance=Decimal('700.00'), start_time=self.start,
+            end_time=self.start + timedelta(hours=14), status='completed',
+        )
+        report = build_report(self.driver.pk, '2025-06-01', '2025-06-30')
+        self.assertEqual([v['rule'] for v in report['hos_violations']], ['break_30', 'driving_11', 'window_14'])
+        self.assertEqual(build_report(self.driver.pk, '2025-06-03', '2025-06-30')['hos_violations'], [])
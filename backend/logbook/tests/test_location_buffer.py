@@ -0,0 +1,173 @@
+import threading
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from logbook.location_buffer import LocalLocationBuffer, location_row
+from logbook.models import LocationUpdate, Trip
+from logbook.ratelimit import LocalRateLimiter
+
+
+class LocalLocationBufferTest(TestCase):
+    def setUp(self):
+        self.driver = get_user_model().objects.create_user(username='buf', password='testpass', license_number='LB1')
+        self.trip = Trip.objects.create(
+            driver=self.driver, vehicle_id='T1', origin='A', destination='B', distance=1.0,
+            start_time='2025-10-15T00:00:00Z', status='in_progress',
+        )
+
+    def _rows(self, sequences):
+        return [
+            location_row(LocationUpdate(
+                trip=self.trip, driver=self.driver, sequence=seq, lat=1.0, lng=2.0, recorded_at=timezone.now(),
+            ))
+            for seq in sequences
+        ]
+
+    def test_flushes_on_size_threshold(self):
+        buffer = LocalLocationBuffer(max_rows=10, flush_seconds=0)
+        buffer.add(self._rows(range(9)))
+        self.assertEqual(LocationUpdate.objects.count(), 0)
+        self.assertEqual(buffer.metrics()['depth'], 9)
+
+        buffer.add(self._rows(range(9, 12)))
+        self.assertEqual(LocationUpdate.objects.count(), 12)
+        metrics = buffer.metrics()
+        self.assertEqual((metrics['depth'], metrics['flushes'], metrics['flushed_rows']), (0, 1, 12))
+        self.assertGreater(metrics['max_flush_ms'], 0)
+
+    def test_duplicate_sequences_are_written_once(self):
+        buffer = LocalLocationBuffer(max_rows=100, flush_seconds=0)
+        buffer.add(self._rows([1, 2]))
+        buffer.add(self._rows([2, 3]))
+        buffer.flush()
+        self.assertEqual(sorted(LocationUpdate.objects.values_list('sequence', flat=True)), [1, 2, 3])
+
+    def test_claims_last_until_the_flush(self):
+        buffer = LocalLocationBuffer(max_rows=100, flush_seconds=0)
+        self.assertEqual(buffer.claim(self.trip.pk, [1, 2, None]), {1, 2})
+        self.assertEqual(buffer.claim(self.trip.pk, [2, 3]), {3})
+        buffer.release(self.trip.pk, [3])
+        buffer.add(self._rows([1, 2]), claimed=True)
+        self.assertEqual(buffer.claim(self.trip.pk, [1, 2, 3]), {3})
+        buffer.flush()
+        self.assertEqual(buffer.claim(self.trip.pk, [1, 2]), {1, 2})
+
+    def test_failed_flush_keeps_rows(self):
+        buffer = LocalLocationBuffer(max_rows=100, flush_seconds=0)
+        buffer.add(self._rows(range(5)))
+        with mock.patch.object(LocationUpdate.objects, 'bulk_create', side_effect=RuntimeError('db down')), \
+                self.assertLogs('logbook.location_buffer', 'ERROR'):
+            self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(buffer.metrics()['failed_flushes'], 1)
+        self.assertEqual(buffer.depth(), 5)
+        self.assertEqual(buffer.flush(), 5)
+
+    def test_rejected_rows_are_quarantined_without_blocking_the_rest(self):
+        buffer = LocalLocationBuffer(max_rows=100, flush_seconds=0)
+        rows = self._rows(range(5))
+        # A row that can never be inserted, like a NaN coordinate on MySQL.
+        rows[1]['recorded_at'] = '2025-02-30T00:00:00+00:00'
+        buffer.add(rows)
+        with self.assertLogs('logbook.location_buffer', 'ERROR'):
+            self.assertEqual(buffer.flush(), 4)
+        self.assertEqual(sorted(LocationUpdate.objects.values_list('sequence', flat=True)), [0, 2, 3, 4])
+        self.assertEqual([row['sequence'] for row in buffer.quarantined()], [1])
+        metrics = buffer.metrics()
+        self.assertEqual((metrics['depth'], metrics['quarantined_rows'], metrics['failed_flushes']), (0, 1, 0))
+
+        buffer.add(self._rows([5]))
+        self.assertEqual(buffer.flush(), 1)
+
+    def test_close_drains_the_buffer(self):
+        buffer = LocalLocationBuffer(max_rows=100, flush_seconds=0)
+        buffer.add(self._rows(range(7)))
+        buffer.close()
+        self.assertEqual(LocationUpdate.objects.count(), 7)
+
+    def test_background_thread_flushes_on_time_threshold(self):
+        buffer = LocalLocationBuffer(max_rows=100, flush_seconds=0.05)
+        flushed = threading.Event()
+        with mock.patch.object(buffer, 'flush', side_effect=lambda: flushed.set()):
+            buffer.add(self._rows([1]))
+            self.assertTrue(flushed.wait(2))
+        buffer._stopping = True
+        buffer._wakeup.set()
+        buffer._thread.join(2)
+
+    def test_metrics_endpoint_is_admin_only(self):
+        client = APIClient()
+        client.force_authenticate(user=self.driver)
+        self.assertEqual(client.get('/api/metrics/location-buffer/').status_code, 403)
+        admin = get_user_model().objects.create_user(
+            username='boss', password='testpass', license_number='LB2', is_admin=True
+        )
+        client.force_authenticate(user=admin)
+        resp = client.get('/api/metrics/location-buffer/')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()['backend'], 'local')
+
+
+class BufferedIngestionTest(TestCase):
+    """Retries that arrive while the first copy still waits in the buffer."""
+
+    def setUp(self):
+        self.driver = get_user_model().objects.create_user(username='bufi', password='testpass', license_number='LB3')
+        self.trip = Trip.objects.create(
+            driver=self.driver, vehicle_id='T1', origin='A', destination='B', distance=1.0,
+            start_time='2025-10-15T00:00:00Z', status='in_progress',
+        )
+        self.buffer = LocalLocationBuffer(max_rows=1000, flush_seconds=60)
+        patcher = mock.patch('logbook.location_buffer._buffer', self.buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self._stop_flusher)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.driver)
+
+    def _stop_flusher(self):
+        self.buffer._stopping = True
+        self.buffer._wakeup.set()
+        if self.buffer._thread is not None:
+            self.buffer._thread.join(2)
+
+    def _post(self, sequences):
+        with mock.patch('logbook.broadcaster.get_channel_layer') as layer:
+            layer.return_value.group_send = mock.AsyncMock()
+            resp = self.client.post(f'/api/trips/{self.trip.pk}/locations/batch/', {'points': [
+                {'sequence': seq, 'lat': 1.0 + seq / 1000, 'lng': 2.0, 'recorded_at': f'2025-10-15T12:{seq:02d}:00Z'}
+                for seq in sequences
+            ]}, format='json')
+        return resp.json(), layer.return_value.group_send.call_count
+
+    def test_retry_before_the_flush_is_a_duplicate(self):
+        first, sent = self._post([1, 2, 3])
+        self.assertEqual((first['accepted'], sent), ([1, 2, 3], 2))
+        self.assertEqual(LocationUpdate.objects.count(), 0)
+
+        retry, sent = self._post([1, 2, 3, 4])
+        self.assertEqual((retry['accepted'], retry['duplicates']), ([4], [1, 2, 3]))
+        self.assertEqual(self.buffer.depth(), 4)
+
+        self.assertEqual(self.buffer.flush(), 4)
+        self.assertEqual(sorted(LocationUpdate.objects.values_list('sequence', flat=True)), [1, 2, 3, 4])
+        retry, sent = self._post([3, 4])
+        self.assertEqual((retry['accepted'], retry['duplicates'], sent), ([], [3, 4], 0))
+        self.assertEqual(self.buffer._claimed, {})
+
+    def test_failed_ingestion_gives_the_sequences_back(self):
+        with mock.patch.object(self.buffer, '_push', side_effect=RuntimeError('down')), \
+                self.assertRaises(RuntimeError):
+            self._post([1, 2])
+        self.assertEqual(self._post([1, 2])[0]['accepted'], [1, 2])
+
+    @mock.patch('logbook.ratelimit.get_rate_limiter', return_value=LocalRateLimiter())
+    def test_single_fixes_are_echoed_without_row_fields(self, limiter):
+        resp = self.client.post(f'/api/trips/{self.trip.pk}/location/', {'lat': 1.0, 'lng': 2.0}, format='json')
+        self.assertEqual(resp.status_code, 201)
+        self.assertNotIn('id', resp.json())
+        self.assertEqual((resp.json()['trip'], resp.json()['lat']), (self.trip.pk, 1.0))
+        self.assertEqual(self.buffer.depth(), 1)
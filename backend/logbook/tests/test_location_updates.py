@@ -1,9 +1,13 @@
+from unittest import mock
+
+from django.db import connection
 from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework.test import APIClient
 from django.contrib.auth import get_user_model
 
-from logbook.models import Trip
+from logbook.models import LocationUpdate, Trip
 
 
 @override_settings(DATABASES={
@@ -41,3 +45,117 @@ class LocationUpdateAPITest(TestCase):
 
         resp = self.client.post(url, data=payload, format='json')
         self.assertIn(resp.status_code, (200, 201), msg=f'Response: {resp.status_code} {resp.content}')
+
+
+class LocationBatchAPITest(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username='batcher', password='testpass', license_number='B1')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.trip = Trip.objects.create(
+            driver=self.user, vehicle_id='T1', origin='Start', destination='End', distance=1.0,
+            start_time='2025-10-15T00:00:00Z', status='in_progress',
+            destination_lat=10.0, destination_lng=20.0,
+        )
+        self.url = f'/api/trips/{self.trip.pk}/locations/batch/'
+
+    def _points(self, sequences, minute=lambda seq: seq):
+        return [
+            {'sequence': seq, 'lat': 1.0 + seq / 1000, 'lng': 2.0, 'speed': 12.5,
+             'recorded_at': f'2025-10-15T12:{minute(seq):02d}:00Z'}
+            for seq in sequences
+        ]
+
+    def _post(self, points):
+        """The response and the messages sent to the trip group."""
+        with mock.patch('logbook.broadcaster.get_channel_layer') as layer:
+            layer.return_value.group_send = mock.AsyncMock()
+            resp = self.client.post(self.url, {'points': points}, format='json')
+        return resp, [
+            call.args[1] for call in layer.return_value.group_send.call_args_list
+            if call.args[0] == f'trip_{self.trip.pk}'
+        ]
+
+    def test_retries_are_deduplicated(self):
+        resp, _ = self._post(self._points(range(5)))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()['accepted'], [0, 1, 2, 3, 4])
+
+        resp, _ = self._post(self._points(range(3, 8)) + self._points([7]))
+        self.assertEqual(resp.json()['accepted'], [5, 6, 7])
+        self.assertEqual(resp.json()['duplicates'], [3, 4, 7])
+        self.assertEqual(LocationUpdate.objects.filter(trip=self.trip).count(), 8)
+
+        resp, sent = self._post(self._points(range(8)))
+        self.assertEqual(resp.json()['accepted'], [])
+        self.assertEqual(sent, [])
+
+    def test_out_of_order_points_are_broadcast_once_in_time_order(self):
+        resp, sent = self._post(self._points([3, 1, 2, 0], minute=lambda seq: 10 - seq))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(sent), 1)
+        message = sent[0]
+        self.assertEqual(message['type'], 'location.batch')
+        self.assertEqual([p['sequence'] for p in message['points']], [3, 2, 1, 0])
+
+    def test_invalid_points_are_rejected_individually(self):
+        points = self._points(range(4))
+        points[1]['lat'] = 123
+        del points[2]['sequence']
+        del points[3]['recorded_at']
+        resp, _ = self._post(points)
+        body = resp.json()
+        self.assertEqual(body['accepted'], [0])
+        self.assertEqual([r['index'] for r in body['rejected']], [1, 2, 3])
+        self.assertIn('recorded_at', body['rejected'][2]['errors'])
+
+    def test_non_finite_and_negative_values_are_rejected(self):
+        points = self._points(range(5))
+        points[1]['lat'] = 'NaN'
+        points[2]['lng'] = 'Infinity'
+        points[3]['speed'] = -1
+        points[4]['accuracy'] = 'nan'
+        resp, _ = self._post(points)
+        body = resp.json()
+        self.assertEqual(body['accepted'], [0])
+        self.assertEqual([r['index'] for r in body['rejected']], [1, 2, 3, 4])
+        # Nothing unusable reached the trip, so later batches still go through.
+        resp, _ = self._post(self._points([5]))
+        self.assertEqual((resp.status_code, resp.json()['accepted']), (200, [5]))
+
+    @mock.patch('logbook.views.check_rate_limit', return_value=None)
+    def test_single_fix_rejects_non_finite_values(self, limited):
+        url = f'/api/trips/{self.trip.pk}/location/'
+        for field, value in (('lat', 'NaN'), ('lng', '-inf'), ('speed', 'nan'), ('accuracy', -3)):
+            resp = self.client.post(url, dict({'lat': 1.0, 'lng': 2.0}, **{field: value}), format='json')
+            self.assertEqual(resp.status_code, 400, field)
+            self.assertIn(field, resp.json()['detail'])
+        self.assertEqual(self.client.post(url, {'lat': 1.0, 'lng': 2.0}, format='json').status_code, 201)
+
+    def test_single_insert_regardless_of_batch_size(self):
+        def count(sequences):
+            with CaptureQueriesContext(connection) as ctx:
+                self._post(self._points(sequences, minute=lambda seq: seq % 60))
+            return len(ctx.captured_queries)
+        # The trip's first fix also creates its motion totals (logbook.motion).
+        count([1000])
+        # Kept under SQLite's 999-parameter limit, where bulk_create would split.
+        self.assertEqual(count(range(0, 5)), count(range(5, 95)))
+
+    def test_arrival_completes_trip(self):
+        resp, sent = self._post([
+            {'sequence': 1, 'lat': 10.0, 'lng': 20.0, 'recorded_at': '2025-10-15T12:00:00Z'},
+            {'sequence': 2, 'lat': 10.0001, 'lng': 20.0, 'recorded_at': '2025-10-15T12:01:00Z'},
+        ])
+        self.assertTrue(resp.json()['arrived'])
+        self.assertEqual([e['event'] for e in resp.json()['events']], ['enter', 'dwell'])
+        self.trip.refresh_from_db()
+        self.assertEqual(self.trip.status, 'completed')
+        self.assertTrue(sent[-1]['arrived'])
+
+    def test_other_drivers_are_forbidden(self):
+        other = get_user_model().objects.create_user(username='other', password='testpass', license_number='B2')
+        self.client.force_authenticate(user=other)
+        resp = self.client.post(self.url, {'points': self._points([1])}, format='json')
+        self.assertIn(resp.status_code, (403, 404))
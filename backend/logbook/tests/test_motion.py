@@ -0,0 +1,140 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from logbook.models import Trip, TripMotion
+from logbook.location_buffer import LocalLocationBuffer
+from logbook.motion import accumulate, fold_late, path_distances
+from logbook.reports import build_report
+
+START = datetime(2025, 6, 2, 8, 0, tzinfo=dt_timezone.utc)
+# Metres per degree of latitude on the haversine sphere.
+DEGREE = 111194.93
+
+
+def drive():
+    """10 minutes north at 20 m/s, 8 minutes parked with jitter, 5 more minutes north."""
+    fixes, lat, clock = [], 40.0, START
+    for _ in range(60):
+        fixes.append((clock, lat, -90.0, 20.0))
+        clock, lat = clock + timedelta(seconds=10), lat + 200 / DEGREE
+    for i in range(48):
+        fixes.append((clock, lat + (i % 3) * 0.00002, -90.0, 0.3))
+        clock += timedelta(seconds=10)
+    for _ in range(30):
+        fixes.append((clock, lat, -90.0, 20.0))
+        clock, lat = clock + timedelta(seconds=10), lat + 200 / DEGREE
+    return fixes
+
+
+class PathDistancesTest(TestCase):
+    def test_haversine(self):
+        distances = path_distances([0.0, 1.0, 1.0], [0.0, 0.0, 1.0])
+        self.assertAlmostEqual(distances[0], DEGREE, delta=1)
+        self.assertAlmostEqual(distances[1], DEGREE * 0.99985, delta=1)
+        self.assertEqual(path_distances([1.0], [2.0]), [])
+
+
+class AccumulateTest(TestCase):
+    def test_drive_stop_drive(self):
+        motion = accumulate(TripMotion(), drive())
+        self.assertEqual(motion.point_count, 138)
+        # 88 moving segments of 200 m plus the ~2 m pull-out. The leg into the
+        # parking spot reports the parked speed and the jitter adds nothing.
+        self.assertAlmostEqual(motion.distance, 88 * 200 + 2, delta=3)
+        self.assertEqual(motion.moving_seconds, 890)
+        self.assertEqual(motion.idle_seconds, 480)
+        self.assertEqual(motion.stop_count, 1)
+        self.assertEqual(motion.max_speed, 20.0)
+        self.assertAlmostEqual(motion.average_speed, motion.distance / 890, delta=0.01)
+
+    def test_batches_add_up_to_the_whole_track(self):
+        fixes = drive()
+        whole = accumulate(TripMotion(), fixes)
+        streamed = TripMotion()
+        for start in range(0, len(fixes), 7):
+            accumulate(streamed, fixes[start:start + 7])
+        for field in ('point_count', 'moving_seconds', 'idle_seconds', 'stop_count', 'max_speed'):
+            self.assertEqual(getattr(streamed, field), getattr(whole, field), field)
+        self.assertAlmostEqual(streamed.distance, whole.distance, places=6)
+
+    def test_late_fixes_are_skipped(self):
+        fixes = drive()
+        motion = accumulate(TripMotion(), fixes[:20])
+        before = (motion.distance, motion.moving_seconds, motion.point_count)
+        accumulate(motion, fixes[5:10])
+        self.assertEqual((motion.distance, motion.moving_seconds, motion.point_count), before)
+
+    def test_late_fixes_fill_their_gap(self):
+        fixes = drive()
+        whole = accumulate(TripMotion(), fixes)
+        # Two outages: one while driving, one running into the stop.
+        known = fixes[:10] + fixes[30:40] + fixes[80:]
+        motion = accumulate(TripMotion(), known)
+        fold_late(motion, fixes[10:30] + fixes[40:80], known)
+        for field in ('point_count', 'moving_seconds', 'idle_seconds', 'stop_count', 'max_speed'):
+            self.assertEqual(getattr(motion, field), getattr(whole, field), field)
+        self.assertAlmostEqual(motion.distance, whole.distance, places=6)
+
+    def test_speed_is_derived_when_not_reported(self):
+        fixes = [(time, lat, lng, None) for time, lat, lng, _ in drive()[:3]]
+        motion = accumulate(TripMotion(), fixes)
+        self.assertAlmostEqual(motion.max_speed, 20.0, delta=0.01)
+        self.assertEqual(motion.moving_seconds, 20)
+
+
+class MotionIngestionTest(TestCase):
+    def setUp(self):
+        self.driver = get_user_model().objects.create_user(username='mot', password='testpass', license_number='M1')
+        self.trip = Trip.objects.create(
+            driver=self.driver, vehicle_id='T1', origin='A', destination='B', distance=Decimal('12.00'),
+            start_time=START, end_time=START + timedelta(hours=1), status='in_progress',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.driver)
+
+    def test_batches_update_trip_and_report(self):
+        self.assertIsNone(self.client.get(f'/api/trips/{self.trip.pk}/').json()['motion'])
+        fixes = drive()
+        for start in range(0, len(fixes), 50):
+            self._post(fixes, start, start + 50)
+
+        self._assert_whole_drive()
+
+        Trip.objects.filter(pk=self.trip.pk).update(status='completed')
+        report = build_report(self.driver.pk, START.date(), START.date())
+        self.assertEqual(report['gps_miles'], Decimal('10.94'))
+        self.assertEqual(report['total_miles'], Decimal('12.00'))
+
+    def _post(self, fixes, start, end):
+        self.client.post(f'/api/trips/{self.trip.pk}/locations/batch/', {'points': [
+            {'sequence': i, 'lat': lat, 'lng': lng, 'speed': speed, 'recorded_at': time.isoformat()}
+            for i, (time, lat, lng, speed) in enumerate(fixes[start:end], start)
+        ]}, format='json')
+
+    def _assert_whole_drive(self):
+        motion = self.client.get(f'/api/trips/{self.trip.pk}/').json()['motion']
+        self.assertEqual(motion['point_count'], len(drive()))
+        self.assertEqual(motion['stop_count'], 1)
+        self.assertEqual((motion['moving_seconds'], motion['idle_seconds']), (890, 480))
+        self.assertAlmostEqual(motion['gps_miles'], 10.94, delta=0.01)
+
+    def test_late_backlog_is_folded_in(self):
+        fixes = drive()
+        # The newest fixes arrive first; the offline backlog before them follows.
+        self._post(fixes, 100, len(fixes))
+        self._post(fixes, 0, 100)
+        self._assert_whole_drive()
+
+    def test_backlog_batches_still_in_the_buffer_are_neighbours(self):
+        fixes = drive()
+        with mock.patch('logbook.location_buffer._buffer', LocalLocationBuffer(max_rows=10000, flush_seconds=0)):
+            self._post(fixes, 0, 10)
+            self._post(fixes, 100, len(fixes))
+            for start in range(10, 100, 25):
+                self._post(fixes, start, min(start + 25, 100))
+            self._assert_whole_drive()
@@ -0,0 +1,130 @@
+from datetime import date, datetime, timezone as dt_timezone
+from io import StringIO
+import json
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from logbook.location_archive import decode_block, encode_block, month_path, read_archive, restore_range
+from logbook.models import LocationUpdate, Trip, TripTrack
+from logbook.partitions import apply_retention, expired_months, purge_month_sql, purge_restored, split_future_sql
+from logbook.track_archive import archived_sequences
+
+TODAY = date(2025, 10, 15)
+
+
+def at(month, day, hour=12):
+    return datetime(2025, month, day, hour, tzinfo=dt_timezone.utc)
+
+
+class RetentionTest(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        override = override_settings(LOCATION_ARCHIVE_ROOT=self.root, LOCATION_RETENTION_DAYS=90)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.driver = get_user_model().objects.create_user(username='ret', password='testpass', license_number='R1')
+        self.trip = Trip.objects.create(
+            driver=self.driver, vehicle_id='T', origin='A', destination='B', distance=1.0,
+            start_time=at(5, 1), status='in_progress',
+        )
+        # May and June are past retention on 2025-10-15, September is not.
+        for month, days in ((5, (3, 4)), (6, (10,)), (9, (20,))):
+            for day in days:
+                LocationUpdate.objects.create(
+                    trip=self.trip, driver=self.driver, lat=41.5 + day / 100, lng=-93.25, speed=12.5,
+                    accuracy=None, sequence=month * 100 + day, recorded_at=at(month, day),
+                )
+
+    def test_expired_months(self):
+        self.assertEqual(expired_months(today=TODAY), [date(2025, 5, 1), date(2025, 6, 1)])
+
+    def test_old_months_are_archived_and_purged(self):
+        results = apply_retention(today=TODAY)
+        self.assertEqual([(month, manifest['rows']) for month, manifest in results],
+                         [(date(2025, 5, 1), 2), (date(2025, 6, 1), 1)])
+        self.assertEqual(list(LocationUpdate.objects.values_list('sequence', flat=True)), [920])
+
+        rows = list(read_archive(month_path(date(2025, 5, 1))))
+        self.assertEqual([row[9] for row in rows], [503, 504])
+        self.assertEqual(rows[0][3], at(5, 3))
+        self.assertAlmostEqual(rows[0][5], 41.53)
+        self.assertIsNone(rows[0][8])
+        manifest = json.loads(month_path(date(2025, 5, 1)).with_suffix('.json').read_text())
+        self.assertEqual(manifest['rows'], 2)
+
+    def test_completed_trips_are_packed_before_the_purge(self):
+        done = Trip.objects.create(
+            driver=self.driver, vehicle_id='T', origin='A', destination='B', distance=1.0,
+            start_time=at(5, 5), status='completed',
+        )
+        for day in (5, 6):
+            LocationUpdate.objects.create(
+                trip=done, driver=self.driver, lat=40.0, lng=-93.0, sequence=day, recorded_at=at(5, day),
+            )
+        results = apply_retention(today=TODAY)
+        self.assertEqual(results[0][1]['rows'], 2)
+        track = TripTrack.objects.get(trip=done)
+        self.assertEqual(track.point_count, 2)
+        self.assertEqual(archived_sequences(done), {5, 6})
+        self.assertFalse(LocationUpdate.objects.filter(trip=done).exists())
+
+    def test_restore_and_purge_restored(self):
+        ids = set(LocationUpdate.objects.filter(recorded_at__lt=at(7, 1)).values_list('id', flat=True))
+        apply_retention(today=TODAY)
+
+        restored = restore_range(at(5, 1, 0), at(7, 1, 0))
+        self.assertEqual(restored, 3)
+        self.assertEqual(set(LocationUpdate.objects.filter(recorded_at__lt=at(7, 1)).values_list('id', flat=True)), ids)
+        self.assertEqual(restore_range(at(5, 1, 0), at(7, 1, 0)), 0)
+
+        # Restored months are not archived a second time.
+        self.assertEqual(apply_retention(today=TODAY), [])
+        self.assertEqual(purge_restored(), 3)
+        self.assertEqual(LocationUpdate.objects.count(), 1)
+
+    def test_tampered_archive_is_not_restored(self):
+        apply_retention(today=TODAY)
+        with open(month_path(date(2025, 6, 1)), 'ab') as handle:
+            handle.write(b'x')
+        with self.assertRaises(ValueError):
+            restore_range(at(6, 1, 0), at(7, 1, 0))
+
+    def test_command(self):
+        out = StringIO()
+        call_command('location_retention', '--dry-run', '--days', '30', stdout=out)
+        self.assertIn('would archive 2025-05', out.getvalue())
+        self.assertEqual(LocationUpdate.objects.count(), 4)
+
+        call_command('location_retention', '--days', '30', stdout=out)
+        call_command('location_retention', '--restore', '2025-06-01', '2025-06-30', stdout=out)
+        self.assertIn('restored 1 location updates', out.getvalue())
+
+
+class ArchiveFormatTest(TestCase):
+    def test_block_round_trip(self):
+        rows = [
+            (10, 3, 7, at(5, 1), at(5, 1, 13), 41.123456, -93.5, 25.5, 4.0, 1),
+            (12, 3, 7, at(5, 2), at(5, 2, 13), 41.123457, -93.4, None, None, None),
+            (11, 4, 7, at(5, 3), at(5, 3, 13), -12.0, 170.0, 0.0, 100.0, 9),
+        ]
+        self.assertEqual(decode_block(encode_block(rows)), rows)
+
+
+class MySQLStatementsTest(TestCase):
+    def test_partition_maintenance_sql(self):
+        self.assertEqual(
+            split_future_sql(date(2025, 12, 1)),
+            "ALTER TABLE location_updates REORGANIZE PARTITION p_future INTO ("
+            "PARTITION p202512 VALUES LESS THAN ('2026-01-01'), PARTITION p_future VALUES LESS THAN (MAXVALUE))",
+        )
+        self.assertEqual(purge_month_sql(date(2025, 5, 1)), [
+            "ALTER TABLE location_updates TRUNCATE PARTITION p202505",
+            "ALTER TABLE location_updates REORGANIZE PARTITION p_restored, p202505 INTO ("
+            "PARTITION p_restored VALUES LESS THAN ('2025-06-01'))",
+        ])
@@ -0,0 +1,99 @@
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from logbook.models import LocationUpdate, Trip
+from logbook.positions import LocalPositionStore
+
+
+def point(sequence, minute=0):
+    return {'sequence': sequence, 'lat': 1.0, 'lng': 2.0, 'accuracy': None, 'speed': None,
+            'recorded_at': f'2025-10-15T12:{minute:02d}:00+00:00'}
+
+
+class LocalPositionStoreTest(TestCase):
+    def setUp(self):
+        self.driver = get_user_model().objects.create_user(username='pos', password='testpass', license_number='P1')
+        self.trip = Trip.objects.create(
+            driver=self.driver, vehicle_id='T1', origin='A', destination='B', distance=1.0,
+            start_time='2025-10-15T00:00:00Z', status='in_progress',
+        )
+
+    def test_keeps_the_newest_points(self):
+        store = LocalPositionStore(points=3)
+        store.record(self.trip, [point(1), point(2)])
+        store.record(self.trip, [point(3), point(4)])
+        with self.assertNumQueries(0):
+            self.assertEqual([p['sequence'] for p in store.snapshot(self.trip.pk)], [2, 3, 4])
+            self.assertEqual([p['sequence'] for p in store.snapshot(str(self.trip.pk), since=3)], [4])
+        self.assertEqual(store.driver_position(self.driver.pk)['sequence'], 4)
+        self.assertEqual(store.driver_position(self.driver.pk)['trip_id'], self.trip.pk)
+
+    def test_unknown_trips_are_loaded_once(self):
+        store = LocalPositionStore(points=2)
+        LocationUpdate.objects.create(trip=self.trip, driver=self.driver, lat=1.0, lng=2.0, sequence=9,
+                                      recorded_at='2025-10-15T12:00:00Z')
+        with self.assertNumQueries(1):
+            self.assertEqual([p['sequence'] for p in store.snapshot(self.trip.pk)], [9])
+            store.snapshot(self.trip.pk)
+        self.assertEqual(store.driver_position(self.driver.pk)['sequence'], 9)
+
+    def test_trips_without_fixes_are_remembered_as_empty(self):
+        store = LocalPositionStore()
+        with self.assertNumQueries(1):
+            self.assertEqual(store.snapshot(self.trip.pk), [])
+            self.assertEqual(store.snapshot(self.trip.pk), [])
+        self.assertEqual(store.snapshot('not-a-trip'), [])
+
+    def test_local_entries_expire(self):
+        # Fixes ingested by other processes only show up once the entry expires.
+        store = LocalPositionStore(local_ttl=5)
+        self.assertEqual(store.snapshot(self.trip.pk), [])
+        LocationUpdate.objects.create(trip=self.trip, driver=self.driver, lat=1.0, lng=2.0, sequence=9,
+                                      recorded_at='2025-10-15T12:00:00Z')
+        self.assertEqual(store.snapshot(self.trip.pk), [])
+        with mock.patch('logbook.positions.time.monotonic', return_value=time.monotonic() + 6):
+            self.assertEqual([p['sequence'] for p in store.snapshot(self.trip.pk)], [9])
+
+    def test_least_recently_used_trips_are_evicted(self):
+        store = LocalPositionStore(max_trips=2)
+        store.record(self.trip, [point(1)])
+        for trip_id in (1001, 1002):
+            store.record(mock.Mock(id=trip_id, driver_id=trip_id), [point(1)])
+        self.assertIsNone(store._trip_points(self.trip.pk))
+        self.assertIsNotNone(store._trip_points(1002))
+
+
+class PositionIngestionTest(TestCase):
+    def setUp(self):
+        self.driver = get_user_model().objects.create_user(username='posi', password='testpass', license_number='P2')
+        self.trip = Trip.objects.create(
+            driver=self.driver, vehicle_id='T1', origin='A', destination='B', distance=1.0,
+            start_time='2025-10-15T00:00:00Z', status='in_progress',
+        )
+        self.store = LocalPositionStore()
+        patcher = mock.patch('logbook.positions._store', self.store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.driver)
+
+    def test_batches_are_recorded_and_served_per_driver(self):
+        self.client.post(f'/api/trips/{self.trip.pk}/locations/batch/', {'points': [
+            {'sequence': 2, 'lat': 1.1, 'lng': 2.0, 'recorded_at': '2025-10-15T12:01:00Z'},
+            {'sequence': 1, 'lat': 1.0, 'lng': 2.0, 'recorded_at': '2025-10-15T12:00:00Z'},
+        ]}, format='json')
+        self.assertEqual([p['sequence'] for p in self.store.snapshot(self.trip.pk)], [1, 2])
+
+        resp = self.client.get(f'/api/drivers/{self.driver.pk}/position/')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual((resp.json()['lat'], resp.json()['trip_id']), (1.1, self.trip.pk))
+
+    def test_position_falls_back_to_stored_fixes(self):
+        self.assertEqual(self.client.get(f'/api/drivers/{self.driver.pk}/position/').status_code, 404)
+        LocationUpdate.objects.create(trip=self.trip, driver=self.driver, lat=5.0, lng=6.0,
+                                      recorded_at='2025-10-15T12:00:00Z')
+        self.assertEqual(self.client.get(f'/api/drivers/{self.driver.pk}/position/').json()['lat'], 5.0)
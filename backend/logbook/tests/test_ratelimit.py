@@ -0,0 +1,87 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from logbook.models import Trip
+from logbook.ratelimit import LocalRateLimiter, Policy, get_policy
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class LocalRateLimiterTest(TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.limiter = LocalRateLimiter(max_keys=3, clock=self.clock)
+        self.policy = Policy(name='test', rate=5, period=10, burst=5)
+
+    def test_burst_then_refill(self):
+        results = [self.limiter.hit(self.policy, 'ip') for _ in range(6)]
+        self.assertEqual([r.allowed for r in results], [True] * 5 + [False])
+        self.assertAlmostEqual(results[-1].retry_after, 2.0)
+
+        self.clock.now += 2
+        self.assertTrue(self.limiter.hit(self.policy, 'ip').allowed)
+        self.assertFalse(self.limiter.hit(self.policy, 'ip').allowed)
+
+    def test_keys_are_independent(self):
+        for _ in range(5):
+            self.limiter.hit(self.policy, 'a')
+        self.assertFalse(self.limiter.hit(self.policy, 'a').allowed)
+        self.assertTrue(self.limiter.hit(self.policy, 'b').allowed)
+
+    def test_memory_is_bounded(self):
+        for key in range(100):
+            self.limiter.hit(self.policy, key)
+        self.assertEqual(len(self.limiter), 3)
+
+    @override_settings(RATE_LIMITS={'address_search': {'rate': 2, 'period': 60}})
+    def test_settings_override_defaults(self):
+        policy = get_policy('address_search')
+        self.assertEqual((policy.rate, policy.period, policy.burst), (2, 60, 2))
+        with self.assertRaises(KeyError):
+            get_policy('missing')
+
+
+class RateLimitedViewsTest(TestCase):
+    def setUp(self):
+        self.limiter = LocalRateLimiter()
+        patcher = mock.patch('logbook.ratelimit.get_rate_limiter', return_value=self.limiter)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+
+    def test_address_search_is_limited_per_ip(self):
+        cache.set('places:denver', [{'label': 'Denver'}], 60)
+        url = reverse('api-search-address')
+        for _ in range(5):
+            self.assertEqual(self.client.get(url, {'q': 'denver'}).status_code, 200)
+        response = self.client.get(url, {'q': 'denver'})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.json(), {'error': 'rate limit exceeded'})
+        self.assertEqual(response['Retry-After'], '2')
+
+        other = self.client.get(url, {'q': 'denver'}, REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(other.status_code, 200)
+
+    def test_single_location_is_limited_per_driver(self):
+        driver = get_user_model().objects.create_user(username='rl', password='testpass', license_number='RL1')
+        trip = Trip.objects.create(
+            driver=driver, vehicle_id='T1', origin='A', destination='B', distance=1.0,
+            start_time='2025-10-15T00:00:00Z', status='in_progress',
+        )
+        self.client.force_authenticate(user=driver)
+        url = f'/api/trips/{trip.pk}/location/'
+        self.assertEqual(self.client.post(url, {'lat': 1.0, 'lng': 2.0}, format='json').status_code, 201)
+        response = self.client.post(url, {'lat': 1.0, 'lng': 2.0}, format='json')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1')
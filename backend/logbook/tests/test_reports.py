@@ -0,0 +1,112 @@
+import random
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db.models import Sum
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from logbook.models import ComplianceReport, FuelLog, Trip
+from logbook.reports import build_report
+
+
+def legacy_report(driver, date_start, date_end):
+    """The per-pair query implementation ComplianceReportViewSet.generate used to run."""
+    trips = Trip.objects.filter(
+        driver=driver,
+        status='completed',
+        start_time__date__gte=date_start,
+        start_time__date__lte=date_end
+    )
+    total_hours = sum(trip.total_trip_hours for trip in trips)
+    total_miles = trips.aggregate(total=Sum('distance'))['total'] or 0
+    fuel_logs = FuelLog.objects.filter(
+        driver=driver,
+        timestamp__date__gte=date_start,
+        timestamp__date__lte=date_end
+    ).order_by('timestamp')
+    refuel_violations = 0
+    for i in range(len(fuel_logs) - 1):
+        miles_between = trips.filter(
+            end_time__gte=fuel_logs[i].timestamp,
+            end_time__lt=fuel_logs[i + 1].timestamp
+        ).aggregate(total=Sum('distance'))['total'] or 0
+        if miles_between > 1000:
+            refuel_violations += 1
+    return {
+        'total_hours': total_hours,
+        'total_miles': total_miles,
+        'trip_count': trips.count(),
+        'limit_exceeded': total_hours > 70,
+        'refuel_violations': refuel_violations,
+    }
+
+
+class ComplianceReportEngineTest(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.driver = User.objects.create_user(username='rep', password='testpass', license_number='R1')
+        self.base = datetime(2025, 3, 1, tzinfo=dt_timezone.utc)
+
+    def _populate(self, seed):
+        rng = random.Random(seed)
+        clock = self.base
+        trips, fuel_logs = [], []
+        for _ in range(60):
+            clock += timedelta(hours=rng.randint(1, 20))
+            duration = timedelta(hours=rng.randint(1, 10))
+            trips.append(Trip(
+                driver=self.driver, vehicle_id='T', origin='A', destination='B',
+                distance=Decimal(rng.randint(50, 700)),
+                start_time=clock, end_time=clock + duration,
+                status=rng.choice(['completed', 'completed', 'completed', 'cancelled']),
+            ))
+            if rng.random() < 0.25:
+                # Some fills land exactly on a trip end to exercise the interval bounds.
+                stamp = clock + duration if rng.random() < 0.3 else clock + timedelta(hours=rng.randint(0, 12))
+                fuel_logs.append(FuelLog(
+                    driver=self.driver, fuel_amount=Decimal('50'), fuel_cost=Decimal('150'),
+                    odometer_reading=Decimal('1000'), location='Stop', timestamp=stamp,
+                ))
+            clock += duration
+        Trip.objects.bulk_create(trips)
+        FuelLog.objects.bulk_create(fuel_logs)
+
+    def test_matches_legacy_engine(self):
+        violations = 0
+        for seed in range(5):
+            Trip.objects.all().delete()
+            FuelLog.objects.all().delete()
+            self._populate(seed)
+            for date_start, date_end in [
+                (date(2025, 3, 1), date(2025, 3, 31)),
+                (date(2025, 3, 5), date(2025, 3, 12)),
+                ('2025-03-10', '2025-04-30'),
+            ]:
+                with self.subTest(seed=seed, start=date_start, end=date_end):
+                    expected = legacy_report(self.driver, date_start, date_end)
+                    report = build_report(self.driver.pk, date_start, date_end)
+                    report.pop('hos_violations')
+                    # No GPS fixes were recorded for these trips.
+                    self.assertEqual(report.pop('gps_miles'), Decimal('0.00'))
+                    self.assertEqual(report, expected)
+                    violations += expected['refuel_violations']
+        # The synthetic data must actually exercise the violation path.
+        self.assertGreater(violations, 0)
+
+    def test_generate_endpoint_uses_fixed_queries_for_data(self):
+        self._populate(42)
+        client = APIClient()
+        client.force_authenticate(user=self.driver)
+        # driver lookup + trips + fuel logs + HOS duty intervals (trips, fuel logs) + insert
+        with self.assertNumQueries(6):
+            resp = client.post('/api/compliance-reports/generate/', {
+                'driver_id': self.driver.pk, 'date_start': '2025-03-01', 'date_end': '2025-03-31',
+            }, format='json')
+        self.assertEqual(resp.status_code, 201)
+        report = ComplianceReport.objects.get()
+        expected = legacy_report(self.driver, '2025-03-01', '2025-03-31')
+        self.assertEqual(report.trip_count, expected['trip_count'])
+        self.assertEqual(report.refuel_violations, expected['refuel_violations'])
+        self.assertEqual(report.total_hours, expected['total_hours'])
@@ -0,0 +1,164 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from logbook.eld import stationary_periods
+from logbook.models import LocationUpdate, TrackCompression, Trip
+from logbook.track import dead_band, simplify, simplify_trip
+
+# About 1 m of latitude.
+METRE = 1 / 111195
+
+
+@override_settings(TRACK_DEADBAND_METERS=10, TRACK_DEADBAND_HEADING_DEGREES=20, TRACK_DEADBAND_SECONDS=60)
+class DeadBandTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.driver = get_user_model().objects.create_user(username='track', password='testpass', license_number='TR1')
+        self.trip = Trip.objects.create(
+            driver=self.driver, vehicle_id='T1', origin='A', destination='B', distance=1.0,
+            start_time='2025-10-15T00:00:00Z', status='in_progress',
+        )
+        self.start = timezone.now().replace(microsecond=0)
+
+    def _fixes(self, coordinates):
+        return [
+            LocationUpdate(trip=self.trip, driver=self.driver, lat=lat, lng=lng,
+                           recorded_at=self.start + timedelta(seconds=second))
+            for second, (lat, lng) in enumerate(coordinates)
+        ]
+
+    def test_parked_truck_stores_one_fix_a_minute(self):
+        jitter = [(40.0 + (i % 3) * 2 * METRE, -105.0) for i in range(300)]
+        kept = dead_band(self.trip.id, self._fixes(jitter))
+        self.assertEqual(len(kept), 5)
+
+    def test_steady_cruise_is_dead_reckoned(self):
+        # 25 m/s due north.
+        cruise = [(40.0 + i * 25 * METRE, -105.0) for i in range(180)]
+        kept = dead_band(self.trip.id, self._fixes(cruise))
+        self.assertLessEqual(len(kept), 5)
+
+    def test_turns_and_stops_are_kept(self):
+        north = [(40.0 + i * 25 * METRE, -105.0) for i in range(20)]
+        east = [(north[-1][0], -105.0 + i * 25 * METRE * 1.3) for i in range(1, 20)]
+        kept = dead_band(self.trip.id, self._fixes(north + east))
+        self.assertIn(north[-1][0], [location.lat for location in kept])
+        self.assertTrue(any(location.lng > -105.0 for location in kept[:-1]))
+
+    def test_state_is_shared_between_batches(self):
+        cruise = self._fixes([(40.0 + i * 25 * METRE, -105.0) for i in range(40)])
+        first = dead_band(self.trip.id, cruise[:20])
+        second = dead_band(self.trip.id, cruise[20:])
+        self.assertEqual(len(first), 2)
+        self.assertEqual(second, [])
+
+    def test_batch_endpoint_stores_fewer_rows(self):
+        client = APIClient()
+        client.force_authenticate(user=self.driver)
+        points = [
+            {'sequence': i, 'lat': 40.0, 'lng': -105.0,
+             'recorded_at': (self.start + timedelta(seconds=i)).isoformat()}
+            for i in range(120)
+        ]
+        with mock.patch('logbook.broadcaster.get_channel_layer') as layer:
+            layer.return_value.group_send = mock.AsyncMock()
+            resp = client.post(f'/api/trips/{self.trip.pk}/locations/batch/', {'points': points}, format='json')
+        self.assertEqual(len(resp.json()['accepted']), 120)
+        self.assertEqual(LocationUpdate.objects.filter(trip=self.trip).count(), 2)
+
+
+class SimplifyTest(TestCase):
+    def test_straight_line_collapses_to_its_ends(self):
+        points = [(0.0, i * 10.0 + (1 if i % 2 else -1)) for i in range(100)]
+        self.assertEqual(simplify(points, tolerance=5), [0, 99])
+
+    def test_corner_and_forced_points_are_kept(self):
+        points = [(0.0, float(i)) for i in range(50)] + [(float(i), 49.0) for i in range(1, 50)]
+        self.assertEqual(simplify(points, tolerance=1), [0, 49, 98])
+        self.assertEqual(simplify(points, tolerance=1, keep={10}), [0, 10, 49, 98])
+
+
+@override_settings(TRACK_SIMPLIFY_TOLERANCE_METERS=5, ELD_STATIONARY_SPEED=2.2, ELD_STATIONARY_MINUTES=5)
+class SimplifyTripTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.driver = get_user_model().objects.create_user(username='simp', password='testpass', license_number='TR2')
+        self.start = timezone.now().replace(microsecond=0) - timedelta(hours=2)
+        self.trip = Trip.objects.create(
+            driver=self.driver, vehicle_id='T1', origin='A', destination='B', distance=1.0,
+            start_time=self.start, status='in_progress',
+        )
+        rows = []
+        lat = 40.0
+        for second in range(0, 1800, 5):
+            stopped = 600 <= second < 1200
+            if not stopped:
+                lat += 25 * 5 * METRE
+            rows.append(LocationUpdate(
+                trip=self.trip, driver=self.driver, lat=lat, lng=-105.0 + (second % 2) * METRE,
+                speed=0.0 if stopped else 25.0, recorded_at=self.start + timedelta(seconds=second),
+            ))
+        LocationUpdate.objects.bulk_create(rows)
+        self.stop_start = self.start + timedelta(seconds=600)
+        self.stop_end = self.start + timedelta(seconds=1195)
+
+    def test_track_is_simplified_and_stops_survive(self):
+        compression = simplify_trip(self.trip)
+        kept = list(LocationUpdate.objects.filter(trip=self.trip).order_by('recorded_at').values_list('recorded_at', flat=True))
+        self.assertIn(self.stop_start, kept)
+        self.assertIn(self.stop_end, kept)
+        self.assertLess(len(kept), 10)
+        self.assertEqual(compression.stored_points, 360)
+        self.assertEqual(compression.kept_points, len(kept))
+        self.assertLessEqual(compression.max_error, 5)
+
+    def test_driving_between_stops_is_not_dropped(self):
+        # Stopped 00:00-00:09 and 00:30-00:39, straight at a steady speed in between.
+        start = self.start.replace(hour=0, minute=0, second=0) - timedelta(days=1)
+        trip = Trip.objects.create(
+            driver=self.driver, vehicle_id='T1', origin='A', destination='B', distance=1.0,
+            start_time=start, end_time=start + timedelta(minutes=50), status='in_progress',
+        )
+        rows, lat = [], 40.0
+        for minute in range(50):
+            stopped = minute < 10 or 30 <= minute < 40
+            if not stopped:
+                lat += 25 * 60 * METRE
+            rows.append(LocationUpdate(
+                trip=trip, driver=self.driver, lat=lat, lng=-105.0,
+                speed=0.0 if stopped else 25.0, recorded_at=start + timedelta(minutes=minute),
+            ))
+        LocationUpdate.objects.bulk_create(rows)
+
+        def stops():
+            points = list(LocationUpdate.objects.filter(trip=trip).order_by('recorded_at').values_list('recorded_at', 'speed'))
+            return stationary_periods(points, trip.start_time, trip.end_time)
+
+        before = stops()
+        self.assertEqual(len(before), 2)
+        simplify_trip(trip)
+        self.assertLess(LocationUpdate.objects.filter(trip=trip).count(), 20)
+        self.assertEqual(stops(), before)
+
+    def test_completing_trip_simplifies_its_track(self):
+        self.trip.status = 'completed'
+        self.trip.end_time = self.start + timedelta(minutes=30)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.trip.save()
+        self.assertTrue(TrackCompression.objects.filter(trip=self.trip).exists())
+        self.assertLess(LocationUpdate.objects.filter(trip=self.trip).count(), 10)
+
+    def test_command_reports_compression(self):
+        Trip.objects.filter(pk=self.trip.pk).update(status='completed')
+        out = StringIO()
+        call_command('simplify_tracks', stdout=out)
+        self.assertIn(f'trip {self.trip.pk}:', out.getvalue())
+        self.assertIn('of 360 fixes', out.getvalue())
@@ -0,0 +1,125 @@
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+import math
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from logbook.eld import ELDGenerator
+from logbook.models import DailyLog, LocationUpdate, Trip, TripTrack
+from logbook.track_archive import archive_trip, encode_polyline, pack, unpack
+
+START = datetime(2025, 6, 1, 20, 0, tzinfo=dt_timezone.utc)
+
+
+class PackTest(TestCase):
+    def test_round_trip(self):
+        points = [
+            (START, 41.123456, -93.654321, 25.37, 4.2, 7),
+            (START + timedelta(milliseconds=1500), 41.123556, -93.654221, None, None, None),
+            (START + timedelta(seconds=3), -33.9, 151.2, 0.0, 12.0, 3),
+        ]
+        arrays = unpack(pack(points))
+        self.assertEqual(len(arrays), 3)
+        decoded = list(arrays.points())
+        self.assertEqual([point[0] for point in decoded], [point[0] for point in points])
+        self.assertEqual([point[5] for point in decoded], [7, None, 3])
+        self.assertIsNone(decoded[1][3])
+        self.assertTrue(math.isnan(arrays.accuracies[1]))
+        for original, restored in zip(points, decoded):
+            self.assertAlmostEqual(original[1], restored[1], places=6)
+            self.assertAlmostEqual(original[2], restored[2], places=6)
+
+    def test_empty_track(self):
+        self.assertEqual(len(unpack(pack([]))), 0)
+
+    def test_rejects_other_blobs(self):
+        with self.assertRaises(ValueError):
+            unpack(b'nope')
+
+    def test_a_fix_costs_a_few_bytes(self):
+        points = [
+            (START + timedelta(seconds=i), 41.0 + i * 0.0002, -93.0 + i * 0.0001, 25.0 + (i % 7) / 10, 5.0, i)
+            for i in range(3600)
+        ]
+        self.assertLess(len(pack(points)) / len(points), 4)
+
+    def test_encoded_polyline(self):
+        # The example from Google's polyline documentation.
+        self.assertEqual(
+            encode_polyline([38.5, 40.7, 43.252], [-120.2, -120.95, -126.453]),
+            '_p~iF~ps|U_ulLnnqC_mqNvxq`@',
+        )
+
+
+class ArchiveTripTest(TestCase):
+    def setUp(self):
+        self.driver = get_user_model().objects.create_user(username='arch', password='testpass', license_number='AR1')
+        self.trip = Trip.objects.create(
+            driver=self.driver, vehicle_id='T', origin='Chicago', destination='Denver',
+            distance=Decimal('600.00'), start_time=START, end_time=START + timedelta(hours=10),
+            pickup_time=Decimal('1.00'), dropoff_time=Decimal('0.50'), status='completed',
+        )
+        # Ten minutes stopped three hours in.
+        LocationUpdate.objects.bulk_create([
+            LocationUpdate(trip=self.trip, driver=self.driver, lat=41.0, lng=-93.0, speed=0.0, sequence=minute,
+                           recorded_at=START + timedelta(hours=3, minutes=minute))
+            for minute in range(0, 11, 2)
+        ])
+
+    def test_rows_move_into_one_track(self):
+        track = archive_trip(self.trip)
+        self.assertFalse(LocationUpdate.objects.filter(trip=self.trip).exists())
+        self.assertEqual(track.point_count, 6)
+        self.assertEqual(track.started_at, START + timedelta(hours=3))
+        self.assertEqual(list(TripTrack.objects.get(trip=self.trip).arrays().sequences), [0, 2, 4, 6, 8, 10])
+        self.assertEqual(len(track.polyline()), len(encode_polyline([41.0] * 6, [-93.0] * 6)))
+
+    def test_late_rows_are_merged(self):
+        archive_trip(self.trip)
+        LocationUpdate.objects.create(trip=self.trip, driver=self.driver, lat=41.0, lng=-93.0, sequence=1,
+                                      recorded_at=START + timedelta(hours=3, minutes=1))
+        track = archive_trip(self.trip)
+        self.assertEqual(list(track.arrays().sequences), [0, 1, 2, 4, 6, 8, 10])
+
+    def test_eld_logs_are_unchanged_by_archiving(self):
+        generator = ELDGenerator(self.driver)
+        before = [log.segments for log in generator.generate_daily_logs(date(2025, 6, 1), date(2025, 6, 2))]
+        archive_trip(self.trip)
+        logs = ELDGenerator(self.driver).generate_daily_logs(date(2025, 6, 1), date(2025, 6, 2))
+        self.assertEqual([log.segments for log in logs], before)
+        self.assertIn(
+            {'status': 'on_duty', 'start': '2025-06-01T23:00:00+00:00', 'end': '2025-06-01T23:10:00+00:00'},
+            logs[0].segments,
+        )
+        self.assertEqual(DailyLog.objects.filter(driver=self.driver).count(), 2)
+
+    def test_archived_sequences_are_duplicates(self):
+        archive_trip(self.trip)
+        client = APIClient()
+        client.force_authenticate(user=self.driver)
+        with mock.patch('logbook.broadcaster.get_channel_layer') as layer:
+            layer.return_value.group_send = mock.AsyncMock()
+            resp = client.post(f'/api/trips/{self.trip.pk}/locations/batch/', {'points': [
+                {'sequence': 4, 'lat': 41.0, 'lng': -93.0, 'recorded_at': '2025-06-01T23:04:00Z'},
+                {'sequence': 11, 'lat': 41.0, 'lng': -93.0, 'recorded_at': '2025-06-01T23:11:00Z'},
+            ]}, format='json')
+        self.assertEqual(resp.json()['accepted'], [11])
+        self.assertEqual(resp.json()['duplicates'], [4])
+
+    def test_command_archives_old_trips(self):
+        recent = Trip.objects.create(
+            driver=self.driver, vehicle_id='T', origin='A', destination='B', distance=Decimal('1.00'),
+            start_time=datetime.now(dt_timezone.utc) - timedelta(hours=2),
+            end_time=datetime.now(dt_timezone.utc) - timedelta(hours=1), status='completed',
+        )
+        LocationUpdate.objects.create(trip=recent, driver=self.driver, lat=1.0, lng=2.0)
+        out = StringIO()
+        call_command('archive_tracks', stdout=out)
+        self.assertIn('archived 6 location updates from 1 trips', out.getvalue())
+        self.assertTrue(TripTrack.objects.filter(trip=self.trip).exists())
+        self.assertFalse(TripTrack.objects.filter(trip=recent).exists())
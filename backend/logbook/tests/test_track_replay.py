@@ -0,0 +1,115 @@
+import base64
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from urllib.parse import parse_qs, urlparse
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from logbook.models import LocationUpdate, Trip
+from logbook.track_archive import archive_trip
+from logbook.track_replay import decode_cursor, encode_cursor, zoom_tolerance
+
+START = datetime(2025, 6, 1, 8, 0, tzinfo=dt_timezone.utc)
+
+
+class TrackReplayTest(TestCase):
+    def setUp(self):
+        self.driver = get_user_model().objects.create_user(username='replay', password='testpass', license_number='RP1')
+        self.trip = Trip.objects.create(
+            driver=self.driver, vehicle_id='T', origin='A', destination='B', distance=Decimal('10.00'),
+            start_time=START, status='completed',
+        )
+        # North for 20 fixes, then east for 20: one corner.
+        coordinates = [(41.0 + i * 0.001, -93.0) for i in range(20)] + [(41.019, -93.0 + i * 0.001) for i in range(1, 21)]
+        LocationUpdate.objects.bulk_create([
+            LocationUpdate(trip=self.trip, driver=self.driver, lat=lat, lng=lng, speed=20.0, sequence=index,
+                           recorded_at=START + timedelta(seconds=index * 10))
+            for index, (lat, lng) in enumerate(coordinates)
+        ])
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.driver)
+        self.url = f'/api/trips/{self.trip.pk}/track/'
+
+    def _replay(self, url, **params):
+        sequences, pages = [], 0
+        while url:
+            resp = self.client.get(url, params)
+            self.assertEqual(resp.status_code, 200)
+            sequences += [point['sequence'] for point in resp.json()['points']]
+            url, params, pages = resp.json()['next'], {}, pages + 1
+        return sequences, pages
+
+    def test_keyset_pages_cover_the_track_once(self):
+        sequences, pages = self._replay(self.url, limit=15)
+        self.assertEqual(sequences, list(range(40)))
+        self.assertEqual(pages, 3)
+
+    def test_rows_with_the_same_time_are_not_skipped(self):
+        LocationUpdate.objects.filter(sequence__in=[5, 6, 7]).update(recorded_at=START + timedelta(seconds=50))
+        sequences, _ = self._replay(self.url, limit=6)
+        self.assertEqual(sorted(sequences), list(range(40)))
+
+    def test_later_pages_are_a_range_scan(self):
+        first = self.client.get(self.url, {'limit': 10}).json()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(first['next'])
+        statements = ' '.join(query['sql'] for query in queries.captured_queries).upper()
+        self.assertNotIn('COUNT(', statements)
+        self.assertNotIn('OFFSET', statements)
+
+    def test_time_window(self):
+        resp = self.client.get(self.url, {
+            'since': (START + timedelta(seconds=100)).isoformat(),
+            'until': (START + timedelta(seconds=150)).isoformat(),
+        })
+        self.assertEqual([point['sequence'] for point in resp.json()['points']], [10, 11, 12, 13, 14])
+
+    def test_zoom_returns_one_simplified_track(self):
+        resp = self.client.get(self.url, {'zoom': 12})
+        body = resp.json()
+        self.assertIsNone(body['next'])
+        self.assertEqual([point['sequence'] for point in body['points']], [0, 19, 39])
+        self.assertAlmostEqual(body['resolution'], round(zoom_tolerance(12, 41.0), 2))
+
+        # Fine resolution keeps the wobble a coarse one drops.
+        LocationUpdate.objects.filter(sequence=30).update(lat=41.0195)
+        coarse = self.client.get(self.url, {'resolution': 100}).json()
+        fine = self.client.get(self.url, {'resolution': 10}).json()
+        self.assertNotIn(30, [point['sequence'] for point in coarse['points']])
+        self.assertIn(30, [point['sequence'] for point in fine['points']])
+
+    def test_archived_track_and_late_rows_are_merged(self):
+        archive_trip(self.trip)
+        LocationUpdate.objects.create(trip=self.trip, driver=self.driver, lat=41.019, lng=-92.98, sequence=40,
+                                      recorded_at=START + timedelta(seconds=400))
+        LocationUpdate.objects.create(trip=self.trip, driver=self.driver, lat=41.0, lng=-93.0, sequence=100,
+                                      recorded_at=START + timedelta(seconds=5))
+        sequences, _ = self._replay(self.url, limit=7)
+        self.assertEqual(sequences, [0, 100] + list(range(1, 41)))
+        overview = self.client.get(self.url, {'zoom': 12}).json()
+        self.assertEqual([point['sequence'] for point in overview['points']], [0, 19, 40])
+
+    def test_bad_parameters(self):
+        self.assertEqual(self.client.get(self.url, {'cursor': 'nope'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'zoom': 40}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'limit': 0}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'since': 'yesterday'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'since': '2025-02-30T00:00:00'}).status_code, 400)
+        for raw in (f'{10 ** 20}.1.1', f'0.1.{2 ** 64}', '0.1.-1'):
+            cursor = base64.urlsafe_b64encode(raw.encode()).decode()
+            self.assertEqual(self.client.get(self.url, {'cursor': cursor}).status_code, 400, raw)
+
+    def test_other_drivers_cannot_replay(self):
+        other = get_user_model().objects.create_user(username='other', password='testpass', license_number='RP2')
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_cursor_round_trip(self):
+        position = (START + timedelta(microseconds=123456), 1, 42)
+        self.assertEqual(decode_cursor(encode_cursor(position)), position)
+        next_url = self.client.get(self.url, {'limit': 5}).json()['next']
+        self.assertIn('cursor', parse_qs(urlparse(next_url).query))
@@ -0,0 +1,224 @@
+"""GPS track compression.
+
+Two passes keep ``location_updates`` from filling with redundant fixes:
+
+* ``dead_band`` runs at ingestion. Each trip remembers its last two stored
+  fixes (in the cache, so every worker shares them) and predicts where the
+  truck should be now by dead reckoning along that segment. A fix is only
+  stored if it is more than ``TRACK_DEADBAND_METERS`` from the prediction,
+  turns by more than ``TRACK_DEADBAND_HEADING_DEGREES``, or comes
+  ``TRACK_DEADBAND_SECONDS`` after the last stored one. A parked truck or a
+  steady cruise therefore stores one fix per ``TRACK_DEADBAND_SECONDS``;
+  stops, turns and speed changes are kept. Dropped fixes are still
+  broadcast and run through the geofences, they are just not stored.
+  ``TRACK_DEADBAND_METERS = 0`` turns the filter off.
+* ``simplify_trip`` runs when a trip completes. It simplifies the stored
+  track with Douglas-Peucker to ``TRACK_SIMPLIFY_TOLERANCE_METERS``, always
+  keeping the fixes the ELD stop detection depends on (see
+  ``stop_anchors``) so it sees the same stops, deletes the rest and records
+  a ``TrackCompression`` with the rows dropped by each pass and the
+  distance between every deleted fix and the simplified track.
+"""
+from bisect import bisect_left, bisect_right
+from math import atan2, cos, degrees, hypot, radians
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import LocationUpdate, TrackCompression, Trip
+
+METRES_PER_DEGREE = 6371000 * 3.141592653589793 / 180
+
+# Stored rows deleted per statement.
+DELETE_CHUNK = 500
+
+
+def _state_key(trip_id):
+    return f'track:deadband:{trip_id}'
+
+
+def _dropped_key(trip_id):
+    return f'track:dropped:{trip_id}'
+
+
+def _offset(origin_lat, origin_lng, lat, lng):
+    """``(x, y)`` metres of ``(lat, lng)`` east and north of the origin.
+
+    Sinusoidal projection: distances stay accurate along a whole trip, not
+    just near the origin.
+    """
+    return (
+        (lng - origin_lng) * cos(radians(lat)) * METRES_PER_DEGREE,
+        (lat - origin_lat) * METRES_PER_DEGREE,
+    )
+
+
+def _turn(a, b):
+    """Smallest angle in degrees between headings ``a`` and ``b``."""
+    return abs((a - b + 180) % 360 - 180)
+
+
+def keep_fix(previous, last, fix, meters, heading_degrees, seconds):
+    """Whether ``fix`` falls outside the dead-band after stored fixes ``previous`` and ``last``.
+
+    Fixes are ``(lat, lng, timestamp)``; ``previous`` may be ``None``.
+    """
+    elapsed = fix[2] - last[2]
+    if elapsed >= seconds or elapsed < 0:
+        return True
+    x, y = _offset(last[0], last[1], fix[0], fix[1])
+    if previous is None or last[2] <= previous[2]:
+        return hypot(x, y) > meters
+    px, py = _offset(last[0], last[1], previous[0], previous[1])
+    # Velocity of the last stored segment, projected forward.
+    scale = elapsed / (last[2] - previous[2])
+    if hypot(x + px * scale, y + py * scale) > meters:
+        return True
+    moved = hypot(x, y)
+    if moved < meters / 4 or hypot(px, py) < meters / 4:
+        # Too short to have a meaningful heading.
+        return False
+    return _turn(degrees(atan2(x, y)), degrees(atan2(-px, -py))) > heading_degrees
+
+
+def dead_band(trip_id, locations):
+    """The subset of ``locations`` (sorted by time) worth storing for the trip."""
+    meters = getattr(settings, 'TRACK_DEADBAND_METERS', 10)
+    if not meters or not locations:
+        return list(locations)
+    heading_degrees = getattr(settings, 'TRACK_DEADBAND_HEADING_DEGREES', 20)
+    seconds = getattr(settings, 'TRACK_DEADBAND_SECONDS', 60)
+
+    state = cache.get(_state_key(trip_id)) or []
+    previous, last = ([None, None] + [tuple(fix) for fix in state])[-2:]
+    kept = []
+    for location in locations:
+        fix = (location.lat, location.lng, location.recorded_at.timestamp())
+        if last is not None and fix[2] < last[2]:
+            # Late fix from before the last stored one: store it, but do not
+            # predict from it.
+            kept.append(location)
+            continue
+        if last is None or keep_fix(previous, last, fix, meters, heading_degrees, seconds):
+            kept.append(location)
+            previous, last = last, fix
+    if kept:
+        cache.set(_state_key(trip_id), [fix for fix in (previous, last) if fix is not None], 86400)
+    dropped = len(locations) - len(kept)
+    if dropped:
+        try:
+            cache.incr(_dropped_key(trip_id), dropped)
+        except ValueError:
+            cache.set(_dropped_key(trip_id), dropped, None)
+    return kept
+
+
+def _segment_distance(point, start, end):
+    (x, y), (x1, y1), (x2, y2) = point, start, end
+    dx, dy = x2 - x1, y2 - y1
+    length = dx * dx + dy * dy
+    t = 0.0 if length == 0 else max(0.0, min(1.0, ((x - x1) * dx + (y - y1) * dy) / length))
+    return hypot(x - x1 - t * dx, y - y1 - t * dy)
+
+
+def simplify(points, tolerance, keep=()):
+    """Indexes of ``points`` (``(x, y)`` metres) kept by Douglas-Peucker.
+
+    The ends and every index in ``keep`` are always kept; the track is
+    simplified between them.
+    """
+    if len(points) <= 2:
+        return list(range(len(points)))
+    anchors = sorted({0, len(points) - 1} | set(keep))
+    kept = set(anchors)
+    stack = list(zip(anchors, anchors[1:]))
+    while stack:
+        first, last = stack.pop()
+        worst, worst_index = 0.0, None
+        for index in range(first + 1, last):
+            distance = _segment_distance(points[index], points[first], points[last])
+            if distance > worst:
+                worst, worst_index = distance, index
+        if worst_index is not None and worst > tolerance:
+            kept.add(worst_index)
+            stack.append((first, worst_index))
+            stack.append((worst_index, last))
+    return sorted(kept)
+
+
+def track_error(points, kept):
+    """Distance of every dropped point from the simplified track, in metres."""
+    errors = []
+    for first, last in zip(kept, kept[1:]):
+        for index in range(first + 1, last):
+            errors.append(_segment_distance(points[index], points[first], points[last]))
+    return errors
+
+
+def stop_anchors(rows, start_time=None, end_time=None):
+    """Indexes of ``rows`` (``(id, lat, lng, recorded_at, speed)`` by time) that stops depend on.
+
+    ``eld.stationary_periods`` only looks at which fixes are slow, one day
+    and one trip window at a time. Keeping the fixes on both sides of every
+    change between slow and moving, of every day boundary and of the trip's
+    start and end means each run of slow fixes begins and ends at the same
+    fixes after simplification. Dropping the moving fixes between two stops
+    therefore cannot merge them.
+    """
+    threshold = getattr(settings, 'ELD_STATIONARY_SPEED', 2.2)
+    keep = set()
+    previous = None
+    for index, row in enumerate(rows):
+        current = (row[4] is not None and row[4] < threshold, timezone.localdate(row[3]))
+        if previous is not None and current != previous:
+            keep.update((index - 1, index))
+        previous = current
+    times = [row[3] for row in rows]
+    boundaries = []
+    if start_time is not None:
+        boundaries.append(bisect_left(times, start_time))
+    if end_time is not None:
+        boundaries.append(bisect_right(times, end_time))
+    for boundary in boundaries:
+        keep.update(index for index in (boundary - 1, boundary) if 0 <= index < len(rows))
+    return keep
+
+
+def simplify_trip(trip, tolerance=None):
+    """Simplify the stored track of ``trip`` and record a ``TrackCompression``."""
+    from .location_buffer import get_location_buffer
+
+    if tolerance is None:
+        tolerance = getattr(settings, 'TRACK_SIMPLIFY_TOLERANCE_METERS', 5)
+    # Rows still waiting in the write-behind buffer belong to the track too.
+    get_location_buffer().flush()
+    rows = list(LocationUpdate.objects.filter(trip=trip).order_by('recorded_at', 'id').values_list(
+        'id', 'lat', 'lng', 'recorded_at', 'speed'
+    ))
+    if rows:
+        origin_lat, origin_lng = rows[0][1], rows[0][2]
+        points = [_offset(origin_lat, origin_lng, lat, lng) for _, lat, lng, _, _ in rows]
+        # The stored times: the instance may still hold unparsed strings.
+        start_time, end_time = Trip.objects.values_list('start_time', 'end_time').get(pk=trip.pk)
+        kept = simplify(points, tolerance, stop_anchors(rows, start_time, end_time))
+        errors = track_error(points, kept)
+    else:
+        kept, errors = [], []
+
+    kept_ids = {rows[index][0] for index in kept}
+    deleted = [row[0] for row in rows if row[0] not in kept_ids]
+    for start in range(0, len(deleted), DELETE_CHUNK):
+        LocationUpdate.objects.filter(pk__in=deleted[start:start + DELETE_CHUNK]).delete()
+
+    compression, _ = TrackCompression.objects.update_or_create(trip=trip, defaults={
+        'deadband_dropped': cache.get(_dropped_key(trip.pk), 0),
+        'stored_points': len(rows),
+        'kept_points': len(kept),
+        'tolerance': tolerance,
+        'max_error': round(max(errors), 2) if errors else 0.0,
+        'mean_error': round(sum(errors) / len(errors), 2) if errors else 0.0,
+        'simplified_at': timezone.now(),
+    })
+    cache.delete_many([_state_key(trip.pk), _dropped_key(trip.pk)])
+    return compression
@@ -0,0 +1,239 @@
+"""Packed storage for the tracks of completed trips.
+
+``archive_trip`` moves a trip's ``LocationUpdate`` rows into one
+``TripTrack`` blob. The blob is ``MAGIC``, a format version byte and a
+zlib-compressed body. The body holds the point count followed by one column
+per field, each prefixed by its length in bytes:
+
+* time (epoch milliseconds), latitude and longitude (micro-degrees, about
+  0.1 m) as deltas from the previous point;
+* speed (cm/s), accuracy (dm) and sequence as a presence bitmap plus deltas
+  of the values that are present.
+
+Deltas are zigzag varints, so a fix a second and a few metres on from the
+previous one costs a handful of bytes before compression. ``unpack`` decodes
+straight to ``array`` columns, ``encode_polyline`` turns them into an
+encoded polyline.
+
+The ELD generator and batch deduplication read archived tracks alongside the
+live rows, so archiving changes how a track is stored, not what it says.
+"""
+from array import array
+from dataclasses import dataclass
+from datetime import datetime, timezone as dt_timezone
+import math
+import zlib
+
+from django.db import transaction
+
+from .models import LocationUpdate, TripTrack
+
+MAGIC = b'TRK'
+FORMAT_VERSION = 1
+
+LAT_LNG_SCALE = 1_000_000
+SPEED_SCALE = 100
+ACCURACY_SCALE = 10
+
+# Stored rows deleted per statement.
+DELETE_CHUNK = 500
+
+
+@dataclass
+class TrackArrays:
+    """Column arrays of a track, sorted by time.
+
+    ``times`` are epoch milliseconds; missing speeds and accuracies are NaN
+    and missing sequences are -1.
+    """
+    times: array
+    lats: array
+    lngs: array
+    speeds: array
+    accuracies: array
+    sequences: array
+
+    def __len__(self):
+        return len(self.times)
+
+    def recorded_at(self, index):
+        return datetime.fromtimestamp(self.times[index] / 1000, tz=dt_timezone.utc)
+
+    def points(self):
+        """``(recorded_at, lat, lng, speed, accuracy, sequence)`` tuples, with ``None`` for missing values."""
+        for index in range(len(self.times)):
+            speed, accuracy, sequence = self.speeds[index], self.accuracies[index], self.sequences[index]
+            yield (
+                self.recorded_at(index), self.lats[index], self.lngs[index],
+                None if math.isnan(speed) else speed,
+                None if math.isnan(accuracy) else accuracy,
+                None if sequence < 0 else sequence,
+            )
+
+
+def write_varint(out, value):
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def write_deltas(out, values):
+    previous = 0
+    for value in values:
+        delta = value - previous
+        previous = value
+        write_varint(out, delta * 2 if delta >= 0 else -delta * 2 - 1)
+
+
+def read_varint(data, position):
+    value = shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+
+def read_deltas(data, count):
+    values = []
+    position = previous = 0
+    for _ in range(count):
+        raw, position = read_varint(data, position)
+        previous += (raw >> 1) if not raw & 1 else -((raw + 1) >> 1)
+        values.append(previous)
+    return values
+
+
+def nullable_column(values, count):
+    """Presence bitmap followed by the deltas of the present values."""
+    bitmap = bytearray((count + 7) // 8)
+    present = []
+    for index, value in enumerate(values):
+        if value is not None:
+            bitmap[index >> 3] |= 1 << (index & 7)
+            present.append(value)
+    out = bytearray(bitmap)
+    write_deltas(out, present)
+    return out
+
+
+def read_nullable(data, count):
+    size = (count + 7) // 8
+    bitmap, body = data[:size], data[size:]
+    flags = [bool(bitmap[index >> 3] & (1 << (index & 7))) for index in range(count)]
+    present = iter(read_deltas(body, sum(flags)))
+    return [next(present) if flag else None for flag in flags]
+
+
+def _fixed(value, scale):
+    return None if value is None else round(value * scale)
+
+
+def pack(points):
+    """Encode ``(recorded_at, lat, lng, speed, accuracy, sequence)`` tuples, sorted by time."""
+    count = len(points)
+    columns = []
+    for values in (
+        [round(point[0].timestamp() * 1000) for point in points],
+        [round(point[1] * LAT_LNG_SCALE) for point in points],
+        [round(point[2] * LAT_LNG_SCALE) for point in points],
+    ):
+        column = bytearray()
+        write_deltas(column, values)
+        columns.append(column)
+    columns.append(nullable_column([_fixed(point[3], SPEED_SCALE) for point in points], count))
+    columns.append(nullable_column([_fixed(point[4], ACCURACY_SCALE) for point in points], count))
+    columns.append(nullable_column([point[5] for point in points], count))
+
+    body = bytearray()
+    write_varint(body, count)
+    for column in columns:
+        write_varint(body, len(column))
+        body += column
+    return MAGIC + bytes([FORMAT_VERSION]) + zlib.compress(bytes(body), 9)
+
+
+def unpack(blob):
+    """Decode a blob from ``pack`` into ``TrackArrays``."""
+    if blob[:3] != MAGIC or blob[3] != FORMAT_VERSION:
+        raise ValueError('Not a packed track (or an unsupported format version)')
+    body = zlib.decompress(blob[4:])
+    count, position = read_varint(body, 0)
+    columns = []
+    for _ in range(6):
+        length, position = read_varint(body, position)
+        columns.append(body[position:position + length])
+        position += length
+
+    def scaled(values, scale):
+        return array('d', (math.nan if value is None else value / scale for value in values))
+
+    return TrackArrays(
+        times=array('q', read_deltas(columns[0], count)),
+        lats=array('d', (value / LAT_LNG_SCALE for value in read_deltas(columns[1], count))),
+        lngs=array('d', (value / LAT_LNG_SCALE for value in read_deltas(columns[2], count))),
+        speeds=scaled(read_nullable(columns[3], count), SPEED_SCALE),
+        accuracies=scaled(read_nullable(columns[4], count), ACCURACY_SCALE),
+        sequences=array('q', (-1 if value is None else value for value in read_nullable(columns[5], count))),
+    )
+
+
+def encode_polyline(lats, lngs, precision=5):
+    """Encoded polyline (Google's algorithm) of the coordinates."""
+    factor = 10 ** precision
+    out = []
+    previous_lat = previous_lng = 0
+    for lat, lng in zip(lats, lngs):
+        lat, lng = round(lat * factor), round(lng * factor)
+        for delta in (lat - previous_lat, lng - previous_lng):
+            value = ~(delta << 1) if delta < 0 else delta << 1
+            while value >= 0x20:
+                out.append(chr((0x20 | (value & 0x1f)) + 63))
+                value >>= 5
+            out.append(chr(value + 63))
+        previous_lat, previous_lng = lat, lng
+    return ''.join(out)
+
+
+def archived_sequences(trip):
+    """Sequence numbers stored in the trip's archived track."""
+    track = TripTrack.objects.filter(trip=trip).only('data').first()
+    if track is None:
+        return set()
+    return {sequence for sequence in track.arrays().sequences if sequence >= 0}
+
+
+def archive_trip(trip):
+    """Move the trip's ``LocationUpdate`` rows into its ``TripTrack``; returns the track.
+
+    Rows that arrive after a trip was archived are merged into the existing
+    track the next time it is archived.
+    """
+    from .location_buffer import get_location_buffer
+
+    get_location_buffer().flush()
+    with transaction.atomic():
+        rows = list(LocationUpdate.objects.filter(trip=trip).order_by('recorded_at', 'id').values_list(
+            'id', 'recorded_at', 'lat', 'lng', 'speed', 'accuracy', 'sequence'
+        ))
+        track = TripTrack.objects.select_for_update().filter(trip=trip).first()
+        if not rows and track is not None:
+            return track
+        points = [row[1:] for row in rows]
+        if track is not None:
+            points = sorted(list(track.arrays().points()) + points, key=lambda point: point[0])
+        data = pack(points)
+        track, _ = TripTrack.objects.update_or_create(trip=trip, defaults={
+            'point_count': len(points),
+            'started_at': points[0][0] if points else None,
+            'ended_at': points[-1][0] if points else None,
+            'data': data,
+        })
+        ids = [row[0] for row in rows]
+        for start in range(0, len(ids), DELETE_CHUNK):
+            LocationUpdate.objects.filter(pk__in=ids[start:start + DELETE_CHUNK]).delete()
+    return track
+
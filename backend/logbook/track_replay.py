@@ -0,0 +1,146 @@
+"""Track replay for ``GET /api/trips/{id}/track/``.
+
+A trip's fixes live in two places: the archived ``TripTrack`` blob and
+``location_updates`` rows (the whole track before archiving, late fixes
+after). ``track_page`` merges both in ``(recorded_at, source, key)`` order,
+where ``source`` is 0 for the archive (``key`` is the point's index in the
+blob) and 1 for stored rows (``key`` is the row id).
+
+Raw replay is keyset paginated: the cursor is the position of the last point
+sent, and the next page is a range scan on the ``(trip, recorded_at)`` index
+from there, so page 500 costs the same as page 1 and there is no
+``COUNT(*)``.
+
+With ``zoom`` (web map zoom level) or ``resolution`` (metres), the requested
+window is simplified server-side with Douglas-Peucker to that tolerance
+(one pixel at ``zoom``) and returned in one response. A 12-hour track shown
+whole on a map comes back as a few hundred points.
+"""
+import base64
+import binascii
+from datetime import datetime, timedelta, timezone as dt_timezone
+import heapq
+from math import cos, radians
+
+from django.db.models import Q
+
+from .models import LocationUpdate, TripTrack
+from .track import _offset, simplify
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+ARCHIVE, STORED = 0, 1
+
+# Metres per pixel at zoom 0 on the equator (256-pixel web mercator tiles).
+METRES_PER_PIXEL_Z0 = 156543.03392
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _micros(value):
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+
+def encode_cursor(position):
+    recorded_at, source, key = position
+    raw = f'{_micros(recorded_at)}.{source}.{key}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """``(recorded_at, source, key)`` of an ``encode_cursor`` string."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        micros, source, key = (int(part) for part in raw.split('.'))
+        recorded_at = EPOCH + timedelta(microseconds=micros)
+    except (binascii.Error, UnicodeDecodeError, ValueError, OverflowError):
+        raise InvalidCursor('invalid cursor')
+    # Keys are blob indexes or row ids, both within a signed 64-bit column.
+    if source not in (ARCHIVE, STORED) or not 0 <= key < 2 ** 63:
+        raise InvalidCursor('invalid cursor')
+    return recorded_at, source, key
+
+
+def zoom_tolerance(zoom, lat):
+    """Metres covered by one pixel at map ``zoom`` and latitude ``lat``."""
+    return METRES_PER_PIXEL_Z0 * cos(radians(lat)) / 2 ** zoom
+
+
+def _archived(trip, since, until):
+    """``(recorded_at, ARCHIVE, index, lat, lng, speed, accuracy, sequence)`` of the archived track."""
+    track = TripTrack.objects.filter(trip=trip).only('data').first()
+    if track is None:
+        return []
+    points = []
+    for index, (recorded_at, lat, lng, speed, accuracy, sequence) in enumerate(track.arrays().points()):
+        if (since is None or recorded_at >= since) and (until is None or recorded_at < until):
+            points.append((recorded_at, ARCHIVE, index, lat, lng, speed, accuracy, sequence))
+    return points
+
+
+def _stored(trip, since, until):
+    rows = LocationUpdate.objects.filter(trip=trip)
+    if since is not None:
+        rows = rows.filter(recorded_at__gte=since)
+    if until is not None:
+        rows = rows.filter(recorded_at__lt=until)
+    return rows.order_by('recorded_at', 'id')
+
+
+def _stored_point(row):
+    recorded_at, pk, lat, lng, speed, accuracy, sequence = row
+    return recorded_at, STORED, pk, lat, lng, speed, accuracy, sequence
+
+
+def _after(rows, position):
+    """Stored rows strictly after the cursor ``position``."""
+    recorded_at, source, key = position
+    if source == ARCHIVE:
+        return rows.filter(recorded_at__gte=recorded_at)
+    return rows.filter(Q(recorded_at__gt=recorded_at) | Q(recorded_at=recorded_at, id__gt=key))
+
+
+def point_payload(point):
+    recorded_at, _, _, lat, lng, speed, accuracy, sequence = point
+    return {
+        'lat': lat,
+        'lng': lng,
+        'speed': speed,
+        'accuracy': accuracy,
+        'sequence': sequence,
+        'recorded_at': recorded_at.isoformat(),
+    }
+
+
+def track_page(trip, cursor=None, limit=1000, since=None, until=None):
+    """Up to ``limit`` points after ``cursor``; returns ``(points, next cursor or None)``."""
+    rows = _stored(trip, since, until)
+    archived = _archived(trip, since, until)
+    if cursor is not None:
+        position = decode_cursor(cursor)
+        rows = _after(rows, position)
+        archived = [point for point in archived if point[:3] > position]
+    stored = map(_stored_point, rows.values_list(
+        'recorded_at', 'id', 'lat', 'lng', 'speed', 'accuracy', 'sequence'
+    )[:limit + 1])
+    points = list(heapq.merge(archived, stored))[:limit + 1]
+    if len(points) > limit:
+        points = points[:limit]
+        return points, encode_cursor(points[-1][:3])
+    return points, None
+
+
+def simplified_track(trip, tolerance=None, zoom=None, since=None, until=None):
+    """The window's points simplified to ``tolerance`` metres (or one pixel at ``zoom``)."""
+    stored = map(_stored_point, _stored(trip, since, until).values_list(
+        'recorded_at', 'id', 'lat', 'lng', 'speed', 'accuracy', 'sequence'
+    ).iterator(chunk_size=5000))
+    points = list(heapq.merge(_archived(trip, since, until), stored))
+    if not points:
+        return [], tolerance or 0.0
+    origin_lat, origin_lng = points[0][3], points[0][4]
+    if tolerance is None:
+        tolerance = zoom_tolerance(zoom, origin_lat)
+    kept = simplify([_offset(origin_lat, origin_lng, point[3], point[4]) for point in points], tolerance)
+    return [points[index] for index in kept], tolerance
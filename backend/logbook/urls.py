@@ -8,10 +8,13 @@ from .views import (
     TripViewSet,
     FuelLogViewSet,
     ComplianceReportViewSet,
-    DashboardStatsView
+    ReportRunViewSet,
+    DashboardStatsView,
+    LocationBufferMetricsView,
+    BroadcastMetricsView
 )
 from .views_route import RouteView
-from .views_eld import ELDGenerateView
+from .views_eld import ELDExportView, ELDGenerateView, ELDSheetView
 from .views import ReverseGeocodeView
 from .views import AddressSearchView
 
@@ -20,15 +23,20 @@ router.register(r'drivers', DriverViewSet, basename='driver')
 router.register(r'trips', TripViewSet, basename='trip')
 router.register(r'fuel-logs', FuelLogViewSet, basename='fuellog')
 router.register(r'compliance-reports', ComplianceReportViewSet, basename='compliancereport')
+router.register(r'report-runs', ReportRunViewSet, basename='reportrun')
 
 urlpatterns = [
     path('auth/register/', DriverRegistrationView.as_view(), name='register'),
     path('auth/login/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('auth/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('dashboard/stats/', DashboardStatsView.as_view(), name='dashboard-stats'),
+    path('metrics/location-buffer/', LocationBufferMetricsView.as_view(), name='location-buffer-metrics'),
+    path('metrics/broadcasts/', BroadcastMetricsView.as_view(), name='broadcast-metrics'),
     path('', include(router.urls)),
     path('route/', RouteView.as_view(), name='api-route'),
     path('eld/generate/', ELDGenerateView.as_view(), name='api-eld-generate'),
+    path('eld/export/', ELDExportView.as_view(), name='api-eld-export'),
+    path('eld/logs/<int:pk>/sheet.<str:fmt>', ELDSheetView.as_view(), name='api-eld-sheet'),
     path('search/reverse/', ReverseGeocodeView.as_view(), name='api-search-reverse'),
     path('search/address/', AddressSearchView.as_view(), name='api-search-address'),
 ]
@@ -4,34 +4,46 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework_simplejwt.views import TokenObtainPairView
 from django.utils import timezone
-from django.db.models import Sum, Count, Q
-from datetime import timedelta
+from django.utils.dateparse import parse_datetime
+from django.db.models import Count, Q
+from decimal import Decimal, InvalidOperation
+from rest_framework.exceptions import ValidationError
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework.utils.urls import replace_query_param
 
-from .models import Driver, Trip, FuelLog, ComplianceReport
+from .models import Driver, Trip, FuelLog, ComplianceReport, ReportRun, LocationUpdate
 from .serializers import (
     DriverSerializer, DriverRegistrationSerializer, DriverUpdateSerializer,
     TripSerializer, TripCreateSerializer,
     FuelLogSerializer, FuelLogCreateSerializer,
-    ComplianceReportSerializer, DashboardStatsSerializer
+    ComplianceReportSerializer, DashboardStatsSerializer,
+    ReportRunSerializer, ReportRunCreateSerializer
 )
-from .permissions import IsAdminOrReadOnly, IsOwnerOrAdmin
+from .permissions import IsAdmin, IsAdminOrReadOnly, IsOwnerOrAdmin
+from .fleet_reports import claim_report_run, create_report_run, launch_report_run
+from .compliance import compliance_context
+from .dashboard import get_fleet_snapshot
+from .reports import build_report
+from .broadcaster import get_broadcaster
+from .fleet_live import publish_positions
+from .geofence import event_payload, process_fixes
+from .locations import LocationFixSerializer, ingest_batch, location_payload
+from .motion import update_motion
+from .location_buffer import get_location_buffer, location_row
+from .positions import get_position_store
+from .ratelimit import check_rate_limit
+from .track import dead_band
+from .track_replay import InvalidCursor, point_payload, simplified_track, track_page
+from .duty_ledger import recovery_timeline, window_day_hours
 from .serializers import TripLocationSerializer
 import requests
 import os
 from django.core.cache import cache
 from django.conf import settings
 from django.http import JsonResponse
-from time import time
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
-from math import radians, cos, sin, asin, sqrt
 import logging
 
-# simple in-memory rate limiter (per-process). For production use Redis or a proper rate-limiter.
-_search_rate = {}
-
 class AddressSearchView(APIView):
     permission_classes = [permissions.AllowAny]
 
@@ -40,15 +52,9 @@ class AddressSearchView(APIView):
         if not q:
             return Response({'error': 'q is required'}, status=status.HTTP_400_BAD_REQUEST)
 
-        # basic per-ip rate limit: 5 reqs per 10 seconds
-        ip = request.META.get('REMOTE_ADDR', 'anon')
-        now = time()
-        window = _search_rate.get(ip, [])
-        window = [t for t in window if now - t < 10]
-        if len(window) >= 5:
-            return Response({'error': 'rate limit exceeded'}, status=status.HTTP_429_TOO_MANY_REQUESTS)
-        window.append(now)
-        _search_rate[ip] = window
+        limited = check_rate_limit(request, 'address_search')
+        if limited:
+            return limited
 
         cache_key = f"places:{q}"
         cached = cache.get(cache_key)
@@ -144,6 +150,64 @@ class DriverRegistrationView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+def recovery_payloads(driver_ids, duration=None):
+    """Hours-available curve and earliest legal start for each driver id."""
+    limit = getattr(settings, 'HOURS_LIMIT_8_DAYS', 70)
+    now = timezone.now()
+    day_hours = window_day_hours(driver_ids, now)
+    results = []
+    for driver_id in driver_ids:
+        timeline, earliest_start = recovery_timeline(day_hours.get(driver_id, {}), limit, duration, now)
+        results.append({
+            'driver_id': driver_id,
+            'limit': limit,
+            'duration': duration,
+            'earliest_start': earliest_start,
+            'timeline': timeline,
+        })
+    return results
+
+
+def _parse_duration(request):
+    duration = request.query_params.get('duration')
+    if duration is None:
+        return None
+    try:
+        duration = Decimal(duration)
+    except InvalidOperation:
+        raise ValidationError({'duration': 'duration must be a number of hours'})
+    if not duration.is_finite() or duration <= 0:
+        raise ValidationError({'duration': 'duration must be positive'})
+    return duration
+
+
+def _query_number(request, name, cast, low, high):
+    value = request.query_params.get(name)
+    if value is None:
+        return None
+    try:
+        value = cast(value)
+    except ValueError:
+        raise ValidationError({name: f'{name} must be a number'})
+    if not low <= value <= high:
+        raise ValidationError({name: f'{name} must be between {low} and {high}'})
+    return value
+
+
+def _query_datetime(request, name):
+    value = request.query_params.get(name)
+    if value is None:
+        return None
+    try:
+        parsed = parse_datetime(value)
+    except ValueError:
+        # Well formed but out of range, e.g. February 30th.
+        parsed = None
+    if parsed is None:
+        raise ValidationError({name: f'{name} must be an ISO 8601 datetime'})
+    return parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed)
+
+
 class DriverViewSet(viewsets.ModelViewSet):
     queryset = Driver.objects.all()
     serializer_class = DriverSerializer
@@ -178,7 +242,7 @@ class DriverViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['get'])
     def compliance_status(self, request, pk=None):
-        driver = self.get_object()
+        driver = compliance_context(request).prefetch([self.get_object()])[0]
         return Response({
             'driver': DriverSerializer(driver).data,
             'total_hours_8days': driver.total_hours_8days,
@@ -188,6 +252,31 @@ class DriverViewSet(viewsets.ModelViewSet):
             'needs_refuel': driver.needs_refuel
         })
 
+    @action(detail=True, methods=['get'])
+    def position(self, request, pk=None):
+        """The driver's last-known position, from the position store when it has one."""
+        driver = self.get_object()
+        position = get_position_store().driver_position(driver.id)
+        if position is None:
+            location = LocationUpdate.objects.filter(driver=driver).order_by('-recorded_at', '-id').first()
+            if location is None:
+                return Response({'error': 'No position recorded'}, status=status.HTTP_404_NOT_FOUND)
+            position = dict(location_payload(location), trip_id=location.trip_id)
+        return Response(position)
+
+    @action(detail=True, methods=['get'])
+    def hours_recovery(self, request, pk=None):
+        """When the driver's hours come back, optionally with the earliest start for ?duration=<hours>."""
+        driver = self.get_object()
+        return Response(recovery_payloads([driver.id], _parse_duration(request))[0])
+
+    @action(detail=False, methods=['get'], url_path='hours_recovery', url_name='fleet-hours-recovery')
+    def fleet_hours_recovery(self, request):
+        """The same curve for every driver visible to the caller, in one ledger query."""
+        duration = _parse_duration(request)
+        driver_ids = list(self.filter_queryset(self.get_queryset()).values_list('id', flat=True))
+        return Response(recovery_payloads(driver_ids, duration))
+
 
 class TripViewSet(viewsets.ModelViewSet):
     queryset = Trip.objects.all()
@@ -203,9 +292,10 @@ class TripViewSet(viewsets.ModelViewSet):
         return TripSerializer
 
     def get_queryset(self):
+        trips = Trip.objects.select_related('driver', 'motion')
         if self.request.user.is_admin:
-            return Trip.objects.all()
-        return Trip.objects.filter(driver=self.request.user)
+            return trips
+        return trips.filter(driver=self.request.user)
 
     @action(detail=True, methods=['post'])
     def complete(self, request, pk=None):
@@ -291,7 +381,11 @@ class TripViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['post'])
     def location(self, request, pk=None):
-        """Accept a location update and broadcast to trip group."""
+        """Accept a location update and broadcast to trip group.
+
+        The fix is queued in the write-behind buffer, so the response echoes
+        it without the ``id`` and ``created_at`` of a stored row.
+        """
         trip = self.get_object()
         driver = request.user
 
@@ -299,81 +393,105 @@ class TripViewSet(viewsets.ModelViewSet):
         if trip.driver_id != driver.id and not request.user.is_admin:
             return Response({'error': 'Not authorized for this trip'}, status=status.HTTP_403_FORBIDDEN)
 
-        lat = request.data.get('lat')
-        lng = request.data.get('lng')
-        accuracy = request.data.get('accuracy')
-        speed = request.data.get('speed')
-        recorded_at = request.data.get('recorded_at')
-
-        if lat is None or lng is None:
+        if request.data.get('lat') is None or request.data.get('lng') is None:
             return Response({'error': 'lat and lng are required'}, status=status.HTTP_400_BAD_REQUEST)
 
-        # simple rate limiting per driver (1 req/s)
-        ip = request.META.get('REMOTE_ADDR', str(driver.id))
-        last_ts = cache.get(f'loc_rate:{driver.id}')
-        now = time()
-        if last_ts and now - last_ts < 1.0:
-            return Response({'error': 'rate limit exceeded'}, status=status.HTTP_429_TOO_MANY_REQUESTS)
-        cache.set(f'loc_rate:{driver.id}', now, 2)
+        limited = check_rate_limit(request, 'trip_location', key=driver.id)
+        if limited:
+            return limited
 
-        # Persist location
-        loc = None
+        serializer = LocationFixSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({'error': 'invalid location', 'detail': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+        loc = LocationUpdate(
+            trip=trip,
+            driver=driver,
+            lat=data['lat'],
+            lng=data['lng'],
+            accuracy=data.get('accuracy'),
+            speed=data.get('speed'),
+            recorded_at=data.get('recorded_at') or timezone.now()
+        )
+        # Queue the location in the write-behind buffer; it is broadcast
+        # without waiting for the insert.
         try:
-            from .models import LocationUpdate
-            loc = LocationUpdate.objects.create(
-                trip=trip,
-                driver=driver,
-                lat=float(lat),
-                lng=float(lng),
-                accuracy=float(accuracy) if accuracy is not None else None,
-                speed=float(speed) if speed is not None else None,
-                recorded_at=recorded_at if recorded_at is not None else timezone.now()
-            )
+            get_location_buffer().add([location_row(kept) for kept in dead_band(trip.id, [loc])])
         except Exception as e:
             return Response({'error': 'failed to save location', 'detail': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-        # Simple arrival detection (15 meters)
-        def haversine(lat1, lon1, lat2, lon2):
-            # convert decimal degrees to radians
-            lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
-            dlon = lon2 - lon1
-            dlat = lat2 - lat1
-            a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-            c = 2 * asin(sqrt(a))
-            r = 6371000  # Radius of earth in meters
-            return c * r
-
-        arrived = False
-        if trip.destination_lat and trip.destination_lng:
-            dist = haversine(float(lat), float(lng), float(trip.destination_lat), float(trip.destination_lng))
-            if dist <= getattr(settings, 'ARRIVAL_RADIUS_METERS', 15):
-                trip.status = 'completed'
-                trip.end_time = timezone.now()
-                trip.save()
-                arrived = True
-
-        # Broadcast via channels
-        try:
-            channel_layer = get_channel_layer()
-            async_to_sync(channel_layer.group_send)(
-                f"trip_{trip.id}",
-                {
-                    'type': 'location.update',
-                    'trip_id': str(trip.id),
-                    'lat': loc.lat,
-                    'lng': loc.lng,
-                    'accuracy': loc.accuracy,
-                    'speed': loc.speed,
-                    'recorded_at': loc.recorded_at.isoformat(),
-                    'arrived': arrived,
-                }
-            )
-        except Exception:
-            # non-fatal; continue
-            pass
+        update_motion(trip, [loc])
+        arrived, events = process_fixes(trip, [loc])
+
+        get_position_store().record(trip, [location_payload(loc)])
+        # Queued for the background publisher; the response does not wait
+        # for the channel layer.
+        get_broadcaster().publish(f"trip_{trip.id}", {
+            'type': 'location.update',
+            'trip_id': str(trip.id),
+            'lat': loc.lat,
+            'lng': loc.lng,
+            'accuracy': loc.accuracy,
+            'speed': loc.speed,
+            'recorded_at': loc.recorded_at.isoformat(),
+            'arrived': arrived,
+            'events': [event_payload(event) for event in events],
+        })
+        publish_positions(trip, [loc], arrived)
 
-        from .serializers import LocationUpdateSerializer
-        return Response(LocationUpdateSerializer(loc).data, status=status.HTTP_201_CREATED)
+        return Response(
+            dict(location_payload(loc), trip=trip.id, driver=driver.id), status=status.HTTP_201_CREATED
+        )
+
+    @action(detail=True, methods=['post'], url_path='locations/batch', url_name='locations-batch')
+    def locations_batch(self, request, pk=None):
+        """Accept a batch of sequenced location fixes; retries are deduplicated by sequence."""
+        trip = self.get_object()
+        if trip.driver_id != request.user.id and not request.user.is_admin:
+            return Response({'error': 'Not authorized for this trip'}, status=status.HTTP_403_FORBIDDEN)
+
+        points = request.data.get('points')
+        max_points = getattr(settings, 'LOCATION_BATCH_MAX_POINTS', 1000)
+        if not isinstance(points, list) or not points:
+            return Response({'error': 'points must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(points) > max_points:
+            return Response({'error': f'at most {max_points} points per batch'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(ingest_batch(trip, points), status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['get'])
+    def track(self, request, pk=None):
+        """Replay the trip's track: keyset pages of raw fixes, or one simplified track for ?zoom=/?resolution=."""
+        trip = self.get_object()
+        since = _query_datetime(request, 'since')
+        until = _query_datetime(request, 'until')
+        zoom = _query_number(request, 'zoom', float, 0, 22)
+        resolution = _query_number(request, 'resolution', float, 0.1, 100000)
+
+        if zoom is not None or resolution is not None:
+            points, tolerance = simplified_track(trip, resolution, zoom, since, until)
+            return Response({
+                'trip': trip.id,
+                'resolution': round(tolerance, 2),
+                'count': len(points),
+                'next': None,
+                'points': [point_payload(point) for point in points],
+            })
+
+        page_size = getattr(settings, 'TRACK_PAGE_SIZE', 1000)
+        limit = _query_number(request, 'limit', int, 1, getattr(settings, 'TRACK_PAGE_MAX', 5000)) or page_size
+        try:
+            points, cursor = track_page(trip, request.query_params.get('cursor'), limit, since, until)
+        except InvalidCursor as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'trip': trip.id,
+            'resolution': None,
+            'count': len(points),
+            'next': cursor and replace_query_param(request.build_absolute_uri(), 'cursor', cursor),
+            'points': [point_payload(point) for point in points],
+        })
 
 
 class ReverseGeocodeView(APIView):
@@ -451,9 +569,10 @@ class FuelLogViewSet(viewsets.ModelViewSet):
         return FuelLogSerializer
 
     def get_queryset(self):
+        fuel_logs = FuelLog.objects.select_related('driver')
         if self.request.user.is_admin:
-            return FuelLog.objects.all()
-        return FuelLog.objects.filter(driver=self.request.user)
+            return fuel_logs
+        return fuel_logs.filter(driver=self.request.user)
 
 
 class ComplianceReportViewSet(viewsets.ModelViewSet):
@@ -465,9 +584,10 @@ class ComplianceReportViewSet(viewsets.ModelViewSet):
     ordering_fields = ['generated_at', 'date_start']
 
     def get_queryset(self):
+        reports = ComplianceReport.objects.select_related('driver')
         if self.request.user.is_admin:
-            return ComplianceReport.objects.all()
-        return ComplianceReport.objects.filter(driver=self.request.user)
+            return reports
+        return reports.filter(driver=self.request.user)
 
     @action(detail=False, methods=['post'])
     def generate(self, request):
@@ -489,49 +609,64 @@ class ComplianceReportViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        trips = Trip.objects.filter(
-            driver=driver,
-            status='completed',
-            start_time__date__gte=date_start,
-            start_time__date__lte=date_end
-        )
-
-        total_hours = sum(trip.total_trip_hours for trip in trips)
-        total_miles = trips.aggregate(total=Sum('distance'))['total'] or 0
-        trip_count = trips.count()
-        limit_exceeded = total_hours > 70
-
-        fuel_logs = FuelLog.objects.filter(
-            driver=driver,
-            timestamp__date__gte=date_start,
-            timestamp__date__lte=date_end
-        ).order_by('timestamp')
-
-        refuel_violations = 0
-        if fuel_logs.exists():
-            for i in range(len(fuel_logs) - 1):
-                trips_between = trips.filter(
-                    end_time__gte=fuel_logs[i].timestamp,
-                    end_time__lt=fuel_logs[i + 1].timestamp
-                )
-                miles_between = trips_between.aggregate(total=Sum('distance'))['total'] or 0
-                if miles_between > 1000:
-                    refuel_violations += 1
-
         report = ComplianceReport.objects.create(
             driver=driver,
             date_start=date_start,
             date_end=date_end,
-            total_hours=total_hours,
-            total_miles=total_miles,
-            trip_count=trip_count,
-            limit_exceeded=limit_exceeded,
-            refuel_violations=refuel_violations
+            **build_report(driver.id, date_start, date_end)
         )
 
         serializer = self.get_serializer(report)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    @action(detail=False, methods=['post'], permission_classes=[IsAdmin])
+    def generate_fleet(self, request):
+        """Start a background run generating reports for every active (or listed) driver."""
+        serializer = ReportRunCreateSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        data = serializer.validated_data
+        run = create_report_run(
+            data['date_start'], data['date_end'],
+            driver_ids=data.get('driver_ids'), created_by=request.user,
+        )
+        launch_report_run(run)
+        return Response(ReportRunSerializer(run).data, status=status.HTTP_202_ACCEPTED)
+
+
+class ReportRunViewSet(viewsets.ReadOnlyModelViewSet):
+    """Progress of fleet-wide report runs (admin only)."""
+    queryset = ReportRun.objects.all()
+    serializer_class = ReportRunSerializer
+    permission_classes = [IsAdmin]
+
+    @action(detail=True, methods=['post'])
+    def resume(self, request, pk=None):
+        run = self.get_object()
+        if run.status == 'completed':
+            return Response({'error': 'Run is already completed'}, status=status.HTTP_400_BAD_REQUEST)
+        if not claim_report_run(run):
+            return Response({'error': 'Run is still running'}, status=status.HTTP_409_CONFLICT)
+        launch_report_run(run)
+        return Response(self.get_serializer(run).data, status=status.HTTP_202_ACCEPTED)
+
+
+class LocationBufferMetricsView(APIView):
+    """Depth and flush latency of the location write-behind buffer (admins only)."""
+    permission_classes = [IsAdmin]
+
+    def get(self, request):
+        return Response(get_location_buffer().metrics())
+
+
+class BroadcastMetricsView(APIView):
+    """Queue depth and counters of the background broadcast publisher (admins only)."""
+    permission_classes = [IsAdmin]
+
+    def get(self, request):
+        return Response(get_broadcaster().metrics())
+
 
 class DashboardStatsView(APIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -543,24 +678,7 @@ class DashboardStatsView(APIView):
                 status=status.HTTP_403_FORBIDDEN
             )
 
-        today = timezone.now().date()
-        eight_days_ago = timezone.now() - timedelta(days=8)
-
-        stats = {
-            'total_drivers': Driver.objects.filter(is_active=True).count(),
-            'active_trips': Trip.objects.filter(status='in_progress').count(),
-            'completed_trips_today': Trip.objects.filter(
-                status='completed',
-                end_time__date=today
-            ).count(),
-            'compliance_violations': Driver.objects.filter(
-                trips__status='completed',
-                trips__end_time__gte=eight_days_ago
-            ).annotate(
-                total_hours=Sum('trips__end_time')
-            ).filter(total_hours__gt=70).count(),
-            'drivers_needing_refuel': sum(1 for driver in Driver.objects.all() if driver.needs_refuel)
-        }
+        stats = get_fleet_snapshot()
 
         serializer = DashboardStatsSerializer(stats)
         return Response(serializer.data)
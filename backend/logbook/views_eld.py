@@ -1,19 +1,117 @@
+from django.http import FileResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.urls import reverse
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 
+from .eld import ELDGenerator
+from .eld_export import EXPORT_FORMATS, export_archive
+from .eld_render import FORMATS, sheet_path
+from .models import DailyLog, Driver, Trip
+from .serializers import DailyLogSerializer, ELDExportSerializer, ELDGenerateSerializer
+
 
 class ELDGenerateView(APIView):
-    """Stub endpoint for ELD generation. M2 will implement full logic.
-    Accepts { driver_id, trip_id } and returns placeholder response for now.
+    """Generate (or fetch cached) ELD daily logs.
+
+    Accepts ``{ driver_id, trip_id }`` to cover the days of one trip, or
+    ``{ driver_id, date_start, date_end }`` for a date range. ``driver_id``
+    defaults to the caller; drivers may only generate their own logs.
     """
 
     def post(self, request):
-        driver_id = request.data.get('driver_id')
-        trip_id = request.data.get('trip_id')
+        serializer = ELDGenerateSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+        driver_id = data.get('driver_id') or request.user.id
+
+        if driver_id != request.user.id and not request.user.is_admin:
+            return Response({'detail': 'Not authorized for this driver'}, status=status.HTTP_403_FORBIDDEN)
+
+        try:
+            driver = Driver.objects.get(id=driver_id)
+        except Driver.DoesNotExist:
+            return Response({'detail': 'Driver not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        generator = ELDGenerator(driver)
+        if data.get('trip_id'):
+            try:
+                trip = Trip.objects.get(id=data['trip_id'], driver=driver)
+            except Trip.DoesNotExist:
+                return Response({'detail': 'Trip not found'}, status=status.HTTP_404_NOT_FOUND)
+            logs = generator.generate_for_trip(trip)
+        else:
+            logs = generator.generate_daily_logs(data['date_start'], data['date_end'])
+
+        return Response({
+            'daily_logs': DailyLogSerializer(logs, many=True).data,
+            'svg_urls': [self._sheet_url(request, log, 'svg') for log in logs],
+            'pdf_urls': [self._sheet_url(request, log, 'pdf') for log in logs],
+        })
+
+    def _sheet_url(self, request, log, fmt):
+        return request.build_absolute_uri(reverse('api-eld-sheet', args=[log.pk, fmt]))
+
+
+class ELDExportView(APIView):
+    """Stream a ZIP of daily logs for many drivers and days.
+
+    Accepts ``{ driver_ids, date_start, date_end, formats }``. ``driver_ids``
+    defaults to the caller and only admins may export other drivers;
+    ``formats`` is any of ``json``, ``svg`` and ``pdf`` (all by default).
+    The archive is produced while it is sent, one driver at a time.
+    """
+
+    def post(self, request):
+        serializer = ELDExportSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+        date_start, date_end = data['date_start'], data['date_end']
+        driver_ids = set(data.get('driver_ids') or [request.user.id])
+        formats = list(dict.fromkeys(data.get('formats') or EXPORT_FORMATS))
+        if not request.user.is_admin and driver_ids != {request.user.id}:
+            return Response({'detail': 'Not authorized for this driver'}, status=status.HTTP_403_FORBIDDEN)
+
+        drivers = Driver.objects.filter(pk__in=driver_ids).order_by('pk')
+        if drivers.count() != len(driver_ids):
+            return Response({'detail': 'Driver not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        response = StreamingHttpResponse(
+            export_archive(drivers.iterator(), date_start, date_end, formats),
+            content_type='application/zip',
+        )
+        response['Content-Disposition'] = f'attachment; filename="eld-logs-{date_start}-{date_end}.zip"'
+        return response
+
+
+class ELDSheetView(APIView):
+    """Download one daily log as an SVG or PDF sheet.
+
+    Sheets are rendered on first request and then served from the render
+    cache; the content hash doubles as the ETag.
+    """
 
-        if not driver_id or not trip_id:
-            return Response({'detail': 'driver_id and trip_id required'}, status=status.HTTP_400_BAD_REQUEST)
+    def get(self, request, pk, fmt):
+        if fmt not in FORMATS:
+            return Response({'detail': 'format must be svg or pdf'}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            log = DailyLog.objects.select_related('driver').get(pk=pk)
+        except DailyLog.DoesNotExist:
+            return Response({'detail': 'Daily log not found'}, status=status.HTTP_404_NOT_FOUND)
+        if log.driver_id != request.user.id and not request.user.is_admin:
+            return Response({'detail': 'Not authorized for this driver'}, status=status.HTTP_403_FORBIDDEN)
 
-        # Placeholder response: empty daily_logs list
-        return Response({'daily_logs': [], 'svg_urls': [], 'pdf_urls': []})
+        path = sheet_path(log, fmt)
+        etag = f'"{path.stem}"'
+        if request.headers.get('If-None-Match') == etag:
+            return HttpResponseNotModified()
+        response = FileResponse(
+            open(path, 'rb'),
+            content_type=FORMATS[fmt],
+            filename=f'eld-{log.day.isoformat()}.{fmt}',
+        )
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, max-age=3600'
+        return response
@@ -7,17 +7,86 @@ interface TrackerOptions {
   intervalMs?: number;
 }
 
-export default function useGeolocationTracker({ tripId, intervalMs = 1000 }: TrackerOptions) {
+interface LocationPoint {
+  sequence: number;
+  lat: number;
+  lng: number;
+  accuracy: number | null;
+  speed: number | null;
+  recorded_at: string;
+}
+
+// How often points that were not acknowledged over the socket are flushed
+// through the REST batch endpoint instead.
+const FALLBACK_FLUSH_MS = 15000;
+
+export default function useGeolocationTracker({ tripId, token, intervalMs = 1000 }: TrackerOptions) {
   const watchIdRef = useRef<number | null>(null);
   const lastSentRef = useRef<number>(0);
+  const socketRef = useRef<WebSocket | null>(null);
+  const flushTimerRef = useRef<number | null>(null);
+  // Points are kept until the server acknowledges their sequence number, so
+  // nothing is lost across dead zones or reconnects; the server deduplicates.
+  const unackedRef = useRef<Map<number, LocationPoint>>(new Map());
+  const sequenceRef = useRef<number>(Date.now());
 
-  useEffect(() => {
-    return () => {
-      if (watchIdRef.current !== null) {
-        navigator.geolocation.clearWatch(watchIdRef.current);
+  const connect = () => {
+    const accessToken = token || localStorage.getItem('accessToken');
+    if (!tripId || !accessToken) return;
+    const scheme = window.location.protocol === 'https:' ? 'wss' : 'ws';
+    const ws = new WebSocket(`${scheme}://${window.location.host}/ws/trips/${tripId}/?token=${encodeURIComponent(accessToken)}`);
+    socketRef.current = ws;
+    ws.onopen = () => {
+      const points = Array.from(unackedRef.current.values());
+      if (points.length) ws.send(JSON.stringify({ type: 'locations', points }));
+    };
+    ws.onmessage = (ev) => {
+      try {
+        const data = JSON.parse(ev.data);
+        if (data.type === 'ack') {
+          for (const seq of data.sequences as number[]) unackedRef.current.delete(seq);
+          for (const r of (data.rejected || []) as { sequence: number }[]) unackedRef.current.delete(r.sequence);
+        }
+      } catch (e) {
+        console.error('ws parse', e);
       }
     };
-  }, []);
+    ws.onclose = () => {
+      if (socketRef.current === ws) socketRef.current = null;
+    };
+  };
+
+  const flushViaRest = async () => {
+    const socket = socketRef.current;
+    if (socket && socket.readyState === WebSocket.OPEN) return;
+    const points = Array.from(unackedRef.current.values());
+    if (!points.length) return;
+    try {
+      const res = await apiClient.post<{ accepted: number[]; duplicates: number[] }>(
+        `/trips/${tripId}/locations/batch/`, { points },
+      );
+      for (const seq of [...res.accepted, ...res.duplicates]) unackedRef.current.delete(seq);
+    } catch {
+      // keep the points; the next flush or reconnect retries them
+      console.error('Failed to send locations');
+    }
+    if (!socketRef.current) connect();
+  };
+
+  const stop = () => {
+    if (watchIdRef.current !== null) {
+      navigator.geolocation.clearWatch(watchIdRef.current);
+      watchIdRef.current = null;
+    }
+    if (flushTimerRef.current !== null) {
+      window.clearInterval(flushTimerRef.current);
+      flushTimerRef.current = null;
+    }
+    socketRef.current?.close();
+    socketRef.current = null;
+  };
+
+  useEffect(() => stop, []);
 
   const start = () => {
     if (!('geolocation' in navigator)) {
@@ -25,36 +94,31 @@ export default function useGeolocationTracker({ tripId, intervalMs = 1000 }: Tra
     }
     if (watchIdRef.current !== null) return;
 
-    watchIdRef.current = navigator.geolocation.watchPosition(async (pos) => {
+    connect();
+    flushTimerRef.current = window.setInterval(flushViaRest, FALLBACK_FLUSH_MS);
+    watchIdRef.current = navigator.geolocation.watchPosition((pos) => {
       const now = Date.now();
       if (now - lastSentRef.current < intervalMs) return; // throttle
       lastSentRef.current = now;
 
-      const payload = {
+      const point: LocationPoint = {
+        sequence: ++sequenceRef.current,
         lat: pos.coords.latitude,
         lng: pos.coords.longitude,
         accuracy: pos.coords.accuracy,
         speed: pos.coords.speed,
         recorded_at: new Date(pos.timestamp).toISOString(),
       };
+      unackedRef.current.set(point.sequence, point);
 
-      try {
-        await apiClient.post(`/trips/${tripId}/location/`, payload);
-      } catch {
-        // swallow errors for now; UI should surface them
-        console.error('Failed to send location');
+      const socket = socketRef.current;
+      if (socket && socket.readyState === WebSocket.OPEN) {
+        socket.send(JSON.stringify({ type: 'location', ...point }));
       }
     }, (err) => {
       console.error('Geolocation error', err);
     }, { enableHighAccuracy: true, maximumAge: 1000, timeout: 10000 });
   };
 
-  const stop = () => {
-    if (watchIdRef.current !== null) {
-      navigator.geolocation.clearWatch(watchIdRef.current);
-      watchIdRef.current = null;
-    }
-  };
-
   return { start, stop, isRunning: () => watchIdRef.current !== null };
 }
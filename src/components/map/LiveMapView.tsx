@@ -35,6 +35,9 @@ export default function LiveMapView({ tripId, initialCenter = { lat: 0, lng: 0 }
         const data = JSON.parse(ev.data);
         if (data.type === 'location_update' || data.type === 'location.update') {
           setDriverPos({ lat: data.lat, lng: data.lng });
+        } else if ((data.type === 'location_batch' || data.type === 'location_snapshot') && data.points?.length) {
+          const last = data.points[data.points.length - 1];
+          setDriverPos({ lat: last.lat, lng: last.lng });
         }
       } catch (e) {
         console.error('ws parse', e);
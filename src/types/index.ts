@@ -37,6 +37,7 @@ export interface Trip {
   total_trip_hours: number;
   driver_hours_after_trip: number;
   compliance_errors: string[];
+  compliance_warnings: string[];
   created_at: string;
   updated_at: string;
 }